@@ -0,0 +1,189 @@
+"""
+多码率（ABR）HLS
+一个FFmpeg进程内由 split/scale 滤镜图把同一路输入缩放成多个分辨率，各自编码后交给
+hls 封装器的 var_stream_map 输出多个变体播放列表和一个主播放列表，
+输入只解码（读管道）一次，不需要每个码率各起一个FFmpeg。
+
+FFmpeg 7.0 的多线程改造起每个编码器在独立线程中运行，线程名为 "enc<输出序号>:<流序号>:<编码器>"，
+编码器内部的工作线程继承该名称，Linux下据此从 /proc 按线程统计每个码率的CPU占用。
+"""
+
+import os
+import re
+import time
+
+ENCODER_THREAD_PATTERN = re.compile(r"^enc\d+:(\d+):")
+
+try:
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+except (AttributeError, ValueError, OSError):  # 非POSIX系统
+    CLOCK_TICKS = 100
+
+
+class Rendition:
+    """ABR中的一个码率档位"""
+    __slots__ = ("width", "height")
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    @property
+    def name(self):
+        return f"{self.height}p"
+
+    def __eq__(self, other):
+        return isinstance(other, Rendition) and (self.width, self.height) == (other.width, other.height)
+
+    def __repr__(self):
+        return f"Rendition({self.width}x{self.height})"
+
+
+def parse_ladder(spec, width, height):
+    """
+    解析码率档位
+
+    Args:
+        spec: 逗号分隔的输出高度，如 "450,360,240"
+        width, height: 输入画面尺寸，宽度按其宽高比换算并取偶数
+
+    Returns:
+        list[Rendition]: 按高度从高到低排列；高于输入的档位被忽略，空字符串返回空列表
+    """
+    heights = sorted({int(h) for h in spec.split(',') if h.strip()}, reverse=True)
+    renditions = []
+    for h in heights:
+        if h <= 0:
+            raise ValueError(f"无效的码率档位高度: {h}")
+        if h > height:
+            continue
+        w = max(2, int(round(width * h / height / 2)) * 2)
+        renditions.append(Rendition(w, h - h % 2))
+    return renditions
+
+
+def stream_args(args, index):
+    """把编码参数限定到第 index 路视频输出流，例如 -c:v → -c:v:0，-preset → -preset:v:0"""
+    scoped = []
+    for i in range(0, len(args), 2):
+        option = args[i].split(':')[0]
+        scoped += [f"{option}:v:{index}", args[i + 1]]
+    return scoped
+
+
+def filter_graph(renditions, width, height):
+    """生成 split/scale 滤镜图，第i路输出标记为 [r<i>]；与输入同尺寸的档位不缩放"""
+    labels = "".join(f"[s{i}]" for i in range(len(renditions)))
+    chains = [f"[0:v]split={len(renditions)}{labels}"]
+    for i, r in enumerate(renditions):
+        if (r.width, r.height) == (width, height):
+            chains.append(f"[s{i}]null[r{i}]")
+        else:
+            chains.append(f"[s{i}]scale={r.width}:{r.height}[r{i}]")
+    return ";".join(chains)
+
+
+def abr_output_args(renditions, registry, width, height, fps, output_path, hls_time=2, hls_list_size=5,
+                    start_number=0):
+    """
+    生成多码率HLS的输出参数
+
+    output_path 作为主播放列表，变体播放列表和分片写在同一目录：
+    output.m3u8 → output_450p.m3u8、output_450p_<start_number>.ts ……，前端播放地址不变。
+    所有档位使用相同的固定GOP，保证分片边界对齐，播放器可以在分片处切换码率。
+    """
+    directory, master_name = os.path.split(output_path)
+    stem = os.path.splitext(master_name)[0]
+    gop = max(1, int(round(fps * hls_time)))
+
+    args = ['-filter_complex', filter_graph(renditions, width, height)]
+    for i, r in enumerate(renditions):
+        args += ['-map', f'[r{i}]'] + stream_args(registry.video_args(r.width, r.height, fps), i)
+    args += [
+        '-g', str(gop),
+        '-keyint_min', str(gop),
+        '-sc_threshold', '0',
+        '-f', 'hls',
+        '-hls_time', str(hls_time),
+        '-hls_list_size', str(hls_list_size),
+        '-hls_flags', 'delete_segments+program_date_time+independent_segments',
+        '-start_number', str(start_number),
+        '-master_pl_name', master_name,
+        '-var_stream_map', " ".join(f"v:{i},name:{r.name}" for i, r in enumerate(renditions)),
+        '-hls_segment_filename', os.path.join(directory, f"{stem}_%v_%d.ts"),
+        os.path.join(directory, f"{stem}_%v.m3u8"),
+    ]
+    return args
+
+
+def thread_cpu_times(pid, proc_root="/proc"):
+    """
+    读取进程各线程的CPU时间（秒），按线程名汇总
+
+    Returns:
+        dict: {线程名: 用户态+内核态CPU秒数}；非Linux或进程已退出时返回空字典
+    """
+    times = {}
+    task_dir = os.path.join(proc_root, str(pid), "task")
+    try:
+        tids = os.listdir(task_dir)
+    except OSError:
+        return times
+    for tid in tids:
+        try:
+            with open(os.path.join(task_dir, tid, "stat")) as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 线程名在括号内且可能包含空格，字段从最后一个右括号之后开始计
+        comm = stat[stat.index("(") + 1:stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2:].split()
+        seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        times[comm] = times.get(comm, 0.0) + seconds
+    return times
+
+
+class RenditionCpuMeter:
+    """
+    按码率统计FFmpeg进程的CPU占用
+
+    编码线程的CPU计入对应档位，其余线程（读管道、滤镜缩放、封装）计入 shared。
+    每次 sample() 返回距上次采样期间的平均占用，单位为单核百分比。
+
+    按线程名区分档位依赖 FFmpeg 7.0 起的编码线程命名（enc<输出>:<流>:<编码器>）；
+    更早的版本没有这些线程，sample() 只返回 shared，不给出各档位的占用。
+    """
+
+    def __init__(self, pid, renditions, proc_root="/proc", clock=time.monotonic):
+        self.pid = pid
+        self.renditions = renditions
+        self.proc_root = proc_root
+        self.clock = clock
+        # 是否见到过按档位命名的编码线程
+        self.per_rendition = False
+        self._last = self._totals()
+        self._last_time = self.clock()
+
+    def _totals(self):
+        totals = [0.0] * len(self.renditions)
+        shared = 0.0
+        for comm, seconds in thread_cpu_times(self.pid, self.proc_root).items():
+            match = ENCODER_THREAD_PATTERN.match(comm)
+            index = int(match.group(1)) if match else None
+            if index is not None and index < len(totals):
+                totals[index] += seconds
+                self.per_rendition = True
+            else:
+                shared += seconds
+        return totals + [shared]
+
+    def sample(self):
+        now = self.clock()
+        totals = self._totals()
+        elapsed = max(now - self._last_time, 1e-6)
+        usage = [max(0.0, (cur - prev) / elapsed * 100) for cur, prev in zip(totals, self._last)]
+        self._last, self._last_time = totals, now
+        if not self.per_rendition:
+            return {"shared": round(usage[-1], 1)}
+        names = [r.name for r in self.renditions] + ["shared"]
+        return {name: round(percent, 1) for name, percent in zip(names, usage)}
@@ -0,0 +1,122 @@
+"""
+检测结果中心负载测试
+以子进程启动 detection_hub.py，模拟多路摄像头进程（每路一个子进程、各自的DetectionProducer，
+经Unix数据报套接字发布），每路摄像头接入若干WebSocket订阅者，统计：
+    - 发布端耗时：send_detections 一次调用（打包锚框、生成JSON和二进制帧、sendto）的分布
+    - 从发布到客户端收到的端到端延迟分布
+    - 中心收到的数据报数和发布端丢弃数
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from websockets.asyncio.client import connect
+
+from bench_ws_codec import CLASS_NAMES, make_sequence
+from ws_producer import DetectionProducer
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def subscriber(url, latencies, stop):
+    async with connect(url) as websocket:
+        while not stop.is_set():
+            try:
+                message = await asyncio.wait_for(websocket.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            latencies.append(time.time() - json.loads(message)["ts"])
+
+
+def camera(camera_id, socket_path, rate, duration, boxes, queue):
+    producer = DetectionProducer()
+    producer.start(hub_socket=socket_path)
+    sequence = make_sequence(int(rate * duration) + 1, boxes, boxes // 3, seed=camera_id)
+    interval = 1.0 / rate
+    next_time = time.monotonic()
+    publish_times = []
+    for results in sequence:
+        start = time.perf_counter()
+        producer.send_detections(camera_id, results, CLASS_NAMES)
+        publish_times.append(time.perf_counter() - start)
+        next_time += interval
+        time.sleep(max(0.0, next_time - time.monotonic()))
+    queue.put((publish_times, producer.hub.dropped))
+    producer.stop()
+
+
+async def run(args):
+    socket_path = os.path.join(tempfile.mkdtemp(), "hub.sock")
+    port = free_port()
+    hub = subprocess.Popen([sys.executable, "detection_hub.py", "--socket", socket_path, "--host", "127.0.0.1",
+                            "--port", str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.3)
+
+        latencies, publish_times, dropped = [], [], []
+        stop = asyncio.Event()
+        tasks = [asyncio.ensure_future(subscriber(f"ws://127.0.0.1:{port}/ws/boxes/{camera_id}", latencies, stop))
+                 for camera_id in range(1, args.cameras + 1) for _ in range(args.clients)]
+        await asyncio.sleep(1.0)
+
+        queue = multiprocessing.Queue()
+        cameras = [multiprocessing.Process(target=camera, args=(camera_id, socket_path, args.rate, args.duration,
+                                                                args.boxes, queue))
+                   for camera_id in range(1, args.cameras + 1)]
+        for process in cameras:
+            process.start()
+        loop = asyncio.get_running_loop()
+        for _ in cameras:
+            times, camera_dropped = await loop.run_in_executor(None, queue.get)
+            publish_times += times
+            dropped.append(camera_dropped)
+        for process in cameras:
+            process.join()
+        await asyncio.sleep(1.0)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        stats = json.loads(urllib.request.urlopen(f"http://127.0.0.1:{port}/stats").read())
+    finally:
+        hub.terminate()
+        hub.wait()
+
+    def pct(values, p):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+    received = sum(c["received"] for c in stats["hub"]["cameras"].values())
+    print(f"{args.cameras} 路摄像头 × {args.rate:g} 次/秒 × {args.duration:g} 秒，每帧 {args.boxes} 个锚框，"
+          f"每路 {args.clients} 个订阅者")
+    print(f"发布 {len(publish_times)} 条，中心收到 {received} 条，发布端丢弃 {sum(dropped)} 条")
+    print(f"发布端耗时: p50 {pct(publish_times, 0.5):.3f} ms，p99 {pct(publish_times, 0.99):.3f} ms，"
+          f"最大 {pct(publish_times, 1.0):.3f} ms")
+    print(f"端到端延迟: p50 {pct(latencies, 0.5):.1f} ms，p99 {pct(latencies, 0.99):.1f} ms（{len(latencies)} 条）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection hub load test")
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=5, help="每路摄像头的订阅者数")
+    parser.add_argument("--rate", type=float, default=10.0, help="每路每秒发布的检测结果数")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--boxes", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
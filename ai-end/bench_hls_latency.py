@@ -0,0 +1,160 @@
+"""
+HLS分片可用延迟基准
+按实时帧率向FFmpeg送入合成画面，分别测量：
+    mpegts - 与 start_ffmpeg 默认输出相同的TS分片（hls_time=2，GOP为libx264默认值），轮询磁盘上的播放列表
+    ll-hls - fMP4部分分片，在内存播放列表中记录每个部分分片产生的时刻
+对每个分片/部分分片统计其中最新一帧和最早一帧从送入编码器到可被播放器下载所经过的时间。
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from encoder_sink import EncoderSink
+from ll_hls import LowLatencyPlaylist, LowLatencyHlsPackager
+
+# program_date_time 会在 EXTINF 与分片URI之间插入一行，因此允许中间夹带其他标签
+EXTINF_PATTERN = re.compile(r"^#EXTINF:([\d.]+),.*?^([^#\n][^\n]*)$", re.MULTILINE | re.DOTALL)
+
+
+def input_args(width, height, fps):
+    return [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-vcodec', 'rawvideo', '-pix_fmt', 'bgr24',
+        '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+    ]
+
+
+def mpegts_command(width, height, fps, output_path):
+    return input_args(width, height, fps) + [
+        '-f', 'hls', '-hls_time', '2', '-hls_list_size', '5',
+        '-hls_flags', 'delete_segments+program_date_time',
+        output_path
+    ]
+
+
+def ll_hls_command(width, height, fps, part, segment):
+    gop = int(round(fps * segment))
+    return input_args(width, height, fps) + [
+        '-tune', 'zerolatency', '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-f', 'mp4', '-movflags', 'empty_moov+default_base_moof+frag_keyframe',
+        '-frag_duration', str(int(part * 1_000_000)), '-flush_packets', '1', 'pipe:1'
+    ]
+
+
+def feed(sink, width, height, seconds):
+    """按sink的帧率节拍送入带运动的画面，返回第一帧送入的时刻（单调时钟）"""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 256, (height, width * 2, 3), dtype=np.uint8)
+    start = time.monotonic()
+    frames = int(seconds * sink.fps)
+    for i in range(frames):
+        offset = (i * 8) % width
+        sink.submit(np.ascontiguousarray(base[:, offset:offset + width]))
+        delay = start + (i + 1) / sink.fps - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    return start
+
+
+def summarize(name, events, origin):
+    """
+    events: [(可用时刻, 媒体起点秒, 媒体终点秒)]，origin为第一帧送入时刻
+    """
+    newest = [available - (origin + end) for available, start, end in events]
+    oldest = [available - (origin + start) for available, start, end in events]
+    durations = [end - start for _, start, end in events]
+    print(f"{name:8s} 单元数 {len(events):3d} | 平均时长 {np.mean(durations):.2f}s | "
+          f"最新帧可用延迟 平均 {np.mean(newest) * 1000:.0f} ms / 最大 {np.max(newest) * 1000:.0f} ms | "
+          f"最早帧可用延迟 平均 {np.mean(oldest) * 1000:.0f} ms / 最大 {np.max(oldest) * 1000:.0f} ms")
+
+
+def run_mpegts(width, height, fps, seconds):
+    tmpdir = tempfile.mkdtemp()
+    playlist_path = os.path.join(tmpdir, "output.m3u8")
+    sink = EncoderSink(mpegts_command(width, height, fps, playlist_path), fps, name="bench-mpegts").start()
+    events = []
+    seen = set()
+    media_end = [0.0]
+    stop = threading.Event()
+
+    def poll():
+        while not stop.is_set():
+            try:
+                with open(playlist_path) as f:
+                    text = f.read()
+            except OSError:
+                text = ""
+            now = time.monotonic()
+            for duration, uri in EXTINF_PATTERN.findall(text):
+                if uri not in seen:
+                    seen.add(uri)
+                    start = media_end[0]
+                    media_end[0] += float(duration)
+                    events.append((now, start, media_end[0]))
+            time.sleep(0.005)
+
+    poller = threading.Thread(target=poll, daemon=True)
+    poller.start()
+    try:
+        origin = feed(sink, width, height, seconds)
+        # 只统计送入期间产生的分片，关闭时FFmpeg写出的最后一个分片不计入
+        stop.set()
+        poller.join()
+    finally:
+        sink.close()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return events, origin
+
+
+def run_ll_hls(width, height, fps, seconds, part, segment):
+    playlist = LowLatencyPlaylist(part_target=part, segment_target=segment)
+    events = []
+    media_end = [0.0]
+    add_part = playlist.add_part
+
+    def record(data, duration, independent):
+        add_part(data, duration, independent)
+        start = media_end[0]
+        media_end[0] += duration
+        events.append((time.monotonic(), start, media_end[0]))
+
+    playlist.add_part = record
+    sink = EncoderSink(ll_hls_command(width, height, fps, part, segment), fps, name="bench-llhls",
+                       stdout=subprocess.PIPE).start()
+    packager = LowLatencyHlsPackager(sink.process.stdout, playlist, name="bench").start()
+    try:
+        origin = feed(sink, width, height, seconds)
+        count = len(events)
+    finally:
+        sink.close()
+        packager.join(timeout=5)
+    return events[:count], origin
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HLS segment availability latency: mpegts vs LL-HLS parts")
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=450)
+    parser.add_argument('--fps', type=float, default=25.0)
+    parser.add_argument('--seconds', type=float, default=24.0)
+    parser.add_argument('--part', type=float, default=0.2, help="LL-HLS part duration")
+    parser.add_argument('--segment', type=float, default=1.0, help="LL-HLS segment (GOP) duration")
+    args = parser.parse_args()
+
+    print(f"{args.width}x{args.height} @ {args.fps} fps, 每种模式送入 {args.seconds} 秒")
+    events, origin = run_mpegts(args.width, args.height, args.fps, args.seconds)
+    summarize("mpegts", events, origin)
+    events, origin = run_ll_hls(args.width, args.height, args.fps, args.seconds, args.part, args.segment)
+    summarize("ll-hls", events, origin)
+
+
+if __name__ == '__main__':
+    main()
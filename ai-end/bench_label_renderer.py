@@ -0,0 +1,120 @@
+"""
+锚框标签绘制微基准
+对比原 Drawer.draw（整帧BGR→RGB→PIL→BGR往返 + 每次从磁盘加载字体）
+与字形缓存的 LabelRenderer（只在标签区域内混合）
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from label_renderer import LabelRenderer, DEFAULT_FONT_PATH
+
+CLASS_NAMES = {
+    0: "皮带", 1: "煤量", 2: "大块", 3: "左轴",
+    4: "右轴", 5: "异物", 6: "人员", 7: "烟雾"
+}
+
+CLASS_COLORS = {
+    0: (0, 255, 0), 1: (0, 0, 255), 2: (255, 0, 0),
+    3: (0, 255, 255), 4: (255, 255, 0), 5: (255, 0, 255),
+    6: (255, 165, 0), 7: (128, 128, 128)
+}
+
+
+class MockBox:
+    """模拟YOLO检测框"""
+    def __init__(self, cls_id, x1, y1, x2, y2):
+        self.cls = np.array([cls_id], dtype=np.float32)
+        self.xyxy = np.array([[x1, y1, x2, y2]], dtype=np.float32)
+
+
+def legacy_get_font(size=60, font_path=None):
+    """原实现：每次调用都从磁盘加载字体"""
+    try:
+        font_path = font_path or DEFAULT_FONT_PATH
+        return ImageFont.truetype(font_path, size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+def legacy_draw(frame, box, label, ratio=None, scale_factor=1.0):
+    """原 Drawer.draw 实现"""
+    x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+    line_thickness = max(1, int(2 * scale_factor))
+    cls = int(box.cls[0])
+    color = CLASS_COLORS.get(cls, (255, 255, 255))
+    cv2.rectangle(frame, (x1, y1), (x2, y2), color, line_thickness)
+
+    label_text = f"{label}{f': {ratio}' if cls == 1 and ratio else ''}"
+    pil_img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(pil_img)
+    font_size = max(20, int(60 * scale_factor))
+    draw.text((x1, y1 - int(25 * scale_factor)), label_text, font=legacy_get_font(font_size), fill=(color[2], color[1], color[0]))
+    return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+
+
+def make_cached_draw(renderer):
+    """新 Drawer.draw 实现：矩形框 + 缓存字形混合"""
+    def draw(frame, box, label, ratio=None, scale_factor=1.0):
+        x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+        line_thickness = max(1, int(2 * scale_factor))
+        cls = int(box.cls[0])
+        color = CLASS_COLORS.get(cls, (255, 255, 255))
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, line_thickness)
+
+        label_text = f"{label}{f': {ratio}' if cls == 1 and ratio else ''}"
+        font_size = max(20, int(60 * scale_factor))
+        renderer.draw(frame, label_text, (x1, y1 - int(25 * scale_factor)), font_size, color)
+        return frame
+    return draw
+
+
+def make_boxes(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    boxes = []
+    for i in range(count):
+        x1 = int(rng.integers(0, width - 120))
+        y1 = int(rng.integers(40, height - 80))
+        boxes.append(MockBox(i % 8, x1, y1, x1 + 100, y1 + 60))
+    return boxes
+
+
+def run(draw_func, frame, boxes, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        rendered = frame.copy()
+        for box in boxes:
+            cls = int(box.cls[0])
+            rendered = draw_func(rendered, box, CLASS_NAMES[cls], "45.2%" if cls == 1 else None, scale_factor=0.625)
+    return rendered, (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark label drawing: PIL round-trip vs glyph cache")
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=450)
+    parser.add_argument('--boxes', type=int, default=6, help="Boxes drawn per frame")
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    boxes = make_boxes(args.boxes, args.width, args.height)
+    renderer = LabelRenderer()
+
+    legacy_frame, legacy_time = run(legacy_draw, frame, boxes, args.frames)
+    cached_frame, cached_time = run(make_cached_draw(renderer), frame, boxes, args.frames)
+
+    print(f"分辨率: {args.width}x{args.height}, 每帧锚框数: {args.boxes}, 帧数: {args.frames}")
+    print(f"原 Drawer.draw (PIL整帧往返): {legacy_time * 1000:.3f} ms/帧")
+    print(f"LabelRenderer (字形缓存):      {cached_time * 1000:.3f} ms/帧")
+    print(f"加速比: {legacy_time / cached_time:.1f}x")
+    print(f"输出逐像素一致: {np.array_equal(legacy_frame, cached_frame)}")
+    print(f"字形缓存: {renderer.stats()}")
+
+
+if __name__ == '__main__':
+    main()
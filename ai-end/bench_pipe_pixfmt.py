@@ -0,0 +1,102 @@
+"""
+管道帧格式基准
+分别以 bgr24 和 yuv420p（I420）向 libx264 编码的FFmpeg进程送入相同的画面，
+统计Python写入线程（含色彩转换）和FFmpeg子进程的CPU时间之和，以及管道传输的数据量。
+"""
+import argparse
+import resource
+import time
+
+import numpy as np
+
+from encoder_sink import EncoderSink, PIX_FMT_BGR24, PIX_FMT_I420
+from video_pipeline import BLOCK, FramePacket
+
+RESOLUTIONS = {"800x450": (800, 450), "1280x720": (1280, 720), "1920x1080": (1920, 1080)}
+
+
+def make_frames(width, height, count, seed=0):
+    """生成一组带平移运动的测试画面，避免编码器遇到完全静止的内容"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, (height, width + count * 4, 3), dtype=np.uint8)
+    return [np.ascontiguousarray(base[:, i * 4:i * 4 + width]) for i in range(count)]
+
+
+def encoder_command(width, height, fps, pix_fmt):
+    return [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'rawvideo',
+        '-vcodec', 'rawvideo',
+        '-pix_fmt', pix_fmt,
+        '-s', f'{width}x{height}',
+        '-r', str(fps),
+        '-i', '-',
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-pix_fmt', 'yuv420p',
+        '-f', 'null', '-'
+    ]
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(frames, width, height, fps, pix_fmt):
+    # 不丢帧、不补帧，保证两种格式编码的帧完全相同
+    sink = EncoderSink(encoder_command(width, height, fps, pix_fmt), fps, queue_size=4,
+                       drop_policy=BLOCK, duplicate_last=False, pix_fmt=pix_fmt,
+                       name=f"bench-{pix_fmt}")
+    child_start = children_cpu()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    sink.start()
+    for frame in frames:
+        sink.queue.put(FramePacket(0, time.time(), frame))
+    while sink.written < len(frames) and sink.is_alive():
+        time.sleep(0.005)
+    sink.close(timeout=60)
+    wall = time.perf_counter() - wall_start
+    python_cpu = time.process_time() - cpu_start
+    ffmpeg_cpu = children_cpu() - child_start
+    stats = sink.stats()
+    return {
+        "python_cpu": python_cpu,
+        "ffmpeg_cpu": ffmpeg_cpu,
+        "wall": wall,
+        "mb": stats["mb_written"],
+        "convert_ms": stats["avg_convert_ms"],
+        "write_ms": stats["avg_write_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BGR24 vs I420 raw frames into the FFmpeg pipe")
+    parser.add_argument('--resolutions', type=str, default="800x450,1920x1080",
+                        help=f"Comma-separated list from {list(RESOLUTIONS)}")
+    parser.add_argument('--frames', type=int, default=150)
+    parser.add_argument('--fps', type=float, default=25.0)
+    args = parser.parse_args()
+
+    for name in args.resolutions.split(','):
+        width, height = RESOLUTIONS[name.strip()]
+        frames = make_frames(width, height, args.frames)
+        video_seconds = args.frames / args.fps
+        print(f"== {width}x{height}, {args.frames} 帧 ({video_seconds:.1f} 秒 @ {args.fps} fps)")
+        results = {}
+        for pix_fmt in (PIX_FMT_BGR24, PIX_FMT_I420):
+            r = run(frames, width, height, args.fps, pix_fmt)
+            results[pix_fmt] = r
+            total = r["python_cpu"] + r["ffmpeg_cpu"]
+            print(f"  {pix_fmt:8s} 管道 {r['mb']:7.1f} MB | Python {r['python_cpu']:.2f}s "
+                  f"(转换 {r['convert_ms']:.2f} ms/帧, 写入 {r['write_ms']:.2f} ms/帧) | "
+                  f"FFmpeg {r['ffmpeg_cpu']:.2f}s | 合计 {total:.2f}s, 每路摄像头约 {total / video_seconds * 100:.0f}% 单核")
+        bgr, i420 = results[PIX_FMT_BGR24], results[PIX_FMT_I420]
+        bgr_total = bgr["python_cpu"] + bgr["ffmpeg_cpu"]
+        i420_total = i420["python_cpu"] + i420["ffmpeg_cpu"]
+        print(f"  I420 管道数据量 {i420['mb'] / bgr['mb'] * 100:.0f}%，端到端CPU变化 {(i420_total / bgr_total - 1) * 100:+.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+WebSocket锚框载荷编码对比
+用模拟的YOLO结果（与ultralytics Boxes一样以整块float32数组保存cls/conf/xyxy）生成一段检测序列
+（每帧若干锚框：一部分静止，如皮带、护罩；其余随皮带移动、置信度抖动），分别编码为：
+    model   DetectionPayload.create_from_detections + model_dump_json（逐框pydantic校验）
+    json    DetectionPayload.json_from_detections（默认格式的快速路径，输出须与model逐字节一致）
+    binary  完整二进制帧
+    delta   相对上一帧的增量
+统计每帧平均字节数、相对JSON的比例和每帧序列化耗时（均从YOLO结果开始计时），
+并检查客户端解码（BoxDecoder）能否还原出与JSON相同的锚框。
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from ws_codec import BoxDecoder, BoxFrame, boxes_from_results, encode_class_table
+from ws_models import DetectionPayload
+
+CLASS_NAMES = {0: "皮带", 1: "煤流", 2: "大块", 3: "锚杆", 4: "护罩", 5: "托辊", 6: "人员"}
+
+
+class MockBoxes:
+    """与ultralytics Boxes相同的访问方式：整块数组属性，逐个迭代得到单框对象"""
+
+    def __init__(self, rows):
+        data = np.array(rows, dtype=np.float32).reshape(-1, 6)
+        self.xyxy = data[:, :4]
+        self.conf = data[:, 4]
+        self.cls = data[:, 5]
+
+    def __iter__(self):
+        for i in range(len(self.cls)):
+            yield MockBoxes([self.xyxy[i].tolist() + [self.conf[i], self.cls[i]]])
+
+
+class MockResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def make_sequence(frames, boxes, static, seed=0):
+    rng = random.Random(seed)
+    fixed = [(rng.choice([0, 4, 5]), round(rng.uniform(0.6, 0.99), 2), rng.randrange(0, 1500), rng.randrange(0, 800),
+              rng.randrange(40, 400), rng.randrange(40, 300)) for _ in range(static)]
+    moving = [[rng.choice([1, 2, 3]), rng.randrange(0, 1900), rng.randrange(0, 1000)] for _ in range(boxes - static)]
+    sequence = []
+    for _ in range(frames):
+        rows = [(x, y, x + w, y + h, conf, c) for c, conf, x, y, w, h in fixed]
+        for box in moving:
+            box[1] = (box[1] + rng.randrange(5, 25)) % 1900
+            rows.append((box[1], box[2], box[1] + 60, box[2] + 45, rng.uniform(0.3, 0.99), box[0]))
+        sequence.append([MockResult(MockBoxes(rows))])
+    return sequence
+
+
+def run(args):
+    sequence = make_sequence(args.frames, args.boxes, args.static)
+    table = encode_class_table(args.camera_id, CLASS_NAMES)
+    sizes = {"model": 0, "json": 0, "binary": 0, "delta": 0}
+    times = {"model": 0.0, "json": 0.0, "binary": 0.0, "delta": 0.0}
+
+    for results in sequence:
+        start = time.perf_counter()
+        expected = DetectionPayload.create_from_detections(args.camera_id, results, CLASS_NAMES, ts=1.0)
+        expected = expected.model_dump_json().encode()
+        times["model"] += time.perf_counter() - start
+        sizes["model"] += len(expected)
+
+        start = time.perf_counter()
+        data = DetectionPayload.json_from_detections(args.camera_id, results, CLASS_NAMES, ts=1.0)
+        times["json"] += time.perf_counter() - start
+        sizes["json"] += len(data)
+        if data != expected:
+            raise AssertionError("json_from_detections 输出与 model_dump_json 不一致")
+
+    last = None
+    decoder = BoxDecoder()
+    decoder.decode(table)
+    mismatches = 0
+    for seq, results in enumerate(sequence, 1):
+        start = time.perf_counter()
+        frame = BoxFrame(args.camera_id, seq, time.time(), boxes_from_results(results), table)
+        data = frame.encoded("binary")
+        times["binary"] += time.perf_counter() - start
+        sizes["binary"] += len(data)
+
+        start = time.perf_counter()
+        frame = BoxFrame(args.camera_id, seq, time.time(), boxes_from_results(results), table, base=last)
+        data = frame.encoded("delta", last.seq if last else None)
+        times["delta"] += time.perf_counter() - start
+        sizes["delta"] += len(data)
+        last = frame
+
+        expected = json.loads(DetectionPayload.create_from_detections(args.camera_id, results, CLASS_NAMES)
+                              .model_dump_json())["boxes"]
+        decoded = decoder.decode(data)["boxes"]
+        key = lambda b: (b["cls"], b["x"], b["y"], b["w"], b["h"])
+        if sorted(map(key, decoded)) != sorted(map(key, expected)):
+            mismatches += 1
+
+    print(f"{args.frames} 帧，每帧 {args.boxes} 个锚框（静止 {args.static} 个），类别表 {len(table)} 字节（连接时发送一次）")
+    for fmt in ("model", "json", "binary", "delta"):
+        print(f"{fmt:>6}: 平均 {sizes[fmt] / args.frames:7.1f} 字节/帧（JSON的 {sizes[fmt] / sizes['json'] * 100:5.1f}%），"
+              f"序列化 {times[fmt] / args.frames * 1e6:6.1f} µs/帧")
+    print(f"增量解码与JSON不一致的帧: {mismatches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and binary WebSocket payload encodings")
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--boxes", type=int, default=10, help="每帧锚框数")
+    parser.add_argument("--static", type=int, default=4, help="其中静止不变的锚框数")
+    parser.add_argument("--camera_id", type=int, default=1)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+WebSocket锚框分发负载测试
+在后台线程启动 ws_server，同一路摄像头接入大量订阅者（默认500个），
+由另一个线程按检测频率发布带10个锚框的DetectionPayload，统计：
+    - 每个订阅者收到的消息数（应与发布数一致，落后时只跳过过期消息）
+    - 从发布到客户端收到的延迟分布
+    - 服务端的丢弃（被更新消息覆盖）和慢客户端断开计数
+客户端与服务端运行在同一台机器上，结果包含双方的CPU开销。
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+from websockets.asyncio.client import connect
+
+import ws_server
+from ws_models import BoundingBox, DetectionPayload
+
+
+def make_message(camera_id, boxes=10):
+    payload = DetectionPayload(
+        ts=time.time(),
+        camera_id=camera_id,
+        boxes=[BoundingBox(cls="大块", conf=0.9, x=10 * i, y=20, w=50, h=40) for i in range(boxes)]
+    )
+    return payload.model_dump_json()
+
+
+async def subscriber(url, latencies, counts, index, stop):
+    async with connect(url, max_queue=None) as websocket:
+        counts[index] = 0
+        while not stop.is_set():
+            try:
+                message = await asyncio.wait_for(websocket.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            latencies.append(time.time() - json.loads(message)["ts"])
+            counts[index] += 1
+
+
+def publisher(camera_id, rate, duration, published):
+    interval = 1.0 / rate
+    end = time.monotonic() + duration
+    next_time = time.monotonic()
+    while time.monotonic() < end:
+        ws_server.manager.publish_threadsafe(camera_id, make_message(camera_id))
+        published.append(1)
+        next_time += interval
+        time.sleep(max(0.0, next_time - time.monotonic()))
+
+
+async def run(args):
+    ws_server.start_server_thread("127.0.0.1", 0)
+    url = f"ws://127.0.0.1:{ws_server.manager.port}/ws/boxes/{args.camera_id}"
+    latencies, counts, published = [], {}, []
+    stop = asyncio.Event()
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(args.clients):
+        tasks.append(asyncio.ensure_future(subscriber(url, latencies, counts, i, stop)))
+        if i % 50 == 49:
+            await asyncio.sleep(0.05)
+    while len(counts) < args.clients:
+        await asyncio.sleep(0.05)
+    print(f"{args.clients} 个订阅者已连接，用时 {time.perf_counter() - started:.1f} 秒")
+
+    cpu_start = time.process_time()
+    thread = threading.Thread(target=publisher, args=(args.camera_id, args.rate, args.duration, published))
+    thread.start()
+    await asyncio.get_running_loop().run_in_executor(None, thread.join)
+    await asyncio.sleep(1.0)
+    cpu = time.process_time() - cpu_start
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    stats = ws_server.manager.stats()
+    latencies.sort()
+    received = sorted(counts.values())
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+    print(f"发布 {len(published)} 条 × {args.clients} 个订阅者，应收 {len(published) * args.clients} 条，"
+          f"实收 {len(latencies)} 条")
+    print(f"单个订阅者收到: 最少 {received[0]}，最多 {received[-1]}")
+    print(f"延迟: p50 {pct(0.5):.1f} ms，p99 {pct(0.99):.1f} ms，最大 {pct(1.0):.1f} ms")
+    print(f"服务端: 覆盖丢弃 {sum(c['dropped'] for c in stats['cameras'].values())}，"
+          f"慢客户端断开 {stats['slow_disconnects']}")
+    print(f"CPU（客户端+服务端）: {cpu / (args.duration + 1.0) * 100:.0f}% 单核")
+    ws_server.stop_websocket_server()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket detection fan-out load test")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=10.0, help="每秒发布的检测结果数")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--camera_id", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
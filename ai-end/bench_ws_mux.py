@@ -0,0 +1,97 @@
+"""
+多路复用WebSocket对比测试（总览大屏场景）
+在后台线程启动 ws_server，若干个大屏客户端各自查看全部摄像头，分两轮对比：
+    per-camera  每个客户端为每路摄像头各开一个 /ws/boxes/{camera_id} 连接
+    mux         每个客户端只开一个 /ws/mux?cameras=... 连接，同一时刻的多路结果合并为一帧
+各摄像头按检测频率几乎同时发布（同一轮检测），统计：
+    - 连接数、客户端收到的WebSocket帧数和锚框消息数
+    - 从发布到客户端收到的延迟分布
+    - CPU占用（客户端+服务端，同一进程）
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+from websockets.asyncio.client import connect
+
+import ws_server
+from bench_ws_fanout import make_message
+
+
+async def reader(url, latencies, counters, stop):
+    async with connect(url, max_queue=None) as websocket:
+        counters["connected"] += 1
+        while not stop.is_set():
+            try:
+                frame = await asyncio.wait_for(websocket.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            payloads = json.loads(frame)
+            payloads = payloads if isinstance(payloads, list) else [payloads]
+            counters["frames"] += 1
+            counters["messages"] += len(payloads)
+            now = time.time()
+            latencies.extend(now - payload["ts"] for payload in payloads)
+
+
+def publisher(cameras, rate, duration):
+    interval = 1.0 / rate
+    end = time.monotonic() + duration
+    next_time = time.monotonic()
+    while time.monotonic() < end:
+        for camera_id in range(1, cameras + 1):
+            ws_server.manager.publish_threadsafe(camera_id, make_message(camera_id))
+        next_time += interval
+        time.sleep(max(0.0, next_time - time.monotonic()))
+
+
+async def run_round(args, mux):
+    port = ws_server.manager.port
+    if mux:
+        cameras = ",".join(str(c) for c in range(1, args.cameras + 1))
+        urls = [f"ws://127.0.0.1:{port}/ws/mux?cameras={cameras}"] * args.clients
+    else:
+        urls = [f"ws://127.0.0.1:{port}/ws/boxes/{c}" for _ in range(args.clients) for c in range(1, args.cameras + 1)]
+    latencies, counters, stop = [], {"connected": 0, "frames": 0, "messages": 0}, asyncio.Event()
+    tasks = [asyncio.ensure_future(reader(url, latencies, counters, stop)) for url in urls]
+    while counters["connected"] < len(urls):
+        await asyncio.sleep(0.05)
+
+    cpu_start = time.process_time()
+    thread = threading.Thread(target=publisher, args=(args.cameras, args.rate, args.duration))
+    thread.start()
+    await asyncio.get_running_loop().run_in_executor(None, thread.join)
+    await asyncio.sleep(0.5)
+    cpu = time.process_time() - cpu_start
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+    name = "mux" if mux else "per-camera"
+    print(f"{name:>10}: 连接 {len(urls)} 个，收到 {counters['frames']} 帧 / {counters['messages']} 条，"
+          f"延迟 p50 {pct(0.5):.1f} ms，p99 {pct(0.99):.1f} ms，CPU {cpu / (args.duration + 0.5) * 100:.0f}% 单核")
+
+
+async def run(args):
+    ws_server.start_server_thread("127.0.0.1", 0)
+    print(f"{args.clients} 个大屏客户端 × {args.cameras} 路摄像头，每路每秒 {args.rate:g} 次，持续 {args.duration:g} 秒")
+    await run_round(args, mux=False)
+    await asyncio.sleep(0.5)
+    await run_round(args, mux=True)
+    ws_server.stop_websocket_server()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-camera sockets with the multiplexed endpoint")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=5.0, help="每路每秒发布的检测结果数")
+    parser.add_argument("--duration", type=float, default=10.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
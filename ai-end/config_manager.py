@@ -26,6 +26,26 @@ class ConfigManager:
         parser.add_argument('--base_url', type=str, default="http://localhost:8080", help="Base URL for API endpoints")
         parser.add_argument('--cooldown', type=int, default=30, help="Event reporting cooldown period in minutes (default: 30)")
         parser.add_argument('--detection_interval', type=float, default=1.0, help="Detection interval in seconds (default: 1.0 for balanced performance)")
+        parser.add_argument('--reconnect_max_delay', type=float, default=30.0, help="Maximum backoff delay in seconds between RTSP reconnect attempts (default: 30)")
+        parser.add_argument('--overlay', type=str, choices=['none', 'hls', 'both'], default='both', help="Where detection boxes are rendered: none (WebSocket only, clean HLS), hls (burned into HLS only) or both (default)")
+        parser.add_argument('--hls_mode', type=str, choices=['encode', 'copy'], default='encode', help="HLS output: encode (resize and re-encode frames, default) or copy (stream-copy the camera's H.264, implies --overlay none)")
+        parser.add_argument('--encoder_drop_policy', type=str, choices=['drop_oldest', 'drop_newest', 'block'], default='drop_oldest', help="What to do when the encoder falls behind (default: drop_oldest)")
+        parser.add_argument('--no_frame_duplication', action='store_true', help="Do not repeat the last frame to hold the output frame rate")
+        parser.add_argument('--pipe_pix_fmt', type=str, choices=['bgr24', 'yuv420p'], default='bgr24', help="Raw frame format sent to FFmpeg; yuv420p converts to I420 in the writer thread and halves pipe bandwidth (default: bgr24)")
+        parser.add_argument('--abr_ladder', type=str, default="", help="Comma-separated output heights for adaptive-bitrate HLS from one FFmpeg process, e.g. 450,360,240; the HLS filename becomes the master playlist (encode mode only, not with --ll_hls)")
+        parser.add_argument('--http_server', type=str, choices=['flask', 'async', 'external'], default='flask', help="HLS/coal quantity server: flask (per-process Flask dev server), async (per-process asyncio server with in-memory playlists and sendfile), external (no server here; one hls_server.py serves all cameras) (default: flask)")
+        parser.add_argument('--hls_port', type=int, default=None, help="HLS server port (default: 2000 + camera ID, or 2000 for --http_server external)")
+        parser.add_argument('--hls_camera_max_mb', type=float, default=None, help="Per-camera HLS disk budget in MB; the oldest segments are deleted beyond it (default: unlimited)")
+        parser.add_argument('--hls_total_max_mb', type=float, default=None, help="Disk budget in MB for the whole HLS directory across cameras, enforced only with --hls_janitor_global (default: unlimited)")
+        parser.add_argument('--hls_janitor_global', action='store_true', help="Sweep the whole HLS directory and enforce --hls_total_max_mb from this process; enable it on one process only (or give --hls_total_max_mb to hls_server.py instead). Without it each process only cleans its own camera directory")
+        parser.add_argument('--hls_max_age', type=float, default=None, help="Delete HLS segments older than this many seconds (default: unlimited)")
+        parser.add_argument('--hls_tmpfs', action='store_true', help="Keep HLS output on a RAM-backed directory under /dev/shm (hls_dir becomes a symlink when possible)")
+        parser.add_argument('--hls_metadata', action='store_true', help="Carry per-frame detection boxes as a WebVTT subtitle track aligned with the video; the HLS URL becomes <name>_master.m3u8 (encode mode only)")
+        parser.add_argument('--ws_hub', type=str, default=None, help="Publish WebSocket detection boxes to a shared detection_hub.py over this Unix socket instead of starting a WebSocket server in this process (one port for all cameras)")
+        parser.add_argument('--headless', action='store_true', help="Detection-only mode: no FFmpeg, rendering, HLS or WebSocket boxes; decodes at the detection rate and keeps alarms and coal quantity")
+        parser.add_argument('--mosaic_tile', type=str, default="", help="Publish a downscaled tile (e.g. 320x180) to shared memory for the mosaic.py wall display compositor (requires --cameraid)")
+        parser.add_argument('--ll_hls', action='store_true', help="Low-latency HLS: fMP4 partial segments with preload hints and blocking playlist reload, served from memory (encode mode only)")
+        parser.add_argument('--stall_timeout', type=float, default=10.0, help="Seconds without a new frame before the RTSP stream is considered lost (default: 10)")
         
         args = parser.parse_args()
         self.camera_id = args.cameraid
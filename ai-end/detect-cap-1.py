@@ -5,7 +5,7 @@ import os
 import cv2
 import subprocess
 import threading
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, send_from_directory, jsonify, request, Response
 import sys
 from flask_cors import CORS
 import requests
@@ -16,7 +16,6 @@ import base64
 import signal
 import mysql.connector
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
 import yaml
 
 # 导入自定义模块
@@ -24,6 +23,25 @@ from config_manager import config_manager
 from alarm_type_mapper import AlarmTypeMapper
 from event_reporter import EventReporter
 from modbus_client import ModbusClient
+from video_pipeline import (
+    VideoPipeline, PipelineStage, FramePacket, LatestValue,
+    DROP_OLDEST, BLOCK
+)
+from rtsp_capture import ReconnectingFrameReader
+from label_renderer import LabelRenderer
+from overlay_compositor import OverlayLayer
+from hls_remux import HlsRemuxer
+from encoder_sink import EncoderSink, PIX_FMT_BGR24
+from ll_hls import LowLatencyPlaylist, LowLatencyHlsPackager
+from encoder_registry import get_encoder_registry, bitrate_for
+from abr_ladder import parse_ladder, abr_output_args, RenditionCpuMeter
+from mosaic import TileWriter, parse_size
+from resource_monitor import ResourceMeter, process_uptime
+from hls_server import IMMUTABLE, HlsHttpServer, publish_coal_quantity, segment_start_number
+from hls_janitor import HlsJanitor, ram_backed_dir
+from snapshot import SnapshotCache, MJPEG_CONTENT_TYPE, parse_variant
+from hls_metadata import WebVttMetadataTrack, master_playlist, PLAYLIST_NAME as METADATA_PLAYLIST
+from ws_models import DetectionPayload
 
 # 导入WebSocket相关模块
 from ws_producer import detection_producer
@@ -70,12 +88,8 @@ CLASS_COLORS = {
 
 print("[DEBUG] Script starting up...") # 添加启动调试信息
 
-def get_font(size=60, font_path=None):
-    try:
-        font_path = font_path or "./WenJinMincho-TTF.ttc"
-        return ImageFont.truetype(font_path, size)
-    except IOError:
-        return ImageFont.load_default()
+# 标签文字渲染器：字形位图缓存后只在标签区域内混合，无需整帧转换为PIL图像
+label_renderer = LabelRenderer()
 
 class Drawer:
     @staticmethod
@@ -91,13 +105,25 @@ class Drawer:
         cv2.rectangle(frame, (x1, y1), (x2, y2), color, line_thickness)
         
         label_text = f"{label}{f': {ratio}' if cls == 1 and ratio else ''}"
-        pil_img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(pil_img)
         
         # 根据缩放因子调整字体大小
         font_size = max(20, int(60 * scale_factor))
-        draw.text((x1, y1 - int(25 * scale_factor)), label_text, font=get_font(font_size), fill=(color[2], color[1], color[0]))
-        return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+        label_renderer.draw(frame, label_text, (x1, y1 - int(25 * scale_factor)), font_size, color)
+        return frame
+
+    @staticmethod
+    def draw_results(frame, results, coal_ratio_str=None, scale_factor=1.0):
+        """在帧上绘制一次检测的全部锚框和标签"""
+        for result in results:
+            boxes = result.boxes
+            if boxes is not None:
+                for box in boxes:
+                    cls = int(box.cls[0])
+                    label = CLASS_NAMES.get(cls, "未知")
+                    frame = Drawer.draw(frame, box, label,
+                                        coal_ratio_str if cls == 1 else None,
+                                        scale_factor=scale_factor)
+        return frame
 
 # 用于连接 MySQL 的函数
 def update_camera_rtsp_url(camera_id, rtsp_url):
@@ -237,66 +263,26 @@ def generate_hls_stream(camera_id, frame):
     target_width = 640   # 统一宽度（640÷32=20，完美兼容）
     target_height = 352  # YOLO兼容高度（352÷32=11，接近360）
     
-    # 检测是否支持NVIDIA硬件编码
-    import subprocess
-    try:
-        subprocess.run(['ffmpeg', '-encoders'], capture_output=True, text=True)
-        has_nvenc = 'h264_nvenc' in subprocess.run(['ffmpeg', '-encoders'], capture_output=True, text=True).stdout
-    except:
-        has_nvenc = False
-    
-    if has_nvenc:
-        # NVIDIA GPU硬件编码 - 低延迟优化
-        ffmpeg_cmd = [
-            'ffmpeg', '-y',
-            '-f', 'rawvideo',
-            '-vcodec', 'rawvideo',
-            '-pix_fmt', 'bgr24',
-            '-s', f"{target_width}x{target_height}",
-            '-r', '15',  # 统一15fps平衡性能和带宽
-            '-i', '-',
-            '-c:v', 'h264_nvenc',  # NVIDIA硬件编码
-            '-preset', 'llhp',     # 低延迟高性能
-            '-tune', 'zerolatency', # 零延迟调优
-            '-rc', 'cbr',          # 固定码率
-            '-b:v', '800k',        # 800kbps码率
-            '-maxrate', '1M',      # 最大1Mbps
-            '-bufsize', '800k',    # 缓冲区优化
-            '-g', '30',            # GOP大小
-            '-pix_fmt', 'yuv420p',
-            '-f', 'hls',
-            '-hls_time', '1',      # 1秒分片（原来是2秒）
-            '-hls_list_size', '3',  # 只保留3个分片
-            '-hls_flags', 'delete_segments+append_list',
-            '-hls_playlist_type', 'event',
-            '-hls_segment_filename', f"{hls_path}/{camera_id}_%03d.ts",
-            f"{hls_path}/{m3u8_name}"
-        ]
-    else:
-        # CPU优化编码
-        ffmpeg_cmd = [
-            'ffmpeg', '-y',
-            '-f', 'rawvideo',
-            '-vcodec', 'rawvideo',
-            '-pix_fmt', 'bgr24',
-            '-s', f"{target_width}x{target_height}",
-            '-r', '15',
-            '-i', '-',
-            '-c:v', 'libx264',
-            '-preset', 'ultrafast',
-            '-tune', 'zerolatency',
-            '-crf', '25',  # 优化CRF值
-            '-maxrate', '600k',
-            '-bufsize', '600k',
-            '-g', '30',
-            '-pix_fmt', 'yuv420p',
-            '-f', 'hls',
-            '-hls_time', '1',
-            '-hls_list_size', '3',
-            '-hls_flags', 'delete_segments',
-            '-hls_segment_filename', f"{hls_path}/{camera_id}_%03d.ts",
-            f"{hls_path}/{m3u8_name}"
-        ]
+    # 编码器和码率由注册表给出（启动时已探测并缓存，这里不再运行FFmpeg探测）
+    encoder_registry = get_encoder_registry()
+    ffmpeg_cmd = [
+        encoder_registry.ffmpeg_path, '-y',
+        '-f', 'rawvideo',
+        '-vcodec', 'rawvideo',
+        '-pix_fmt', 'bgr24',
+        '-s', f"{target_width}x{target_height}",
+        '-r', '15',  # 统一15fps平衡性能和带宽
+        '-i', '-',
+    ] + encoder_registry.video_args(target_width, target_height, 15, low_latency=True) + [
+        '-g', '30',            # GOP大小
+        '-f', 'hls',
+        '-hls_time', '1',      # 1秒分片（原来是2秒）
+        '-hls_list_size', '3',  # 只保留3个分片
+        '-hls_flags', 'delete_segments',
+        '-start_number', str(segment_start_number()),
+        '-hls_segment_filename', f"{hls_path}/{camera_id}_%03d.ts",
+        f"{hls_path}/{m3u8_name}"
+    ]
     
     # 使用subprocess处理视频帧并创建HLS流
     try:
@@ -316,10 +302,62 @@ def generate_hls_stream(camera_id, frame):
         print(f"[错误] 生成HLS流失败: {e}")
         return None
 
-def start_ffmpeg(output_dir, output_filename, width, height, fps, camera_id=None, hls_server_actual_port=None):
+def hls_output_target(output_dir, output_filename, camera_id=None, hls_server_actual_port=None):
+    """
+    确定HLS播放列表的输出路径和对外访问URL
+
+    Returns:
+        str: 播放列表文件路径
+        str: HLS流的URL
+    """
+    # 如果提供了摄像头ID，则为该摄像头创建单独的目录
+    if camera_id is not None:
+        camera_output_dir = os.path.join(output_dir, f"camera_{camera_id}")
+        os.makedirs(camera_output_dir, exist_ok=True)
+        output_path = os.path.join(camera_output_dir, output_filename)
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, output_filename)
+
+    # 使用传入的实际HLS服务器端口构建URL
+    if camera_id and hls_server_actual_port:
+        hls_url = f"http://localhost:{hls_server_actual_port}/hls_output/camera_{camera_id}/{output_filename}"
+        print(f"[DEBUG] hls_output_target: Generated HLS URL for camera {camera_id}: {hls_url}")
+    elif hls_server_actual_port: # 无camera_id但有端口（通用服务器）
+        hls_url = f"http://localhost:{hls_server_actual_port}/hls_output/{output_filename}"
+        print(f"[DEBUG] hls_output_target: Generated HLS URL (generic): {hls_url}")
+    else:
+        # 保留一个默认的回退，但理想情况下 hls_server_actual_port 应该总是被提供
+        default_port = 2022
+        hls_url = f"http://localhost:{default_port}/hls_output/{output_filename}"
+        print(f"[DEBUG] hls_output_target: Using fallback HLS URL: {hls_url}")
+
+    return output_path, hls_url
+
+# 低延迟HLS参数：部分分片时长和完整分片（GOP）时长，单位秒
+LL_HLS_PART_DURATION = 0.2
+LL_HLS_SEGMENT_DURATION = 1.0
+
+# 内存中的低延迟HLS播放列表，键为 hls_output 下的目录名（如 camera_1），由HLS服务器直接提供
+ll_hls_playlists = {}
+
+# 最新画面快照，由HLS服务器按需编码为JPEG提供（/api/snapshot.jpg、/api/mjpeg）
+latest_snapshots = SnapshotCache()
+
+def start_ffmpeg(output_dir, output_filename, width, height, fps, camera_id=None, hls_server_actual_port=None,
+                 pix_fmt=PIX_FMT_BGR24, low_latency=False, renditions=None, start_number=None, **sink_options):
     """
     启动ffmpeg进程，将视频流转换为HLS格式
     
+    帧通过EncoderSink的写入线程送入FFmpeg，上游只需把帧放入 sink.queue 或调用 sink.submit()
+    
+    low_latency=True 时输出LL-HLS：FFmpeg把约0.2秒一个的fMP4部分分片写到标准输出，
+    由LowLatencyHlsPackager在内存中组装播放列表，HLS服务器从 ll_hls_playlists 中读取，
+    支持部分分片、预加载提示和 _HLS_msn/_HLS_part 阻塞式刷新。
+    
+    指定 renditions 时在同一个FFmpeg进程中输出多码率HLS：output_filename 为主播放列表，
+    各档位由 split/scale 滤镜图从同一路输入生成（见 abr_ladder）。
+    
     Args:
         output_dir: 输出目录
         output_filename: 输出文件名
@@ -328,54 +366,92 @@ def start_ffmpeg(output_dir, output_filename, width, height, fps, camera_id=None
         fps: 帧率
         camera_id: 摄像头ID，用于创建特定摄像头的输出目录
         hls_server_actual_port: HLS服务器实际监听的端口
+        pix_fmt: 管道中的原始帧格式，bgr24 或 yuv420p（在写入线程中转换，管道数据量减半）
+        low_latency: 是否输出低延迟HLS
+        renditions: ABR码率档位列表（Rendition），为空时只输出单一码率
+        start_number: 第一个分片的序号，None时取 segment_start_number()，保证各次运行的分片URI不重复
+        sink_options: 传给EncoderSink的参数（queue_size、drop_policy、duplicate_last、on_error等）
     
     Returns:
-        subprocess.Popen: ffmpeg进程
+        EncoderSink: 已启动的编码输出端
         str: HLS流的URL
     """
-    # 如果提供了摄像头ID，则为该摄像头创建单独的目录
-    if camera_id is not None:
-        camera_output_dir = os.path.join(output_dir, f"camera_{camera_id}")
-        os.makedirs(camera_output_dir, exist_ok=True)
-        output_path = os.path.join(camera_output_dir, output_filename)
-    else:
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, output_filename)
+    output_path, hls_url = hls_output_target(output_dir, output_filename, camera_id, hls_server_actual_port)
+    encoder_registry = get_encoder_registry()
+    if start_number is None:
+        start_number = segment_start_number()
     
     command = [
-        'ffmpeg',
+        encoder_registry.ffmpeg_path,
         '-y',
         '-f', 'rawvideo',
         '-vcodec', 'rawvideo',
-        '-pix_fmt', 'bgr24',
+        '-pix_fmt', pix_fmt,
         '-s', f'{width}x{height}',
         '-r', str(fps),
         '-i', '-',  # 从标准输入读取视频
-        '-c:v', 'libx264',
-        '-preset', 'veryfast',
-        '-pix_fmt', 'yuv420p',
-        '-f', 'hls',
-        '-hls_time', '2',
-        '-hls_list_size', '5',
-        '-hls_flags', 'delete_segments',
-        output_path
     ]
-    process = subprocess.Popen(command, stdin=subprocess.PIPE)
-    
-    # 使用传入的实际HLS服务器端口构建URL
-    if camera_id and hls_server_actual_port:
-        hls_url = f"http://localhost:{hls_server_actual_port}/hls_output/camera_{camera_id}/{output_filename}"
-        print(f"[DEBUG] start_ffmpeg: Generated HLS URL for camera {camera_id}: {hls_url}")
-    elif hls_server_actual_port: # 无camera_id但有端口（通用服务器）
-        hls_url = f"http://localhost:{hls_server_actual_port}/hls_output/{output_filename}"
-        print(f"[DEBUG] start_ffmpeg: Generated HLS URL (generic): {hls_url}")
-    else:
-        # 保留一个默认的回退，但理想情况下 hls_server_actual_port 应该总是被提供
-        default_port = 2022
-        hls_url = f"http://localhost:{default_port}/hls_output/{output_filename}"
-        print(f"[DEBUG] start_ffmpeg: Using fallback HLS URL: {hls_url}")
-        
-    return process, hls_url
+    if renditions:
+        command += abr_output_args(renditions, encoder_registry, width, height, fps, output_path,
+                                   start_number=start_number)
+        sink = EncoderSink(command, fps, name=f"encoder-{camera_id}", pix_fmt=pix_fmt, **sink_options).start()
+        print(f"[HLS流] 多码率输出: {', '.join(f'{r.width}x{r.height}' for r in renditions)}")
+        return sink, hls_url
+
+    command += encoder_registry.video_args(width, height, fps, low_latency=low_latency)
+    if not low_latency:
+        command += [
+            '-f', 'hls',
+            '-hls_time', '2',
+            '-hls_list_size', '5',
+            # 分片带上 EXT-X-PROGRAM-DATE-TIME，可据此核对HLS时间轴与真实时间是否一致
+            '-hls_flags', 'delete_segments+program_date_time',
+            '-start_number', str(start_number),
+            output_path
+        ]
+        sink = EncoderSink(command, fps, name=f"encoder-{camera_id}", pix_fmt=pix_fmt, **sink_options).start()
+        return sink, hls_url
+
+    # 固定GOP，使每个完整分片都从关键帧开始；按时长切出的部分分片可以从非关键帧开始
+    gop = max(1, int(round(fps * LL_HLS_SEGMENT_DURATION)))
+    command += [
+        '-g', str(gop),
+        '-keyint_min', str(gop),
+        '-sc_threshold', '0',
+        '-f', 'mp4',
+        '-movflags', 'empty_moov+default_base_moof+frag_keyframe',
+        '-frag_duration', str(int(LL_HLS_PART_DURATION * 1_000_000)),
+        '-flush_packets', '1',
+        'pipe:1'
+    ]
+    playlist = LowLatencyPlaylist(output_filename, part_target=LL_HLS_PART_DURATION,
+                                  segment_target=LL_HLS_SEGMENT_DURATION, run_id=start_number)
+    sink = EncoderSink(command, fps, name=f"encoder-{camera_id}", pix_fmt=pix_fmt,
+                       stdout=subprocess.PIPE, **sink_options).start()
+    LowLatencyHlsPackager(sink.process.stdout, playlist, name=f"camera_{camera_id}").start()
+    ll_hls_playlists[f"camera_{camera_id}" if camera_id is not None else ""] = playlist
+    print(f"[HLS流] 低延迟HLS已启动，部分分片 {LL_HLS_PART_DURATION}s，分片 {LL_HLS_SEGMENT_DURATION}s")
+    return sink, hls_url
+
+def start_hls_remux(rtsp_url, output_dir, output_filename, camera_id=None, hls_server_actual_port=None, is_live_source=True):
+    """
+    启动直通转封装：FFmpeg直接把摄像头的H.264码流复制为HLS，不经过Python解码和重新编码
+
+    Returns:
+        HlsRemuxer: 转封装进程（断流退出后自动重启）
+        str: HLS流的URL
+    """
+    output_path, hls_url = hls_output_target(output_dir, output_filename, camera_id, hls_server_actual_port)
+    remuxer = HlsRemuxer(
+        rtsp_url,
+        output_path,
+        max_retries=None if is_live_source else 0,
+        ffmpeg_path=get_encoder_registry().ffmpeg_path,
+        name=f"camera_{camera_id}",
+        start_number=segment_start_number()
+    )
+    remuxer.start()
+    return remuxer, hls_url
 
 def send_alarm_event_worker(event_queue, upper_computer_url, api_key=None):
     while not exit_event.is_set():
@@ -497,52 +573,230 @@ def should_detect_class(cls_id):
 # 全局变量用于存储各摄像头的煤量数据
 camera_coal_quantities = {}
 
-def predict_realtime(model_path, rtsp_url, img_size, output_dir, output_filename, class_ids, conf=0.25, 
-                    belt_scale=1.0, person_region=None, smoke_threshold=0.5, camera_id=None, hls_server_actual_port=None, detection_interval=1.0):
+def log_detection_config(class_ids):
+    """打印当前的检测配置和启用的检测类别，便于监控"""
+    # 尝试打印从Modbus直接获取的配置（如果连接）
+    if 'modbus_client' in globals() and modbus_client and modbus_client.connected: # (修正: is_connected -> connected)
+        try:
+            current_modbus_config = {}
+            if hasattr(modbus_client, 'is_detection_enabled'):
+                current_modbus_config["大块检测"] = modbus_client.is_detection_enabled(DETECT_LARGE_CHUNK)
+                current_modbus_config["异物检测"] = modbus_client.is_detection_enabled(DETECT_FOREIGN_OBJECT)
+                current_modbus_config["人员越界检测"] = modbus_client.is_detection_enabled(DETECT_PERSONNEL)
+                current_modbus_config["跑偏检测"] = modbus_client.is_detection_enabled(DETECT_DEVIATION)
+                print(f"[预测] 当前Modbus检测配置 (live): {current_modbus_config}")
+            else:
+                print("[预测] ModbusClient.is_detection_enabled 方法不存在，无法获取实时Modbus配置。")
+        except Exception as e:
+            print(f"[预测] 获取实时Modbus配置失败: {e}")
+    else:
+        print(f"[预测] 当前检测配置 (cached): {detection_config}")
+
+    # 打印当前启用的类别
+    working_class_ids = [cid for cid in class_ids if should_detect_class(cid)]
+    enabled_classes = [CLASS_NAMES.get(cid, f"类别{cid}") for cid in working_class_ids]
+    print(f"[预测] 当前启用的检测类别: {enabled_classes}")
+
+def make_placeholder_frame(width, height, text):
+    """生成断流期间输出到HLS的占位画面"""
+    frame = np.full((height, width, 3), 32, dtype=np.uint8)
+    font_scale = max(0.5, width / 1000)
+    thickness = max(1, int(2 * font_scale))
+    (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    origin = ((width - text_w) // 2, (height + text_h) // 2)
+    cv2.putText(frame, text, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (200, 200, 200), thickness, cv2.LINE_AA)
+    return frame
+
+# 流水线各阶段之间的队列容量
+CAPTURE_QUEUE_SIZE = 2      # 采集 → 预处理
+INFERENCE_QUEUE_SIZE = 1    # 预处理 → 推理（只保留最新的待检测帧）
+POSTPROCESS_QUEUE_SIZE = 2  # 推理 → 后处理/报警（检测结果不丢弃）
+RENDER_QUEUE_SIZE = 2       # 预处理 → 渲染
+ENCODE_QUEUE_SIZE = 2       # 渲染 → 编码写入线程
+MOSAIC_QUEUE_SIZE = 1       # 渲染 → 拼接画面图块（只保留最新帧）
+MOSAIC_TILE_FPS = 15.0      # 拼接画面图块的最高更新帧率
+PIPELINE_STATS_INTERVAL = 30.0  # 流水线统计打印间隔（秒）
+
+def predict_realtime(model_path, rtsp_url, img_size, output_dir, output_filename, class_ids, conf=0.25,
+                    belt_scale=1.0, person_region=None, smoke_threshold=0.5, camera_id=None, hls_server_actual_port=None, detection_interval=1.0,
+                    reconnect_max_delay=30.0, stall_timeout=10.0, overlay_mode="both", hls_mode="encode",
+                    encoder_drop_policy=DROP_OLDEST, encoder_duplicate_last=True, pipe_pix_fmt=PIX_FMT_BGR24,
+                    low_latency_hls=False, abr_ladder="", mosaic_tile="", headless=False,
+                    coal_quantity_file=False, hls_janitor=None, hls_metadata=False, ws_hub=None):
+    """
+    实时检测主流程，按阶段拆分为多线程流水线：
+
+        capture → preprocess ─┬→ render → encode
+                              └→ inference → postprocess/alarm
+
+    预处理阶段按检测间隔把帧分流给推理阶段；后处理阶段把最新检测结果写入共享状态，
+    渲染阶段据此为每一帧绘制锚框；编码输出端（EncoderSink）的写入线程按固定帧率向FFmpeg输出，
+    推理耗时和编码器变慢都不会反压到采集阶段。
+
+    摄像头断流时在进程内自动重连，模型、FFmpeg进程和WebSocket生产者保持运行，
+    断流期间向HLS输出占位画面。
+
+    overlay_mode 控制锚框的输出方式：
+        none - HLS输出原始画面，锚框只通过WebSocket下发，不创建渲染阶段
+        hls  - 锚框绘制到HLS画面中，不启动WebSocket生产者
+        both - 同时绘制到HLS画面并通过WebSocket下发
+    报警快照只在事件确实通过冷却检查、需要上传时才渲染。
+
+    hls_mode 为 copy 时HLS由FFmpeg直接从摄像头转封装（-c copy），流水线只剩
+    capture → preprocess → inference → postprocess，采集层按检测间隔抽帧解码，
+    只有送去推理的帧才做色彩转换和缩放；
+    该模式下画面不经过Python，锚框只能通过WebSocket下发。
+
+    abr_ladder 为逗号分隔的输出高度（如 "450,360,240"）时，编码模式在一个FFmpeg进程内
+    输出多码率HLS和主播放列表，并定期打印每个档位的CPU占用。
+
+    mosaic_tile 为图块尺寸（如 "320x180"）时，送往编码的画面同时缩小写入共享内存图块，
+    由 mosaic.py 拼接进程把多路摄像头合成一路HLS（hls_output/mosaic/）。
+
+    headless=True 时不输出任何画面：不启动FFmpeg、不渲染、不下发WebSocket锚框，
+    流水线与直通模式相同，采集层按检测间隔解码，只保留报警（Modbus、事件上报）和煤量计算。
+    启动耗时和CPU/内存占用定期打印，便于与完整模式比较。
+
+    coal_quantity_file=True 时煤量同时写入 <output_dir>/camera_<id>/coal_quantity.json，
+    供独立运行的 hls_server.py 在统一端口上提供煤量接口。
+
+    hls_janitor 为HlsJanitor时，其分片写入/删除统计随流水线统计定期打印。
+
+    hls_metadata=True 时每次检测的锚框（DetectionPayload）按被检测帧在视频中的时间写入WebVTT字幕轨道，
+    HLS地址改为带字幕组的主播放列表，前端按视频时间取锚框，与画面对齐（仅普通编码模式）。
+
+    ws_hub 为Unix套接字路径时不在本进程启动WebSocket服务器，检测结果发往独立运行的 detection_hub.py，
+    同一台主机上的所有摄像头共用一个WebSocket端口。
+    """
     print(f"[DEBUG] predict_realtime called with hls_server_actual_port: {hls_server_actual_port}")
     model = YOLO(model_path)
     valid_classes = list(range(8))  # 8个类别
     if not all(cid in valid_classes for cid in class_ids):
         raise ValueError(f"Invalid class_ids: {class_ids}. Valid range: {valid_classes}")
 
-    cap = cv2.VideoCapture(rtsp_url)
-    if not cap.isOpened():
+    hls_copy = hls_mode == "copy" and not headless
+    # 直通和无画面模式下Python侧的画面只供推理使用
+    inference_only = hls_copy or headless
+    if headless:
+        print("[视频处理] 无画面模式：不编码、不渲染、不提供HLS，只做检测和报警")
+        overlay_mode = "none"
+        low_latency_hls = False
+        abr_ladder = mosaic_tile = ""
+    if hls_copy and low_latency_hls:
+        print("[视频处理] 直通转封装模式不支持低延迟HLS，按普通HLS输出")
+    if abr_ladder and (hls_copy or low_latency_hls):
+        print("[视频处理] 直通转封装和低延迟HLS模式不支持多码率输出，按单一码率输出")
+        abr_ladder = ""
+    if hls_copy and overlay_mode != "none":
+        print(f"[视频处理] 直通转封装模式无法在HLS画面上绘制锚框，锚框输出模式由 {overlay_mode} 改为 none")
+        overlay_mode = "none"
+
+    # 只有推理需要Python侧的画面时按检测间隔抽帧解码，其余帧只推进码流
+    decode_interval = detection_interval if inference_only else 0.0
+
+    # 在独立线程上解码，只保留最新一帧，下游变慢时跳过旧帧而不是累积延迟；
+    # 网络流断开后按指数退避重连，本地文件读完即结束
+    is_live_source = "://" in str(rtsp_url)
+    cap = ReconnectingFrameReader(
+        rtsp_url,
+        max_delay=reconnect_max_delay,
+        stall_timeout=stall_timeout,
+        max_retries=None if is_live_source else 0,
+        name=f"camera_{camera_id}",
+        decode_interval=decode_interval
+    )
+    if not cap.open():
         raise IOError(f"Cannot open RTSP stream {rtsp_url}")
+    render_overlay = overlay_mode in ("hls", "both")
+    # 无画面模式没有可供叠加锚框的视频，不下发WebSocket检测结果
+    send_websocket = overlay_mode in ("none", "both") and not headless
+    print(f"[视频处理] 锚框输出模式: {overlay_mode}")
 
     # 启动WebSocket检测结果生产者
-    detection_producer.start()
+    if send_websocket:
+        detection_producer.start(hub_socket=ws_hub)
 
     # 获取原始视频尺寸
     original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = cap.get(cv2.CAP_PROP_FPS) or 25
-    
+    if not 1 <= fps <= 60:
+        # 部分RTSP源报告的是时间基（如90000）而不是帧率
+        print(f"[视频处理] 视频源报告的帧率 {fps} 不可信，按25fps输出")
+        fps = 25
+
     # 设置目标分辨率 - 确保精确的16:9比例
     target_width = 800
     target_height = 450
-    
+
     print(f"[视频处理] 原始分辨率: {original_width}x{original_height}")
     print(f"[视频处理] 目标分辨率: {target_width}x{target_height}")
-    
+
     # 计算缩放比例，用于调整锚框和标注大小
     scale_x = target_width / original_width if original_width > 0 else 1.0
     scale_y = target_height / original_height if original_height > 0 else 1.0
     scale_factor = min(scale_x, scale_y)  # 使用较小的缩放比例确保一致性
-    
+
     print(f"[视频处理] 缩放比例: X={scale_x:.3f}, Y={scale_y:.3f}, 统一比例={scale_factor:.3f}")
-    
-    # 启动ffmpeg进程，使用目标分辨率 - 确保16:9比例
-    ffmpeg_process, hls_url = start_ffmpeg(output_dir, output_filename, target_width, target_height, fps, camera_id, hls_server_actual_port)
-    
+
+    encoder = None
+    remuxer = None
+    renditions = parse_ladder(abr_ladder, target_width, target_height) if abr_ladder else None
+    rendition_cpu = None
+    tile_writer = None
+    if mosaic_tile and camera_id is not None:
+        tile_writer = TileWriter(camera_id, *parse_size(mosaic_tile))
+        print(f"[拼接画面] 图块 {tile_writer.width}x{tile_writer.height} 写入共享内存 {tile_writer.name}")
+
+    def on_encoder_error(error):
+        print(f"[错误] 写入帧到FFmpeg失败，可能已提前退出。停止发送帧: {error}")
+        exit_event.set() # 设置退出事件，以便主循环可以终止
+        pipeline.stop()
+
+    if headless:
+        hls_url = None
+    elif hls_copy:
+        # 直通转封装：HLS保持摄像头原始分辨率和码流，不重新编码
+        remuxer, hls_url = start_hls_remux(rtsp_url, output_dir, output_filename, camera_id, hls_server_actual_port, is_live_source)
+    else:
+        # 启动ffmpeg进程，使用目标分辨率 - 确保16:9比例
+        # 写入线程按帧率节拍输出：新帧未就绪时重复上一帧，积压时只取最新帧
+        hls_start_number = segment_start_number()
+        encoder, hls_url = start_ffmpeg(
+            output_dir, output_filename, target_width, target_height, fps, camera_id, hls_server_actual_port,
+            queue_size=ENCODE_QUEUE_SIZE,
+            drop_policy=encoder_drop_policy,
+            duplicate_last=encoder_duplicate_last,
+            on_error=on_encoder_error,
+            pix_fmt=pipe_pix_fmt,
+            low_latency=low_latency_hls,
+            renditions=renditions,
+            start_number=hls_start_number
+        )
+        if renditions:
+            rendition_cpu = RenditionCpuMeter(encoder.process.pid, renditions)
+
+    metadata_track = None
+    if hls_metadata and encoder is not None:
+        if low_latency_hls or renditions:
+            print("[HLS元数据] 低延迟HLS和多码率输出暂不支持检测结果元数据轨道")
+        else:
+            video_dir = os.path.join(output_dir, f"camera_{camera_id}") if camera_id is not None else output_dir
+            metadata_track = WebVttMetadataTrack(video_dir, video_playlist=os.path.join(video_dir, output_filename),
+                                                 video_start_number=hls_start_number)
+            master_name = f"{os.path.splitext(output_filename)[0]}_master.m3u8"
+            with open(os.path.join(video_dir, master_name), "w") as f:
+                f.write(master_playlist(output_filename, METADATA_PLAYLIST,
+                                        bitrate_for(target_width, target_height, fps) * 1000, target_width, target_height))
+            hls_url = f"{hls_url.rsplit('/', 1)[0]}/{master_name}"
+            print(f"[HLS元数据] 检测结果以WebVTT字幕轨道随视频输出，主播放列表: {master_name}")
+
     # 如果提供了摄像头ID，则更新数据库中的HLS流地址
-    if camera_id is not None:
+    if camera_id is not None and hls_url is not None:
         update_camera_hls_url(camera_id, hls_url)
         print(f"[HLS流] 已为摄像头{camera_id}创建HLS流: {hls_url}")
-    
+
     drawer = Drawer()
-    
-    belt_detected = False
-    avg_H, avg_W = 0, 0
 
     # 获取大块比例阈值
     large_block_ratio = config_manager.large_block_ratio
@@ -551,315 +805,422 @@ def predict_realtime(model_path, rtsp_url, img_size, output_dir, output_filename
     # 添加更多日志输出
     print(f"[预测] 开始实时预测 摄像头ID: {camera_id}, 大块比例阈值: {large_block_ratio}")
     print(f"[预测] 输出视频分辨率: {target_width}x{target_height}, 帧率: {fps}, 检测间隔: {detection_interval}秒")
-    
+
     # 检测计数器
     detection_counter = {cls: 0 for cls in range(8)}
     frame_counter = 0
-    
-    # 创建工作类别ID集合（根据检测配置动态更新）
-    working_class_ids = class_ids.copy()
-    
-    # 初始化当前摄像头的煤量变量
+    last_capture_seq = 0
+    last_log_seq = 0
+    last_placeholder_time = 0.0
+
+    # 皮带尺寸和煤量的平滑状态（仅由后处理阶段读写）
+    belt_detected = False
+    avg_H, avg_W = 0, 0
     current_coal_quantity = 0.0
 
-    # 帧率控制变量
+    # 帧率控制变量（仅由预处理阶段读写）
     last_detection_time = time.time()
-    # detection_interval参数已经通过函数参数传入，不需要再从args获取
-    
-    # 缓存检测结果用于锚框停留显示
-    cached_results = []
-    cached_detected_classes = set()
-    last_detection_results_time = 0.0
+
+    # 最新检测结果及其叠加层，由后处理阶段写入、渲染阶段读取，用于锚框停留显示
+    frame_shape = (target_height, target_width, 3)
+    detection_state = LatestValue({"results": [], "ts": 0.0, "overlay": OverlayLayer.empty(frame_shape), "draw": None})
     anchor_box_duration = 1.0  # 锚框停留时间（秒）
-    
-    try:
-        while not exit_event.is_set():
-            ret, frame = cap.read()
-            if not ret:
+
+    # 人员检测区域按缩放比例换算到目标分辨率
+    scaled_person_region = None
+    if person_region:
+        scaled_person_region = [
+            int(person_region[0] * scale_x),
+            int(person_region[1] * scale_y),
+            int(person_region[2] * scale_x),
+            int(person_region[3] * scale_y)
+        ]
+    region_thickness = max(1, int(2 * scale_factor))
+
+    def draw_person_region(canvas):
+        cv2.rectangle(canvas,
+                    (scaled_person_region[0], scaled_person_region[1]),
+                    (scaled_person_region[2], scaled_person_region[3]),
+                    (42, 42, 165), region_thickness)
+        return canvas
+
+    # 人员区域固定不变，叠加层只渲染一次
+    region_overlay = None
+    if render_overlay and scaled_person_region:
+        region_overlay = OverlayLayer.render(frame_shape, draw_person_region)
+
+    def draw_snapshot_overlay(canvas, ts):
+        # 带锚框的快照与HLS画面一致；不在HLS中绘制锚框时只在有快照请求时绘制
+        state, _ = detection_state.get()
+        if state["results"] and (ts - state["ts"]) <= anchor_box_duration:
+            if render_overlay:
+                state["overlay"].apply(canvas)
+            else:
+                state["draw"](canvas)
+        if region_overlay is not None:
+            region_overlay.apply(canvas)
+        elif scaled_person_region:
+            draw_person_region(canvas)
+        return canvas
+
+    latest_snapshots.overlay = draw_snapshot_overlay
+
+    pipeline = VideoPipeline(name=f"camera_{camera_id}")
+    preprocess_queue = pipeline.add_queue("preprocess", CAPTURE_QUEUE_SIZE, DROP_OLDEST)
+    inference_queue = pipeline.add_queue("inference", INFERENCE_QUEUE_SIZE, DROP_OLDEST)
+    postprocess_queue = pipeline.add_queue("postprocess", POSTPROCESS_QUEUE_SIZE, BLOCK)
+    render_queue = pipeline.add_queue("render", RENDER_QUEUE_SIZE, DROP_OLDEST) if render_overlay else None
+    encode_queue = encoder.queue if encoder is not None else None
+    mosaic_queue = pipeline.add_queue("mosaic", MOSAIC_QUEUE_SIZE, DROP_OLDEST) if tile_writer is not None else None
+    # 送往编码的画面同时送往拼接画面图块
+    frame_outputs = [q for q in (encode_queue, mosaic_queue) if q is not None]
+
+    def capture_stage():
+        nonlocal frame_counter, last_capture_seq, last_placeholder_time
+        latest = cap.read(last_capture_seq, timeout=1.0)
+        if latest is None:
+            if cap.ended:
                 print("No more frames to read.")
-                break
-            
-            # 缩放帧到目标分辨率
-            frame = cv2.resize(frame, (target_width, target_height))
-            
-            frame_counter += 1
-            current_time = time.time()
-            
-            # 检查是否应该进行检测（每秒一帧）
-            should_detect = (current_time - last_detection_time) >= detection_interval
-            
-            if frame_counter % 100 == 0:
-                print(f"[预测] 已处理 {frame_counter} 帧，检测间隔: {detection_interval}秒")
-                # 每100帧打印当前的检测配置，便于监控
-                # print(f"[预测] 当前检测配置 (cached): {detection_config}") # 打印缓存的配置
-                
-                # 尝试打印从Modbus直接获取的配置（如果连接）
-                if 'modbus_client' in globals() and modbus_client and modbus_client.connected: # (修正: is_connected -> connected)
-                    try:
-                        current_modbus_config = {}
-                        if hasattr(modbus_client, 'is_detection_enabled'):
-                            current_modbus_config["大块检测"] = modbus_client.is_detection_enabled(DETECT_LARGE_CHUNK)
-                            current_modbus_config["异物检测"] = modbus_client.is_detection_enabled(DETECT_FOREIGN_OBJECT)
-                            current_modbus_config["人员越界检测"] = modbus_client.is_detection_enabled(DETECT_PERSONNEL)
-                            current_modbus_config["跑偏检测"] = modbus_client.is_detection_enabled(DETECT_DEVIATION)
-                            print(f"[预测] 当前Modbus检测配置 (live): {current_modbus_config}")
-                        else:
-                            print("[预测] ModbusClient.is_detection_enabled 方法不存在，无法获取实时Modbus配置。")
-                    except Exception as e:
-                        print(f"[预测] 获取实时Modbus配置失败: {e}")
-                else:
-                    print(f"[预测] 当前检测配置 (cached): {detection_config}")
+                pipeline.stop()
+            elif not inference_only and cap.in_outage and time.time() - last_placeholder_time >= 1.0:
+                # 断流期间每秒更新一次占位画面，编码阶段在两次更新之间重复输出同一帧
+                last_placeholder_time = time.time()
+                text = f"NO SIGNAL - RECONNECTING ({int(cap.outage_elapsed())}s)"
+                frame = make_placeholder_frame(target_width, target_height, text)
+                return FramePacket(last_capture_seq, last_placeholder_time, frame, {"placeholder": True})
+            return None
+        last_capture_seq, capture_ts, frame = latest
+        frame_counter += 1
+        return FramePacket(last_capture_seq, capture_ts, frame)
 
+    def preprocess_stage(packet):
+        nonlocal last_detection_time, last_log_seq
+        if packet.meta.get("placeholder"):
+            if not headless:
+                latest_snapshots.publish(packet.frame, packet.ts)
+            return packet
 
-            # 根据当前的检测配置，更新工作类别ID集合
-            working_class_ids = [cid for cid in class_ids if should_detect_class(cid)]
-            
-            if frame_counter % 100 == 0:
-                # 打印当前启用的类别
-                enabled_classes = [CLASS_NAMES.get(cid, f"类别{cid}") for cid in working_class_ids]
-                print(f"[预测] 当前启用的检测类别: {enabled_classes}")
-            
-            # 如果没有启用任何类别，则只检测皮带和煤量
-            if not working_class_ids:
-                working_class_ids = [0, 1]  # 皮带和煤量
-            
-            # 只在满足时间间隔时进行检测
-            if should_detect:
-                # 执行检测（只检测当前启用的类别）
-                # 使用统一的640×352尺寸避免YOLO警告
-                results = model.predict(source=frame, imgsz=[640,352], conf=conf, classes=working_class_ids, save=False)
-                
-                # 发送检测结果到WebSocket（非阻塞）
-                if camera_id is not None:
-                    detection_producer.send_detections(camera_id, results, CLASS_NAMES)
-                
-                # 记录当前帧检测到的所有类别
-                detected_classes_set = set()
-                
-                area_pulley, area_coal = 0, 0
-                H, W = 0, 0
-
-                # 皮带尺寸检测和煤量计算
-                for result in results:
-                    boxes = result.boxes
-                    if boxes is not None:
-                        for box in boxes:
-                            cls = int(box.cls[0])
-                            detected_classes_set.add(cls)
-                            
-                            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                            area = (x2 - x1) * (y2 - y1)
-
-                            if cls == 0:  # 皮带
-                                H, W = y2 - y1, x2 - x1
-                                belt_detected = True
-                                avg_H = 0.2 * H + 0.8 * avg_H
-                                avg_W = 0.2 * W + 0.8 * avg_W
-                                area_pulley += area
-                            elif cls == 1:  # 煤量
-                                area_coal += area
-
-                # 计算煤量比例并存储到全局字典
-                if area_pulley > 0:
-                    coal_ratio = float(area_coal / area_pulley) * 100  # 转换为百分比
-                    # 平滑煤量变化，防止数值跳动
-                    if current_coal_quantity == 0:
-                        current_coal_quantity = coal_ratio
-                    else:
-                        current_coal_quantity = 0.8 * current_coal_quantity + 0.2 * coal_ratio
-                    
-                    # 确保煤量值在0-100之间
-                    current_coal_quantity = max(0, min(100, current_coal_quantity))
-                    
-                    # 更新全局字典
-                    if camera_id is not None:
-                        camera_coal_quantities[camera_id] = current_coal_quantity
-                        
-                        # 通过Modbus发送煤量数据（连续数据，非报警）
-                        if 'modbus_client' in globals() and modbus_client and modbus_client.connected:
-                            modbus_client.send_coal_quantity(current_coal_quantity)
-                        
-                        if frame_counter % 100 == 0:
-                            print(f"[煤量] 摄像头{camera_id}当前煤量: {current_coal_quantity:.1f}%")
-                
-                coal_ratio_str = f"{current_coal_quantity:.1f}%" if area_pulley else "N/A"
+        # 采集序号可能因跳帧不连续，按序号间隔而非整除判断
+        if packet.seq - last_log_seq >= 100:
+            last_log_seq = packet.seq
+            print(f"[预测] 已处理 {frame_counter} 帧（采集序号 {packet.seq}，跳过 {cap.skipped} 帧），检测间隔: {detection_interval}秒")
+            # 每100帧打印当前的检测配置，便于监控
+            log_detection_config(class_ids)
 
-                # 动态阈值计算（基于缩放后的分辨率）
-                if belt_detected and avg_H > 0 and avg_W > 0:
-                    belt_area = avg_H * avg_W
-                    large_threshold = belt_area * 0.3 * belt_scale
-                    width_threshold = avg_W * 0.3
-                else:
-                    large_threshold = 1000
-                    width_threshold = 30
-
-                # 创建渲染帧用于所有显示，包含检测锚框
-                rendered_frame = frame.copy()
-
-                # 绘制检测结果（包括缓存的检测结果）
-                for result in results:
-                    boxes = result.boxes
-                    if boxes is not None:
-                        for box in boxes:
-                            cls = int(box.cls[0])
-                            confidence = float(box.conf[0])
-                            label = CLASS_NAMES.get(cls, "未知")
-
-                            # 只在实际检测时更新计数，不更新缓存结果的计数
-                            if should_detect:
-                                detection_counter[cls] += 1
-                                
-                                # 如果检测到300次，打印一下检测计数
-                                total_detections = sum(detection_counter.values())
-                                if total_detections % 300 == 0:
-                                    print(f"[检测统计] 总计: {total_detections} 次检测")
-                                    for c, count in detection_counter.items():
-                                        if count > 0:
-                                            print(f"  - {CLASS_NAMES.get(c, f'类别{c}')}: {count} 次")
-
-                            # 在渲染帧上绘制检测框（用于所有显示）
-                            rendered_frame = drawer.draw(rendered_frame, box, label, 
-                                              coal_ratio_str if cls == 1 else None, 
-                                              scale_factor=scale_factor)
-                            
-                            # 根据检测类别判断是否需要上报事件
-                            alarm_rule_id = AlarmTypeMapper.get_alarm_rule_id(cls, detected_classes_set)
-                            
-                            # 上报事件逻辑 - 只在实际检测时处理，不处理缓存结果
-                            if alarm_rule_id and cls != 1 and should_detect:  # 只在检测帧处理
-                                alarm_name = AlarmTypeMapper.get_alarm_name(alarm_rule_id)
-                                
-                                # 根据不同类别的特殊处理逻辑
-                                should_report = False
-                                
-                                if cls == 2:  # 大块检测
-                                    # 检查当前是否启用大块检测
-                                    if detection_config["大块检测"]:
-                                        x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-                                        block_width = x2 - x1
-                                        block_area = (x2 - x1) * (y2 - y1)
-                                        
-                                        # 使用缩放后的图像宽度进行比例计算
-                                        should_report = AlarmTypeMapper.should_report_large_block(
-                                            block_width=block_width,
-                                            image_width=target_width,  # 使用目标宽度而非原始宽度
-                                            threshold_ratio=large_block_ratio
-                                        )
-                                        
-                                        # 打印大块检测信息
-                                        actual_ratio = block_width / target_width
-                                        print(f"[大块检测] 大块宽度: {block_width}, 目标图像宽度: {target_width}, 实际比例: {actual_ratio:.4f}, 阈值: {large_block_ratio}, 是否上报: {should_report}")
-                                
-                                elif cls == 6 and person_region:  # 人员检测
-                                    # 检查当前是否启用人员越界检测
-                                    if detection_config["人员越界检测"]:
-                                        xc = (box.xyxy[0][0] + box.xyxy[0][2]) / 2
-                                        yc = (box.xyxy[0][1] + box.xyxy[0][3]) / 2
-                                        should_report = (person_region[0] <= xc <= person_region[2] and 
-                                                        person_region[1] <= yc <= person_region[3])
-                                    
-                                elif cls == 7:  # 烟雾检测
-                                    should_report = confidence >= smoke_threshold
-                                    
-                                elif cls == 5:  # 异物报警
-                                    # 检查当前是否启用异物检测
-                                    should_report = detection_config["异物检测"]
-                                    
-                                elif cls in [3, 4]:  # 跑偏报警
-                                    # 检查当前是否启用跑偏检测
-                                    if detection_config["跑偏检测"]:
-                                        should_report = not (3 in detected_classes_set and 4 in detected_classes_set)
-                                
-                                # 上报事件，确保传递所有必要参数 - 只在检测帧处理
-                                if should_report:
-                                    try:
-                                        print(f"[检测事件] 类别: {cls}, 报警类型: {alarm_name}, 报警规则ID: {alarm_rule_id}, 置信度: {confidence:.4f}")
-                                        
-                                        # 通过 Modbus 发送报警信号
-                                        if 'modbus_client' in globals():
-                                            modbus_client.send_alarm(alarm_name, confidence, True)
-                                        
-                                        # 通过 HTTP 上报事件 - 使用带边界框的渲染帧
-                                        if 'event_reporter' in globals():
-                                            event_reporter.report_alarm_event(
-                                                camera_id=config_manager.camera_id,
-                                                alarm_type=alarm_name,
-                                                confidence=confidence,
-                                                frame=rendered_frame,  # 使用渲染帧（带边界框）
-                                                alarm_rule_id=alarm_rule_id
-                                            )
-                                    except Exception as e:
-                                        print(f"[错误] 上报事件或发送Modbus信号失败: {str(e)}")
-                                        import traceback
-                                        traceback.print_exc()
-                
-                # 缓存检测结果用于锚框停留显示
-                cached_results = results
-                cached_detected_classes = detected_classes_set.copy()
-                last_detection_results_time = current_time
-                
-                # 更新最后检测时间
-                last_detection_time = current_time
+        # 抽帧解码时采集层已按检测间隔供帧，每一帧都送去推理
+        detection_due = decode_interval > 0 or (packet.ts - last_detection_time) >= detection_interval
+        if inference_only and not detection_due:
+            # 直通和无画面模式下画面不经过Python输出，只有送去推理的帧才需要缩放
+            return None
+
+        # 缩放帧到目标分辨率
+        packet.frame = cv2.resize(packet.frame, (target_width, target_height))
+        if not headless:
+            # 无画面模式不提供快照接口，不必为此保留画面
+            latest_snapshots.publish(packet.frame, packet.ts)
+
+        # 满足检测间隔时，把当前帧分流给推理阶段（每秒一帧）
+        if detection_due:
+            last_detection_time = packet.ts
+            inference_queue.put(packet)
+        return packet
+
+    def inference_stage(packet):
+        # 根据当前的检测配置，更新工作类别ID集合
+        working_class_ids = [cid for cid in class_ids if should_detect_class(cid)]
+
+        # 如果没有启用任何类别，则只检测皮带和煤量
+        if not working_class_ids:
+            working_class_ids = [0, 1]  # 皮带和煤量
+
+        # 执行检测（只检测当前启用的类别）
+        # 使用统一的640×352尺寸避免YOLO警告
+        results = model.predict(source=packet.frame, imgsz=[640,352], conf=conf, classes=working_class_ids, save=False)
+
+        # 发送检测结果到WebSocket（非阻塞）
+        if send_websocket and camera_id is not None:
+            detection_producer.send_detections(camera_id, results, CLASS_NAMES)
+
+        # 锚框按被检测帧在视频时间轴上的位置写入元数据轨道
+        if metadata_track is not None:
+            stream_time = encoder.stream_time(packet.ts)
+            if stream_time is not None:
+                payload = DetectionPayload.json_from_detections(camera_id or 0, results, CLASS_NAMES, packet.ts)
+                metadata_track.add_cue(stream_time, payload.decode("utf-8"))
+
+        packet.meta["results"] = results
+        return packet
+
+    startup_reported = False
+
+    def postprocess_stage(packet):
+        nonlocal belt_detected, avg_H, avg_W, current_coal_quantity, startup_reported
+        results = packet.meta["results"]
+        if not startup_reported:
+            startup_reported = True
+            uptime = process_uptime()
+            if uptime is not None:
+                print(f"[资源] 启动耗时 {uptime:.1f} 秒（进程启动到首次检测完成）")
+
+        # 记录当前帧检测到的所有类别
+        detected_classes_set = set()
+
+        area_pulley, area_coal = 0, 0
+        H, W = 0, 0
+
+        # 皮带尺寸检测和煤量计算
+        for result in results:
+            boxes = result.boxes
+            if boxes is not None:
+                for box in boxes:
+                    cls = int(box.cls[0])
+                    detected_classes_set.add(cls)
+
+                    x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+                    area = (x2 - x1) * (y2 - y1)
+
+                    if cls == 0:  # 皮带
+                        H, W = y2 - y1, x2 - x1
+                        belt_detected = True
+                        avg_H = 0.2 * H + 0.8 * avg_H
+                        avg_W = 0.2 * W + 0.8 * avg_W
+                        area_pulley += area
+                    elif cls == 1:  # 煤量
+                        area_coal += area
+
+        # 计算煤量比例并存储到全局字典
+        if area_pulley > 0:
+            coal_ratio = float(area_coal / area_pulley) * 100  # 转换为百分比
+            # 平滑煤量变化，防止数值跳动
+            if current_coal_quantity == 0:
+                current_coal_quantity = coal_ratio
             else:
-                # 非检测帧，视频继续更新，锚框延时显示
-                coal_ratio_str = f"{current_coal_quantity:.1f}%" if current_coal_quantity > 0 else "N/A"
-                rendered_frame = frame.copy()  # 始终使用当前视频帧
+                current_coal_quantity = 0.8 * current_coal_quantity + 0.2 * coal_ratio
 
-            # 始终绘制检测结果（包括缓存的结果）
-            time_since_last_detection = current_time - last_detection_results_time
-            use_cached = (not should_detect) and (time_since_last_detection <= anchor_box_duration) and cached_results
-            
-            current_results = results if should_detect else (cached_results if use_cached else [])
-            current_detected_classes = detected_classes_set if should_detect else (cached_detected_classes if use_cached else set())
-            
-            for result in current_results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        cls = int(box.cls[0])
-                        label = CLASS_NAMES.get(cls, "未知")
-                        rendered_frame = drawer.draw(rendered_frame, box, label, 
-                                          coal_ratio_str if cls == 1 else None, 
-                                          scale_factor=scale_factor)
-            
-            # 显示人员检测区域（如果设置了人员区域，需要根据缩放比例调整）
-            if person_region:
-                # 使用已计算的缩放比例调整人员检测区域坐标
-                scaled_person_region = [
-                    int(person_region[0] * scale_x),
-                    int(person_region[1] * scale_y),
-                    int(person_region[2] * scale_x),
-                    int(person_region[3] * scale_y)
-                ]
-                
-                # 根据缩放因子调整人员检测区域边框粗细
-                region_thickness = max(1, int(2 * scale_factor))
-                cv2.rectangle(rendered_frame, 
-                            (scaled_person_region[0], scaled_person_region[1]),
-                            (scaled_person_region[2], scaled_person_region[3]), 
-                            (42, 42, 165), region_thickness)
-            
-            # 发送带检测锚框的渲染帧到FFmpeg进行HLS流
-            try:
-                if ffmpeg_process.stdin:
-                    ffmpeg_process.stdin.write(rendered_frame.tobytes())
-                    ffmpeg_process.stdin.flush() # 确保数据被发送
-            except BrokenPipeError:
-                print("[错误] FFmpeg进程的管道已损坏。可能已提前退出。停止发送帧。")
-                exit_event.set() # 设置退出事件，以便主循环可以终止
-                break 
-            except Exception as e:
-                print(f"[错误] 写入帧到FFmpeg时发生未知错误: {e}")
-                exit_event.set()
-                break
+            # 确保煤量值在0-100之间
+            current_coal_quantity = max(0, min(100, current_coal_quantity))
+
+            # 更新全局字典
+            if camera_id is not None:
+                camera_coal_quantities[camera_id] = current_coal_quantity
+                if coal_quantity_file:
+                    publish_coal_quantity(output_dir, camera_id, current_coal_quantity)
+
+                # 通过Modbus发送煤量数据（连续数据，非报警）
+                if 'modbus_client' in globals() and modbus_client and modbus_client.connected:
+                    modbus_client.send_coal_quantity(current_coal_quantity)
+
+                if packet.seq % 100 == 0:
+                    print(f"[煤量] 摄像头{camera_id}当前煤量: {current_coal_quantity:.1f}%")
+
+        coal_ratio_str = f"{current_coal_quantity:.1f}%" if area_pulley else "N/A"
+
+        # 动态阈值计算（基于缩放后的分辨率）
+        if belt_detected and avg_H > 0 and avg_W > 0:
+            belt_area = avg_H * avg_W
+            large_threshold = belt_area * 0.3 * belt_scale
+            width_threshold = avg_W * 0.3
+        else:
+            large_threshold = 1000
+            width_threshold = 30
+
+        # 每次检测结果只渲染一次叠加层，渲染阶段在后续帧上直接复用
+        detection_overlay = None
+        if render_overlay:
+            detection_overlay = OverlayLayer.render(
+                frame_shape,
+                lambda canvas: drawer.draw_results(canvas, results, coal_ratio_str, scale_factor=scale_factor)
+            )
+
+        # 带检测锚框的报警快照：只在事件确实需要上传时才渲染，同一次检测的多个报警共用一张
+        snapshot = []
+        def alarm_snapshot():
+            if not snapshot:
+                if detection_overlay is not None:
+                    snapshot.append(detection_overlay.apply(packet.frame.copy()))
+                else:
+                    snapshot.append(drawer.draw_results(packet.frame.copy(), results, coal_ratio_str, scale_factor=scale_factor))
+            return snapshot[0]
+
+        for result in results:
+            boxes = result.boxes
+            if boxes is not None:
+                for box in boxes:
+                    cls = int(box.cls[0])
+                    confidence = float(box.conf[0])
+
+                    detection_counter[cls] += 1
+
+                    # 如果检测到300次，打印一下检测计数
+                    total_detections = sum(detection_counter.values())
+                    if total_detections % 300 == 0:
+                        print(f"[检测统计] 总计: {total_detections} 次检测")
+                        for c, count in detection_counter.items():
+                            if count > 0:
+                                print(f"  - {CLASS_NAMES.get(c, f'类别{c}')}: {count} 次")
+
+                    # 根据检测类别判断是否需要上报事件
+                    alarm_rule_id = AlarmTypeMapper.get_alarm_rule_id(cls, detected_classes_set)
+
+                    # 上报事件逻辑
+                    if alarm_rule_id and cls != 1:
+                        alarm_name = AlarmTypeMapper.get_alarm_name(alarm_rule_id)
+
+                        # 根据不同类别的特殊处理逻辑
+                        should_report = False
+
+                        if cls == 2:  # 大块检测
+                            # 检查当前是否启用大块检测
+                            if detection_config["大块检测"]:
+                                x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
+                                block_width = x2 - x1
+                                block_area = (x2 - x1) * (y2 - y1)
+
+                                # 使用缩放后的图像宽度进行比例计算
+                                should_report = AlarmTypeMapper.should_report_large_block(
+                                    block_width=block_width,
+                                    image_width=target_width,  # 使用目标宽度而非原始宽度
+                                    threshold_ratio=large_block_ratio
+                                )
+
+                                # 打印大块检测信息
+                                actual_ratio = block_width / target_width
+                                print(f"[大块检测] 大块宽度: {block_width}, 目标图像宽度: {target_width}, 实际比例: {actual_ratio:.4f}, 阈值: {large_block_ratio}, 是否上报: {should_report}")
+
+                        elif cls == 6 and person_region:  # 人员检测
+                            # 检查当前是否启用人员越界检测
+                            if detection_config["人员越界检测"]:
+                                xc = (box.xyxy[0][0] + box.xyxy[0][2]) / 2
+                                yc = (box.xyxy[0][1] + box.xyxy[0][3]) / 2
+                                should_report = (person_region[0] <= xc <= person_region[2] and
+                                                person_region[1] <= yc <= person_region[3])
+
+                        elif cls == 7:  # 烟雾检测
+                            should_report = confidence >= smoke_threshold
+
+                        elif cls == 5:  # 异物报警
+                            # 检查当前是否启用异物检测
+                            should_report = detection_config["异物检测"]
+
+                        elif cls in [3, 4]:  # 跑偏报警
+                            # 检查当前是否启用跑偏检测
+                            if detection_config["跑偏检测"]:
+                                should_report = not (3 in detected_classes_set and 4 in detected_classes_set)
+
+                        # 上报事件，确保传递所有必要参数
+                        if should_report:
+                            try:
+                                print(f"[检测事件] 类别: {cls}, 报警类型: {alarm_name}, 报警规则ID: {alarm_rule_id}, 置信度: {confidence:.4f}")
+
+                                # 通过 Modbus 发送报警信号
+                                if 'modbus_client' in globals():
+                                    modbus_client.send_alarm(alarm_name, confidence, True)
+
+                                # 通过 HTTP 上报事件 - 使用带边界框的渲染帧
+                                if 'event_reporter' in globals():
+                                    event_reporter.report_alarm_event(
+                                        camera_id=config_manager.camera_id,
+                                        alarm_type=alarm_name,
+                                        confidence=confidence,
+                                        frame=alarm_snapshot,  # 延迟渲染（带边界框），冷却期内不会渲染
+                                        alarm_rule_id=alarm_rule_id
+                                    )
+                            except Exception as e:
+                                print(f"[错误] 上报事件或发送Modbus信号失败: {str(e)}")
+                                import traceback
+                                traceback.print_exc()
+
+        # 缓存检测结果用于锚框停留显示（以结果就绪的时间为起点）
+        detection_state.set({
+            "results": results,
+            "ts": time.time(),
+            "overlay": detection_overlay if detection_overlay is not None else OverlayLayer.empty(frame_shape),
+            "draw": lambda canvas: drawer.draw_results(canvas, results, coal_ratio_str, scale_factor=scale_factor)
+        })
+        return None
+
+    def render_stage(packet):
+        if packet.meta.get("placeholder"):
+            return packet
 
+        state, _ = detection_state.get()
+        rendered_frame = packet.frame.copy()  # 始终使用当前视频帧
+
+        # 锚框延时显示：在停留时间内叠加最近一次检测结果的叠加层
+        if state["results"] and (packet.ts - state["ts"]) <= anchor_box_duration:
+            state["overlay"].apply(rendered_frame)
+
+        # 显示人员检测区域
+        if region_overlay is not None:
+            region_overlay.apply(rendered_frame)
+        return FramePacket(packet.seq, packet.ts, rendered_frame)
+
+    last_tile_ts = 0.0
+
+    def mosaic_stage(packet):
+        nonlocal last_tile_ts
+        # 图块只需按拼接画面的帧率更新，多余的帧直接跳过
+        if packet.ts - last_tile_ts < 1.0 / MOSAIC_TILE_FPS:
+            return None
+        last_tile_ts = packet.ts
+        tile_writer.write(packet.frame, packet.ts)
+        return None
+
+    pipeline.add_stage(PipelineStage("capture", capture_stage, outputs=[preprocess_queue]))
+    if inference_only:
+        # 直通和无画面模式没有渲染和编码阶段，预处理只为推理阶段供帧（拼接图块按检测间隔更新）
+        pipeline.add_stage(PipelineStage("preprocess", preprocess_stage, preprocess_queue, outputs=frame_outputs))
+    elif render_overlay:
+        pipeline.add_stage(PipelineStage("preprocess", preprocess_stage, preprocess_queue, outputs=[render_queue]))
+    else:
+        # 不绘制锚框时没有渲染阶段，预处理后的原始画面直接送往编码
+        pipeline.add_stage(PipelineStage("preprocess", preprocess_stage, preprocess_queue, outputs=frame_outputs))
+    pipeline.add_stage(PipelineStage("inference", inference_stage, inference_queue, outputs=[postprocess_queue]))
+    pipeline.add_stage(PipelineStage("postprocess", postprocess_stage, postprocess_queue))
+    if render_overlay:
+        pipeline.add_stage(PipelineStage("render", render_stage, render_queue, outputs=frame_outputs))
+    if tile_writer is not None:
+        pipeline.add_stage(PipelineStage("mosaic", mosaic_stage, mosaic_queue))
+
+    # 统计本进程及FFmpeg子进程的CPU和内存占用
+    resource_meter = ResourceMeter()
+
+    try:
+        cap.start()
+        pipeline.start()
+        last_stats_time = time.time()
+        while not exit_event.is_set() and pipeline.is_running():
+            exit_event.wait(0.5)
+            if metadata_track is not None and encoder.written:
+                metadata_track.advance(encoder.stream_time())
+            if time.time() - last_stats_time >= PIPELINE_STATS_INTERVAL:
+                last_stats_time = time.time()
+                print(f"[流水线] {pipeline.format_stats()}")
+                print(f"[视频采集] {cap.stats()}")
+                if encoder is not None:
+                    print(f"[编码输出] {encoder.stats()}")
+                if rendition_cpu is not None:
+                    print(f"[ABR] 各档位CPU占用(%单核): {rendition_cpu.sample()}")
+                print(f"[资源] {resource_meter.sample()}")
+                if remuxer is not None:
+                    print(f"[HLS直通] {remuxer.stats()}")
+                if hls_janitor is not None:
+                    print(f"[HLS清理] {hls_janitor.stats()}")
+                if latest_snapshots.requests:
+                    print(f"[快照] {latest_snapshots.stats()}")
+                if metadata_track is not None:
+                    print(f"[HLS元数据] {metadata_track.stats()}")
 
     except KeyboardInterrupt:
         print("Interrupted by user.")
     finally:
+        pipeline.stop()
+        pipeline.join(timeout=2.0)
+
         # 停止WebSocket生产者
-        detection_producer.stop()
-        
+        if send_websocket:
+            detection_producer.stop()
+
         # 打印最终检测统计
         print("\n[检测最终统计]")
         print(f"总计处理帧数: {frame_counter}")
@@ -867,16 +1228,26 @@ def predict_realtime(model_path, rtsp_url, img_size, output_dir, output_filename
         for cls, count in detection_counter.items():
             if count > 0:
                 print(f"  - {CLASS_NAMES.get(cls, f'类别{cls}')}: {count} 次")
-                
+        print(f"[流水线] {pipeline.format_stats()}")
+        print(f"[视频采集] {cap.stats()}")
+        print(f"[资源] {resource_meter.sample()}")
+
         cap.release()
-        if ffmpeg_process.stdin:
-            ffmpeg_process.stdin.close()
-        ffmpeg_process.wait()
-        
+        if remuxer is not None:
+            print(f"[HLS直通] {remuxer.stats()}")
+            remuxer.stop()
+        if encoder is not None:
+            print(f"[编码输出] {encoder.stats()}")
+            encoder.close()
+        if tile_writer is not None:
+            tile_writer.close()
+        if hls_janitor is not None:
+            print(f"[HLS清理] {hls_janitor.stats()}")
+
         # 清除所有 Modbus 报警信号
         if 'modbus_client' in globals():
             modbus_client.clear_all_alarms()
-        
+
         print("[视频处理] 视频流处理已停止")
 
 def _create_alarm_event(self, cls, confidence, frame, event_counter, event_queue):
@@ -902,13 +1273,44 @@ def _create_alarm_event(self, cls, confidence, frame, event_counter, event_queue
     if event_queue:
         event_queue.put(event)
 
-def run_flask_server(hls_dir, host='0.0.0.0', port=2022, camera_id=None):
+def run_flask_server(hls_dir, host='0.0.0.0', port=2022, camera_id=None, serve_hls=True):
     app = Flask(__name__)
     CORS(app, resources={r"/*": {"origins": "*"}})
 
-    @app.route('/hls_output/<path:filename>')
-    def serve_hls(filename):
+    def serve_hls_file(filename):
+        directory, _, name = filename.rpartition('/')
+        playlist = ll_hls_playlists.get(directory)
+        if playlist is not None:
+            # 低延迟HLS从内存提供，播放列表请求可能按 _HLS_msn/_HLS_part 阻塞到新的部分分片产生
+            status, mimetype, body = playlist.serve(
+                name,
+                msn=request.args.get('_HLS_msn', type=int),
+                part=request.args.get('_HLS_part', type=int)
+            )
+            response = Response(body, status=status, mimetype=mimetype)
+            # 播放列表每次都要重新获取，分片内容不再变化可以缓存
+            cacheable = status == 200 and not name.endswith('.m3u8')
+            response.headers['Cache-Control'] = IMMUTABLE if cacheable else 'no-cache'
+            return response
         return send_from_directory(hls_dir, filename)
+
+    def serve_snapshot():
+        snapshot = latest_snapshots.get(parse_variant(request.args.get('overlay')))
+        if snapshot is None:
+            return Response("no frame yet", status=503, mimetype="text/plain")
+        headers = {'ETag': snapshot.etag, 'Cache-Control': 'no-cache', 'X-Timestamp': f"{snapshot.ts:.3f}"}
+        if request.headers.get('If-None-Match') == snapshot.etag:
+            return Response(status=304, headers=headers)
+        return Response(snapshot.body, mimetype="image/jpeg", headers=headers)
+
+    def serve_mjpeg():
+        stream = latest_snapshots.mjpeg(parse_variant(request.args.get('overlay')), request.args.get('fps', type=float))
+        return Response(stream, mimetype=MJPEG_CONTENT_TYPE, headers={'Cache-Control': 'no-cache'})
+
+    if serve_hls:
+        app.add_url_rule('/hls_output/<path:filename>', 'serve_hls', serve_hls_file)
+        app.add_url_rule('/api/snapshot.jpg', 'snapshot', serve_snapshot)
+        app.add_url_rule('/api/mjpeg', 'mjpeg', serve_mjpeg)
     
     # 新增API端点提供煤量数据
     @app.route('/api/coal_quantity', methods=['GET'])
@@ -919,7 +1321,8 @@ def run_flask_server(hls_dir, host='0.0.0.0', port=2022, camera_id=None):
         return jsonify({"coal_quantity": "0.0", "error": "Camera ID not specified"}), 400
 
     if camera_id:
-        print(f"[HLS服务器] 已启动，摄像头ID: {camera_id}, 地址: http://{host}:{port}/hls_output/")
+        if serve_hls:
+            print(f"[HLS服务器] 已启动，摄像头ID: {camera_id}, 地址: http://{host}:{port}/hls_output/")
         print(f"[煤量接口] 已启动，地址: http://{host}:{port}/api/coal_quantity")
     else:
         print(f"[HLS服务器] 已启动，地址: http://{host}:{port}/hls_output/")
@@ -1021,24 +1424,80 @@ def main():
     # 解析类别ID
     class_ids = [int(cid) for cid in args.class_id.split(',')] if args.class_id.strip() else list(range(8))
     
-    # 检查ffmpeg是否安装
-    import shutil
-    if not shutil.which('ffmpeg'):
-        print("FFmpeg is not installed or not found in PATH.")
-        sys.exit(1)
+    # 检查ffmpeg是否安装，并探测（或从缓存读取）可用的编码器，后续启动摄像头不再探测
+    # 无画面模式不需要FFmpeg
+    if not args.headless:
+        encoder_registry = get_encoder_registry()
+        if not encoder_registry.available:
+            print("FFmpeg is not installed or not found in PATH.")
+            sys.exit(1)
+        registry_stats = encoder_registry.stats()
+        print(f"[编码器] FFmpeg: {registry_stats['ffmpeg_path']}，H.264编码器: {registry_stats['h264_encoder']}"
+              f"{'（缓存）' if registry_stats['from_cache'] else ''}")
+
+    hls_janitor = None
+    if not args.headless:
+        if args.hls_tmpfs:
+            args.hls_dir = ram_backed_dir(args.hls_dir)
+            print(f"[HLS清理] HLS目录位于内存文件系统: {os.path.realpath(args.hls_dir)}")
+        # 本进程的输出目录，与 hls_output_target 中FFmpeg写入的目录一致
+        own_hls_dir = os.path.join(args.hls_dir, f"camera_{args.cameraid}") if args.cameraid is not None else args.hls_dir
+        if args.hls_total_max_mb and not args.hls_janitor_global:
+            print("[HLS清理] 整个HLS目录的预算只由一个清理器执行，本进程只清理自己的目录；"
+                  "请在一个进程上加 --hls_janitor_global，或为 hls_server.py 设置 --hls_total_max_mb")
+        # 启动FFmpeg前清理本进程上次运行遗留的分片，之后定期按预算清理本进程的目录（--hls_janitor_global 时为整个HLS目录）
+        hls_janitor = HlsJanitor(
+            args.hls_dir,
+            camera_max_bytes=args.hls_camera_max_mb * 1024 * 1024 if args.hls_camera_max_mb else None,
+            total_max_bytes=args.hls_total_max_mb * 1024 * 1024 if args.hls_total_max_mb and args.hls_janitor_global else None,
+            max_age=args.hls_max_age,
+            directory=None if args.hls_janitor_global else own_hls_dir
+        )
+        os.makedirs(own_hls_dir, exist_ok=True)
+        hls_janitor.startup_clean(own_hls_dir)
+        hls_janitor.start()
 
-    # 启动每个摄像头对应端口的 Flask 服务器
-    if args.cameraid:
-        hls_actual_port = 2000 + int(args.cameraid)
+    if args.http_server == "external" and args.ll_hls:
+        # 低延迟HLS的播放列表保存在本进程内存中，独立的HLS服务器无法提供
+        print("[HLS服务器] 使用独立HLS服务器时不支持低延迟HLS，按普通HLS输出")
+        args.ll_hls = False
+
+    if args.http_server == "external":
+        # 由独立运行的 hls_server.py 在同一端口为所有摄像头提供HLS和煤量接口
+        hls_actual_port = args.hls_port or 2000
+        print(f"[HLS服务器] 使用独立HLS服务器，端口: {hls_actual_port}，煤量写入 {args.hls_dir}")
+    elif args.http_server == "async":
+        hls_actual_port = args.hls_port or (2000 + int(args.cameraid) if args.cameraid else 2022)
+        try:
+            hls_server = HlsHttpServer(
+                args.hls_dir, '0.0.0.0', hls_actual_port,
+                ll_playlists=ll_hls_playlists,
+                coal_quantity=camera_coal_quantities.get,
+                default_camera_id=args.cameraid,
+                snapshots=latest_snapshots,
+                serve_hls=not args.headless
+            ).start_in_thread()
+            if args.headless:
+                print(f"[煤量接口] 无画面模式，异步服务器只提供煤量接口，端口: {hls_actual_port}")
+            else:
+                print(f"[HLS服务器] 异步服务器已启动，地址: http://0.0.0.0:{hls_actual_port}/hls_output/，"
+                      f"煤量接口: /api/coal_quantity")
+        except OSError as e:
+            print(f"[错误] 无法在端口 {hls_actual_port} 启动服务器: {e}")
+    # 启动每个摄像头对应端口的 Flask 服务器（无画面模式只提供煤量接口）
+    elif args.cameraid:
+        hls_actual_port = args.hls_port or 2000 + int(args.cameraid)
         flask_thread = threading.Thread(
             target=run_flask_server,
-            args=(args.hls_dir, '0.0.0.0', hls_actual_port, args.cameraid),
+            args=(args.hls_dir, '0.0.0.0', hls_actual_port, args.cameraid, not args.headless),
             daemon=True
         )
         flask_thread.start()
         print(f"[煤量接口] 为摄像头 {args.cameraid} 启动接口，端口: {hls_actual_port}")
+    elif args.headless:
+        hls_actual_port = None
     else:
-        hls_actual_port = 2022 # 默认HLS端口
+        hls_actual_port = args.hls_port or 2022 # 默认HLS端口
         flask_thread = threading.Thread(
             target=run_flask_server,
             args=(args.hls_dir, '0.0.0.0', hls_actual_port, None),
@@ -1060,9 +1519,26 @@ def main():
             args.conf,
             camera_id=args.cameraid,
             hls_server_actual_port=hls_actual_port, # 传递实际的HLS端口
-            detection_interval=args.detection_interval # 传递检测间隔
+            detection_interval=args.detection_interval, # 传递检测间隔
+            reconnect_max_delay=args.reconnect_max_delay,
+            stall_timeout=args.stall_timeout,
+            overlay_mode=args.overlay,
+            hls_mode=args.hls_mode,
+            encoder_drop_policy=args.encoder_drop_policy,
+            encoder_duplicate_last=not args.no_frame_duplication,
+            pipe_pix_fmt=args.pipe_pix_fmt,
+            low_latency_hls=args.ll_hls,
+            abr_ladder=args.abr_ladder,
+            mosaic_tile=args.mosaic_tile,
+            headless=args.headless,
+            coal_quantity_file=args.http_server == "external",
+            hls_janitor=hls_janitor,
+            hls_metadata=args.hls_metadata,
+            ws_hub=args.ws_hub
         )
     finally:
+        if hls_janitor is not None:
+            hls_janitor.stop()
         # 关闭 Modbus 连接
         if 'modbus_client' in globals():
             modbus_client.disconnect()
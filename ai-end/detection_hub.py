@@ -0,0 +1,284 @@
+"""
+检测结果中心（一个端口服务所有摄像头的WebSocket锚框）
+每个摄像头进程各自启动WebSocket服务器时都要绑定8001端口，同一台主机上多路摄像头会端口冲突，
+只有一路的锚框能被访问。本模块作为独立进程运行：
+
+    python detection_hub.py --socket /tmp/beltmonitor-detections.sock --port 8001
+    python detect-cap-1.py --cameraid 1 --ws_hub /tmp/beltmonitor-detections.sock ...
+
+摄像头进程（HubPublisher）把每次检测结果打成一个数据报，经Unix数据报套接字非阻塞发出，
+不建连接、不等待应答，中心未启动或来不及接收时直接丢弃（计数），不影响推理线程。
+中心在同一个事件循环里接收数据报并复用 ws_server 的分发（每个客户端独立的最新值槽位，
+JSON / binary / delta 三种格式），对外提供：
+    /ws/boxes/{camera_id}   WebSocket锚框（?format=binary|delta 见 ws_codec）
+    /stats                  分发与接收统计（JSON）
+    /health                 健康检查，列出仍在上报和已超时的摄像头
+
+数据报格式（小端）：
+    magic "BH" | version u8 | 保留 u8 | camera_id u16 | 类别表长度 u16 | JSON长度 u32
+    | 类别表（ws_codec kind 0 消息） | JSON载荷 | 完整二进制帧（ws_codec kind 1 消息）
+JSON在摄像头进程中按原样生成（默认格式与单进程模式逐字节一致），二进制帧在中心还原为锚框数组，
+增量帧和中心自己的序号在中心生成，摄像头进程重启不会打乱客户端的增量基准。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import time
+
+import numpy as np
+
+import ws_server
+from ws_codec import BOX_DTYPE, COUNT, FORMAT_DELTA, HEADER, KIND_FULL, MAGIC, BoxFrame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = "/tmp/beltmonitor-detections.sock"
+HUB_MAGIC = b"BH"
+HUB_VERSION = 1
+HUB_HEADER = struct.Struct("<2sBxHHI")
+STATS_PATH = "/stats"
+HEALTH_PATH = "/health"
+# 超过这么多秒没有收到某摄像头的数据报，健康检查把它列为超时
+STALE_AFTER = 10.0
+RECV_BUFFER = 1 << 20
+# 中心不可达时，发送端每隔这么多秒最多打印一次警告
+WARN_INTERVAL = 30.0
+
+
+def pack_detections(camera_id, class_table, payload_json, full_frame):
+    """摄像头进程 → 中心的数据报"""
+    return (HUB_HEADER.pack(HUB_MAGIC, HUB_VERSION, camera_id & 0xFFFF, len(class_table), len(payload_json))
+            + class_table + payload_json + full_frame)
+
+
+def unpack_detections(data):
+    """解析数据报，返回 (camera_id, 类别表, JSON载荷, 完整二进制帧)，格式不对时抛出 ValueError"""
+    if len(data) < HUB_HEADER.size:
+        raise ValueError("datagram too short")
+    magic, version, camera_id, table_len, json_len = HUB_HEADER.unpack_from(data)
+    if magic != HUB_MAGIC or version != HUB_VERSION:
+        raise ValueError("not a detection hub datagram")
+    table_end = HUB_HEADER.size + table_len
+    json_end = table_end + json_len
+    if json_end + HEADER.size + COUNT.size > len(data):
+        raise ValueError("truncated datagram")
+    return camera_id, data[HUB_HEADER.size:table_end], data[table_end:json_end], data[json_end:]
+
+
+class HubPublisher:
+    """
+    摄像头进程一侧：把检测结果非阻塞地发往检测结果中心
+
+    publish() 只做一次 sendto，中心未运行（套接字不存在/拒绝）或接收缓冲区已满时丢弃本次结果。
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.socket_path = socket_path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self._last_warning = 0.0
+
+        # 统计信息
+        self.sent = 0
+        self.dropped = 0
+
+    def publish(self, frame: BoxFrame):
+        data = pack_detections(frame.camera_id, frame.class_table, frame.encoded("json"), frame.encoded("binary"))
+        try:
+            self.sock.sendto(data, self.socket_path)
+            self.sent += 1
+            return True
+        except BlockingIOError:
+            # 中心来不及接收：丢弃，下一次检测结果会覆盖它
+            self.dropped += 1
+        except OSError as e:
+            self.dropped += 1
+            now = time.monotonic()
+            if now - self._last_warning >= WARN_INTERVAL:
+                self._last_warning = now
+                logger.warning(f"[检测中心] 无法发送到 {self.socket_path}: {e}（已丢弃 {self.dropped} 条）")
+        return False
+
+    def close(self):
+        self.sock.close()
+
+
+class CameraFeed:
+    """中心为每个摄像头保存的状态：最后一帧（增量基准）、类别表和接收统计"""
+
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.seq = 0
+        self.last_frame = None
+        self.class_table = b""
+        self.received = 0
+        self.bytes = 0
+        self.last_seen = None
+
+
+class DetectionHub:
+    """
+    检测结果中心：接收各摄像头的数据报并交给 ws_server 的 FanoutHub 分发
+
+    所有方法都在同一个事件循环中运行，数据报回调里直接 publish，不经过线程切换。
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, fanout=None, stale_after=STALE_AFTER, clock=time.time):
+        self.socket_path = socket_path
+        self.fanout = fanout if fanout is not None else ws_server.manager
+        self.stale_after = stale_after
+        self.clock = clock
+        self.feeds = {}
+        self.transport = None
+
+        # 统计信息
+        self.bad_datagrams = 0
+
+    async def start(self):
+        """绑定Unix数据报套接字（删除残留的旧套接字文件）并开始接收，已有检测中心在运行时抛出RuntimeError"""
+        if os.path.exists(self.socket_path):
+            if _socket_in_use(self.socket_path):
+                raise RuntimeError(f"{self.socket_path} 上已有检测中心在运行")
+            os.unlink(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+        sock.bind(self.socket_path)
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: _HubProtocol(self), sock=sock)
+        logger.info(f"[检测中心] 接收套接字: {self.socket_path}")
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    def handle_datagram(self, data):
+        try:
+            camera_id, class_table, payload_json, full_frame = unpack_detections(data)
+            magic, version, kind, _, _, ts = HEADER.unpack_from(full_frame)
+            if magic != MAGIC or kind != KIND_FULL:
+                raise ValueError("payload is not a full frame")
+            count, = COUNT.unpack_from(full_frame, HEADER.size)
+            boxes = np.frombuffer(full_frame, BOX_DTYPE, count, HEADER.size + COUNT.size).copy()
+        except (ValueError, struct.error) as e:
+            self.bad_datagrams += 1
+            logger.debug(f"[检测中心] 丢弃无效数据报: {e}")
+            return
+
+        feed = self.feeds.get(camera_id)
+        if feed is None:
+            feed = self.feeds[camera_id] = CameraFeed(camera_id)
+        feed.received += 1
+        feed.bytes += len(data)
+        feed.last_seen = self.clock()
+        # 类别表不变时沿用同一个对象，客户端只在变化时重新收到类别表
+        if class_table != feed.class_table:
+            feed.class_table = class_table
+        feed.seq += 1
+        # 只有存在增量格式订阅者时才与上一帧匹配锚框
+        base = feed.last_frame if FORMAT_DELTA in self.fanout.formats(camera_id) else None
+        frame = BoxFrame(camera_id, feed.seq, ts, boxes, feed.class_table, base=base,
+                         to_json=lambda: payload_json)
+        feed.last_frame = frame
+        self.fanout.publish(camera_id, frame)
+
+    def stats(self):
+        now = self.clock()
+        return {
+            "socket": self.socket_path,
+            "bad_datagrams": self.bad_datagrams,
+            "cameras": {
+                camera_id: {
+                    "received": feed.received,
+                    "bytes": feed.bytes,
+                    "last_seen_s": round(now - feed.last_seen, 3) if feed.last_seen is not None else None,
+                }
+                for camera_id, feed in self.feeds.items()
+            },
+        }
+
+    def health(self):
+        now = self.clock()
+        active = sorted(c for c, f in self.feeds.items() if now - f.last_seen <= self.stale_after)
+        stale = sorted(c for c, f in self.feeds.items() if now - f.last_seen > self.stale_after)
+        return {
+            "status": "healthy" if self.transport is not None else "stopped",
+            "active_cameras": active,
+            "stale_cameras": stale,
+            "subscribers": {camera_id: len(slots) for camera_id, slots in self.fanout.subscribers.items()},
+        }
+
+    def process_request(self, connection, request):
+        """在WebSocket端口上应答普通HTTP GET：/stats、/health，其余交给 ws_server"""
+        if request.path == STATS_PATH:
+            stats = {"hub": self.stats(), **self.fanout.stats()}
+            return connection.respond(200, json.dumps(stats, ensure_ascii=False) + "\n")
+        if request.path == HEALTH_PATH:
+            health = self.health()
+            return connection.respond(200 if health["status"] == "healthy" else 503, json.dumps(health) + "\n")
+        return ws_server.process_request(connection, request)
+
+    async def serve_forever(self, host="0.0.0.0", port=8001, ready=None):
+        await self.start()
+        # 多路复用客户端只能订阅已经发来过检测结果的摄像头
+        self.fanout.camera_filter = self.feeds.__contains__
+        try:
+            await ws_server.serve_forever(host, port, ready, process_request=self.process_request)
+        finally:
+            self.fanout.camera_filter = None
+            self.close()
+
+
+def _socket_in_use(path):
+    """路径上的套接字仍有进程绑定时返回True；进程退出后残留的套接字文件会拒绝连接"""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+class _HubProtocol(asyncio.DatagramProtocol):
+    def __init__(self, hub):
+        self.hub = hub
+
+    def datagram_received(self, data, addr):
+        self.hub.handle_datagram(data)
+
+    def error_received(self, exc):
+        logger.warning(f"[检测中心] 接收错误: {exc}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve WebSocket detection boxes of all cameras from one port")
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET, help="Unix datagram socket the camera processes publish to")
+    parser.add_argument('--host', type=str, default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    hub = DetectionHub(args.socket)
+    print(f"[检测中心] 已启动，地址: ws://{args.host}:{args.port}/ws/boxes/<camera_id>，"
+          f"统计: {STATS_PATH}，健康检查: {HEALTH_PATH}，摄像头进程使用 --ws_hub {args.socket}")
+    try:
+        asyncio.run(hub.serve_forever(args.host, args.port))
+    except RuntimeError as e:
+        raise SystemExit(f"[检测中心] 无法启动: {e}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
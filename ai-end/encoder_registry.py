@@ -0,0 +1,262 @@
+"""
+编码器能力注册表
+启动时探测一次FFmpeg支持的H.264编码器（硬件编码器另做一次试编码确认可用），
+结果按FFmpeg可执行文件路径和修改时间缓存到磁盘，同一主机上的所有摄像头进程共用，
+之后启动摄像头不再运行任何FFmpeg探测命令。编码器参数和码率阶梯也统一由这里给出。
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_PATH = os.environ.get(
+    "BELTMONITOR_ENCODER_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "beltmonitor", "encoders.json")
+)
+
+SOFTWARE_ENCODER = "libx264"
+
+# 按优先级排列的硬件编码器
+HARDWARE_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+
+# 各编码器的预设参数、低延迟参数和输出像素格式
+ENCODER_PRESETS = {
+    "libx264": {
+        "preset": ['-preset', 'veryfast'],
+        "low_latency": ['-tune', 'zerolatency'],
+        "pix_fmt": 'yuv420p',
+    },
+    "h264_nvenc": {
+        "preset": ['-preset', 'p2'],
+        "low_latency": ['-tune', 'll', '-zerolatency', '1'],
+        "pix_fmt": 'yuv420p',
+    },
+    "h264_qsv": {
+        "preset": ['-preset', 'veryfast'],
+        "low_latency": ['-async_depth', '1'],
+        "pix_fmt": 'nv12',
+    },
+    "h264_videotoolbox": {
+        "preset": ['-realtime', '1'],
+        "low_latency": [],
+        "pix_fmt": 'yuv420p',
+    },
+}
+
+# 码率阶梯：(短边像素上限, 25fps下的目标码率kbps)
+BITRATE_LADDER = (
+    (240, 400),
+    (360, 600),
+    (480, 900),
+    (720, 1800),
+    (1080, 3500),
+    (1440, 6000),
+    (2160, 12000),
+)
+
+
+def bitrate_for(width, height, fps):
+    """
+    按分辨率和帧率从码率阶梯中取目标码率（kbps）
+    帧率按25fps线性折算，最低折算到一半
+    """
+    short_side = min(width, height)
+    kbps = BITRATE_LADDER[-1][1]
+    for max_side, rung_kbps in BITRATE_LADDER:
+        if short_side <= max_side:
+            kbps = rung_kbps
+            break
+    return int(kbps * max(0.5, fps / 25.0))
+
+
+def parse_encoders(output):
+    """解析 `ffmpeg -encoders` 的输出，返回视频编码器名称列表"""
+    encoders = []
+    started = False
+    for line in output.splitlines():
+        line = line.strip()
+        if not started:
+            # 编码器列表位于 "------" 分隔行之后
+            started = line.startswith("------")
+            continue
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith("V"):
+            encoders.append(parts[1])
+    return encoders
+
+
+def probe_ffmpeg(ffmpeg_path, runner=subprocess.run, timeout=10):
+    """
+    探测FFmpeg的视频编码器
+
+    列表中出现的硬件编码器不一定有对应设备（例如没有GPU的机器上的nvenc），
+    因此对每个候选硬件编码器试编码几帧，只保留成功的。
+
+    Returns:
+        dict: {"encoders": 全部视频编码器, "hardware": 可用的硬件编码器（按优先级）}，
+        FFmpeg无法运行时编码器列表为空
+    """
+    try:
+        result = runner([ffmpeg_path, '-hide_banner', '-encoders'],
+                        capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"[编码器] 无法列出 {ffmpeg_path} 的编码器: {e}")
+        return {"encoders": [], "hardware": []}
+    encoders = parse_encoders(result.stdout)
+    hardware = []
+    for name in HARDWARE_ENCODERS:
+        if name not in encoders:
+            continue
+        command = [
+            ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', 'color=c=black:s=256x144:r=25:d=0.2',
+            '-c:v', name, '-pix_fmt', ENCODER_PRESETS[name]["pix_fmt"],
+            '-f', 'null', '-'
+        ]
+        try:
+            if runner(command, capture_output=True, text=True, timeout=timeout).returncode == 0:
+                hardware.append(name)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.info(f"[编码器] {name} 试编码失败: {e}")
+    return {"encoders": encoders, "hardware": hardware}
+
+
+class EncoderRegistry:
+    """
+    FFmpeg编码器能力注册表
+
+    load() 先查磁盘缓存，缓存条目以FFmpeg路径为键并记录其修改时间，
+    FFmpeg被替换或升级后修改时间变化，自动重新探测。
+    """
+
+    def __init__(self, ffmpeg_path=None, cache_path=DEFAULT_CACHE_PATH, runner=subprocess.run,
+                 which=shutil.which):
+        self.requested_path = ffmpeg_path
+        self.cache_path = cache_path
+        self.runner = runner
+        self.which = which
+
+        self.ffmpeg_path = None
+        self.encoders = []
+        self.hardware = []
+        self.from_cache = False
+        self.probes = 0
+        self.loaded = False
+
+    @property
+    def available(self):
+        """是否找到了可用的FFmpeg"""
+        return self.ffmpeg_path is not None
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != CACHE_VERSION:
+            return {}
+        return data.get("entries", {})
+
+    def _write_cache(self, entries):
+        # 先写临时文件再替换，多个摄像头进程同时启动时不会读到半个文件
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, "entries": entries}, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"[编码器] 无法写入缓存 {self.cache_path}: {e}")
+
+    def load(self):
+        """解析FFmpeg路径并加载编码器能力，命中缓存时不运行FFmpeg"""
+        path = self.which(self.requested_path or "ffmpeg")
+        if path is None:
+            self.loaded = True
+            return self
+        path = os.path.realpath(path)
+        self.ffmpeg_path = path
+        mtime_ns = os.stat(path).st_mtime_ns
+
+        entries = self._read_cache()
+        entry = entries.get(path)
+        if entry is not None and entry.get("mtime_ns") == mtime_ns:
+            self.from_cache = True
+        else:
+            entry = dict(probe_ffmpeg(path, self.runner), mtime_ns=mtime_ns, probed_at=time.time())
+            self.probes += 1
+            # 探测失败（编码器列表为空）不写缓存，下次启动重新探测
+            if entry["encoders"]:
+                entries[path] = entry
+                self._write_cache(entries)
+        self.encoders = entry["encoders"]
+        self.hardware = entry["hardware"]
+        self.loaded = True
+        return self
+
+    def has(self, name):
+        return name in self.encoders
+
+    def h264_encoder(self, prefer_hardware=True):
+        """选择H.264编码器：优先可用的硬件编码器，否则使用libx264"""
+        if prefer_hardware and self.hardware:
+            return self.hardware[0]
+        if self.has(SOFTWARE_ENCODER) or not self.encoders:
+            # 编码器列表探测失败时按libx264处理
+            return SOFTWARE_ENCODER
+        if self.hardware:
+            return self.hardware[0]
+        raise RuntimeError(f"FFmpeg ({self.ffmpeg_path}) 不支持任何H.264编码器")
+
+    def video_args(self, width, height, fps, low_latency=False, encoder=None, prefer_hardware=True):
+        """
+        生成FFmpeg的视频编码参数（编码器、预设、输出像素格式、码率）
+
+        libx264 使用CRF 23并以阶梯码率封顶；硬件编码器直接以阶梯码率作为目标码率。
+        """
+        encoder = encoder or self.h264_encoder(prefer_hardware)
+        preset = ENCODER_PRESETS.get(encoder, ENCODER_PRESETS[SOFTWARE_ENCODER])
+        kbps = bitrate_for(width, height, fps)
+        args = ['-c:v', encoder] + preset["preset"]
+        if low_latency:
+            args += preset["low_latency"]
+        if encoder == SOFTWARE_ENCODER:
+            args += ['-crf', '23', '-maxrate', f'{kbps}k', '-bufsize', f'{kbps * 2}k']
+        else:
+            args += ['-b:v', f'{kbps}k', '-maxrate', f'{int(kbps * 1.25)}k', '-bufsize', f'{kbps}k']
+        args += ['-pix_fmt', preset["pix_fmt"]]
+        return args
+
+    def stats(self):
+        try:
+            h264_encoder = self.h264_encoder() if self.available else None
+        except RuntimeError:
+            h264_encoder = "unavailable"
+        return {
+            "ffmpeg_path": self.ffmpeg_path,
+            "h264_encoder": h264_encoder,
+            "hardware": list(self.hardware),
+            "from_cache": self.from_cache,
+            "probes": self.probes,
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_encoder_registry(**kwargs):
+    """返回进程内共享的编码器注册表，第一次调用时加载"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = EncoderRegistry(**kwargs).load()
+        return _registry
@@ -0,0 +1,367 @@
+"""
+FFmpeg编码输出
+EncoderSink持有FFmpeg进程和一个写入线程：上游只把帧放入有界队列就立即返回，
+编码器变慢时按丢帧策略丢弃旧帧，不会反压到采集和推理阶段。
+写入时直接把连续的numpy缓冲区以memoryview交给管道，不经过tobytes()的整帧拷贝。
+可选在写入线程中先把BGR转换为I420（yuv420p）再送入管道，数据量减半，
+FFmpeg也不必在编码线程里再做色彩转换。
+"""
+
+import bisect
+import collections
+import logging
+import queue
+import subprocess
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from video_pipeline import BoundedQueue, FramePacket, DROP_OLDEST
+
+logger = logging.getLogger(__name__)
+
+# Linux下可通过F_SETPIPE_SZ放大管道缓冲区（默认64KB，不足一帧800x450 BGR数据）
+F_SETPIPE_SZ = 1031
+DEFAULT_PIPE_SIZE = 1 << 20
+
+# 视频时间轴记录保留的新帧数（按采集时间戳查询帧在视频中的位置）
+TIMELINE_SIZE = 256
+
+# 管道中的原始帧格式
+PIX_FMT_BGR24 = "bgr24"
+PIX_FMT_I420 = "yuv420p"
+PIX_FMTS = (PIX_FMT_BGR24, PIX_FMT_I420)
+
+
+def frame_nbytes(width, height, pix_fmt=PIX_FMT_BGR24):
+    """一帧原始画面在管道中的字节数"""
+    if pix_fmt == PIX_FMT_I420:
+        return width * height * 3 // 2
+    return width * height * 3
+
+
+def bgr_to_i420(frame, out=None):
+    """
+    把BGR帧转换为I420平面格式（Y平面后接U、V平面），宽高必须为偶数
+
+    Args:
+        frame: BGR图像
+        out: 预分配的 (height * 3 / 2, width) uint8 缓冲区，为None时新分配
+    """
+    height, width = frame.shape[:2]
+    if height % 2 or width % 2:
+        raise ValueError(f"I420要求宽高为偶数，当前为 {width}x{height}")
+    if out is None:
+        out = np.empty((height * 3 // 2, width), dtype=np.uint8)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420, dst=out)
+
+
+def set_pipe_size(fd, size):
+    """
+    尝试放大管道缓冲区，返回实际大小；平台不支持时返回None
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    try:
+        return fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except OSError as e:
+        # 超过 /proc/sys/fs/pipe-max-size 时失败，保持默认大小
+        logger.warning(f"[编码输出] 无法把管道缓冲区设置为 {size} 字节: {e}")
+        return None
+
+
+class RateCounter:
+    """按秒滚动的计数器，last_second()返回上一个完整秒内的计数"""
+
+    def __init__(self, keys):
+        self._keys = tuple(keys)
+        self._current = dict.fromkeys(self._keys, 0)
+        self._last = dict.fromkeys(self._keys, 0)
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _roll(self, now):
+        elapsed = now - self._window_start
+        if elapsed < 1.0:
+            return
+        # 超过两秒没有滚动说明中间的秒内没有任何事件
+        self._last = self._current if elapsed < 2.0 else dict.fromkeys(self._keys, 0)
+        self._current = dict.fromkeys(self._keys, 0)
+        self._window_start = now - (elapsed % 1.0)
+
+    def add(self, key, count=1):
+        with self._lock:
+            self._roll(time.monotonic())
+            self._current[key] += count
+
+    def last_second(self):
+        with self._lock:
+            self._roll(time.monotonic())
+            return dict(self._last)
+
+
+class EncoderSink:
+    """
+    FFmpeg编码输出端
+
+    写入线程按声明的帧率节拍工作：每个节拍取队列中最新的一帧写入，积压的旧帧被丢弃；
+    没有新帧时（duplicate_last=True）重复写入上一帧以保持输出帧率。
+    duplicate_last=False 时不做节拍控制，有帧就写。
+
+    节拍以第一帧写入时刻为起点按时钟计算：第n帧在 起点 + n/fps 时写入，写入变慢时
+    连续补写直到追上时钟，因此HLS时间轴（已写帧数/fps）与真实时间保持一致；
+    落后超过 max_catchup 秒（如进程被挂起）时不再追赶，重新对齐起点并计入 resyncs。
+    两者之差作为漂移（drift）指标输出，负值表示输出落后于真实时间。
+
+    pix_fmt 为 yuv420p 时上游仍然提交BGR帧，写入线程转换到预分配的I420缓冲区后写入，
+    重复输出的帧直接复用转换结果；FFmpeg命令的输入格式需与之一致。
+    """
+
+    def __init__(self, command, fps, queue_size=2, drop_policy=DROP_OLDEST, duplicate_last=True,
+                 pipe_size=DEFAULT_PIPE_SIZE, popen=subprocess.Popen, on_error=None, name="encoder",
+                 pix_fmt=PIX_FMT_BGR24, max_catchup=2.0, stdout=None):
+        if pix_fmt not in PIX_FMTS:
+            raise ValueError(f"不支持的管道帧格式: {pix_fmt}，可选值: {PIX_FMTS}")
+        self.command = list(command)
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        self.interval = 1.0 / fps if fps > 0 else 0.04
+        self.duplicate_last = duplicate_last
+        self.max_catchup = max_catchup
+        self.pipe_size = pipe_size
+        self.stdout = stdout  # 为subprocess.PIPE时可从 process.stdout 读取FFmpeg的输出（如分片MP4）
+        self.popen = popen
+        self.on_error = on_error  # 写入失败（如FFmpeg退出）时回调，参数为异常对象
+        self.name = name
+
+        # 上游直接往该队列放入FramePacket，也可以调用submit()
+        self.queue = BoundedQueue(name, queue_size, drop_policy)
+        self.process = None
+        self.thread = None
+        self.failed = False
+        self._stop_event = threading.Event()
+        self._last_frame = None
+        self._last_capture_ts = None
+        self._i420_buffer = None
+
+        # 节拍时钟：起点（单调时钟）和起点之后写入的帧数
+        self._clock_start = None
+        self._clock_frames = 0
+
+        # 新帧的 (采集时间戳, 视频时间轴位置)，第n个写入的帧位于 n/fps 秒
+        self.timeline = collections.deque(maxlen=TIMELINE_SIZE)
+
+        # 统计信息
+        self.written = 0
+        self.duplicated = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+        self.convert_time = 0.0
+        self.resyncs = 0
+        self.max_drift = 0.0
+        self.frame_age_total = 0.0
+        self.frame_age_count = 0
+        self.actual_pipe_size = None
+        self._rates = RateCounter(("written", "dropped", "duplicated"))
+        self._reported_drops = 0
+
+    def start(self):
+        """启动FFmpeg进程和写入线程"""
+        self.process = self.popen(self.command, stdin=subprocess.PIPE, stdout=self.stdout, bufsize=0)
+        if self.pipe_size and hasattr(self.process.stdin, "fileno"):
+            self.actual_pipe_size = set_pipe_size(self.process.stdin.fileno(), self.pipe_size)
+        self.thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+        self.thread.start()
+        logger.info(f"[编码输出] {self.name} 已启动，帧率 {self.fps}，管道缓冲区 {self.actual_pipe_size or '默认'}")
+        return self
+
+    def submit(self, frame, ts=None):
+        """放入一帧（非阻塞，队列满时按丢帧策略处理），返回是否入队"""
+        return self.queue.put(FramePacket(0, ts if ts is not None else time.time(), frame), timeout=0)
+
+    def _convert(self, frame):
+        """把上游的BGR帧转换为管道格式"""
+        if self.pix_fmt == PIX_FMT_BGR24:
+            return frame
+        height, width = frame.shape[:2]
+        if self._i420_buffer is None or self._i420_buffer.shape != (height * 3 // 2, width):
+            self._i420_buffer = np.empty((height * 3 // 2, width), dtype=np.uint8)
+        start = time.perf_counter()
+        converted = bgr_to_i420(frame, self._i420_buffer)
+        self.convert_time += time.perf_counter() - start
+        return converted
+
+    def _write_frame(self, frame, capture_ts=None):
+        if not frame.flags.c_contiguous:
+            frame = np.ascontiguousarray(frame)
+        view = memoryview(frame).cast("B")
+        stdin = self.process.stdin
+        start = time.perf_counter()
+        # 无缓冲管道可能只写入一部分，循环直到整帧写完
+        while view:
+            written = stdin.write(view)
+            if written is None:
+                written = 0
+            view = view[written:]
+        self.write_time += time.perf_counter() - start
+        self.bytes_written += frame.nbytes
+        if capture_ts is not None:
+            self.timeline.append((capture_ts, self.written * self.interval))
+        self.written += 1
+        self._rates.add("written")
+        if capture_ts is not None:
+            # 新帧从采集到送入编码器的时延
+            self.frame_age_total += time.time() - capture_ts
+            self.frame_age_count += 1
+
+        now = time.monotonic()
+        if self._clock_start is None:
+            self._clock_start = now
+        self._clock_frames += 1
+        drift = abs(self._drift(now))
+        if drift > self.max_drift:
+            self.max_drift = drift
+
+    def stream_time(self, capture_ts=None):
+        """
+        帧在视频时间轴上的位置（秒，首帧为0）
+
+        capture_ts 为None时返回最近写入一帧的位置；否则返回该采集时间戳的帧的位置，
+        该帧被丢弃或尚未写入时按最接近的已写入帧和采集时间差推算。尚未写入任何帧时返回None。
+        """
+        if capture_ts is None:
+            return (self.written - 1) * self.interval if self.written else None
+        timeline = list(self.timeline)
+        if not timeline:
+            return None
+        index = bisect.bisect_right(timeline, (capture_ts, float("inf"))) - 1
+        frame_ts, position = timeline[max(index, 0)]
+        return max(0.0, position + (capture_ts - frame_ts))
+
+    def _sync_drops(self):
+        dropped = self.queue.drop_count
+        if dropped > self._reported_drops:
+            self._rates.add("dropped", dropped - self._reported_drops)
+            self._reported_drops = dropped
+
+    def _next_frame(self):
+        """
+        取下一帧要写入的画面
+
+        Returns:
+            tuple: (frame, capture_ts)，重复输出的帧capture_ts为None；frame为None表示本节拍不写入
+        """
+        if not self.duplicate_last:
+            try:
+                packet = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                return None, None
+            return self._convert(packet.frame), packet.ts
+        try:
+            packet = self.queue.get_latest(timeout=0)
+        except queue.Empty:
+            if self._last_frame is not None:
+                self.duplicated += 1
+                self._rates.add("duplicated")
+            return self._last_frame, None
+        self._last_frame = self._convert(packet.frame)
+        return self._last_frame, packet.ts
+
+    def _drift(self, now=None):
+        """
+        最近一帧在视频时间轴上的位置与真实经过时间之差（秒）
+
+        按时写入时在 (-1/fps, 0] 之间，持续为更大的负值说明输出落后于真实时间
+        """
+        if self._clock_start is None or self._clock_frames == 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return (self._clock_frames - 1) * self.interval - (now - self._clock_start)
+
+    def _frame_delay(self):
+        """距离下一帧应写入的时刻还有多少秒，落后时为0"""
+        if self._clock_start is None:
+            return 0.0
+        now = time.monotonic()
+        delay = self._clock_start + self._clock_frames * self.interval - now
+        if -delay > self.max_catchup:
+            # 落后太多时补写会造成突发，直接把起点对齐到当前时刻
+            logger.warning(f"[编码输出] {self.name} 输出落后 {-delay:.1f} 秒，重新对齐节拍")
+            self.resyncs += 1
+            self._clock_start = now
+            self._clock_frames = 0
+            return 0.0
+        return max(0.0, delay)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.duplicate_last:
+                    delay = self._frame_delay()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+                        continue
+                frame, capture_ts = self._next_frame()
+                self._sync_drops()
+                if frame is not None:
+                    self._write_frame(frame, capture_ts)
+                elif self.duplicate_last:
+                    # 尚未收到第一帧
+                    self._stop_event.wait(self.interval)
+            except (BrokenPipeError, OSError, ValueError) as e:
+                self._fail(e)
+                return
+
+    def _fail(self, error):
+        self.failed = True
+        logger.error(f"[编码输出] {self.name} 写入FFmpeg失败，停止输出: {error}")
+        self.queue.close()
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def close(self, timeout=5.0):
+        """停止写入线程，关闭管道并等待FFmpeg写完最后的分片"""
+        self._stop_event.set()
+        self.queue.close()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+        if self.process is None:
+            return
+        try:
+            if self.process.stdin:
+                self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def stats(self):
+        avg_write_ms = (self.write_time / self.written * 1000) if self.written else 0.0
+        converted = self.written - self.duplicated
+        avg_convert_ms = (self.convert_time / converted * 1000) if converted > 0 else 0.0
+        avg_age_ms = (self.frame_age_total / self.frame_age_count * 1000) if self.frame_age_count else 0.0
+        return {
+            "pix_fmt": self.pix_fmt,
+            "written": self.written,
+            "dropped": self.queue.drop_count,
+            "duplicated": self.duplicated,
+            "mb_written": round(self.bytes_written / (1 << 20), 1),
+            "avg_write_ms": round(avg_write_ms, 2),
+            "avg_convert_ms": round(avg_convert_ms, 2),
+            "queue_depth": self.queue.qsize(),
+            "drift_ms": round(self._drift() * 1000, 1),
+            "max_drift_ms": round(self.max_drift * 1000, 1),
+            "resyncs": self.resyncs,
+            "avg_frame_age_ms": round(avg_age_ms, 1),
+            "last_second": self._rates.last_second(),
+        }
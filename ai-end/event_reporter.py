@@ -61,7 +61,7 @@ class EventReporter:
             camera_id (int): 摄像头ID
             alarm_type (str): 报警类型
             confidence (float): 置信度
-            frame: 报警时的图像帧
+            frame: 报警时的图像帧，或无参的可调用对象（仅在通过冷却检查后才调用以生成快照）
             alarm_rule_id (int): 报警规则ID，这是必需的参数
         
         Returns:
@@ -95,7 +95,8 @@ class EventReporter:
         
         # 不再提前保存临时图片，而是保存帧的副本以便稍后使用
         # 注意：这里只是保存在内存中的帧数据，不写入文件系统
-        frame_copy = frame.copy()
+        # 传入可调用对象时延迟到此处才渲染快照，冷却期内的报警不产生任何渲染开销
+        frame_copy = frame() if callable(frame) else frame.copy()
                 
         # 生成相对路径用于上报
         self.event_counter += 1
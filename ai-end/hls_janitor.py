@@ -0,0 +1,307 @@
+"""
+HLS分片清理
+FFmpeg的 delete_segments 只删除本次运行自己写出的分片，进程重启、崩溃或切换模式后，
+上一次运行留下的分片（如 camera_1/output54.ts）不再被任何播放列表引用，会一直堆积到磁盘写满。
+本模块定期扫描HLS目录，删除孤立分片，并按单路摄像头和全局的字节数/时长预算删除最旧的分片；
+同时统计分片写入和删除的数据量，可选把HLS目录放到内存文件系统（tmpfs）上。
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIXES = (".ts", ".m4s", ".mp4", ".vtt")
+PLAYLIST_SUFFIX = ".m3u8"
+URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+RAM_FILESYSTEMS = ("tmpfs", "ramfs")
+DEFAULT_RAM_ROOT = "/dev/shm/beltmonitor"
+
+
+def playlist_references(playlist_path):
+    """返回播放列表引用的文件名（分片URI以及 EXT-X-MAP/PART/PRELOAD-HINT 中的URI属性）"""
+    try:
+        with open(playlist_path, encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return set()
+    names = set()
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        uris = URI_ATTRIBUTE.findall(line) if line.startswith("#") else [line]
+        for uri in uris:
+            names.add(os.path.basename(uri.split("?", 1)[0]))
+    return names
+
+
+def scan_directory(path):
+    """
+    Returns:
+        tuple: (分片列表 [(文件名, 字节数, 修改时间)], 被播放列表引用的文件名集合)
+    """
+    segments = []
+    referenced = set()
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return segments, referenced
+    for entry in entries:
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        if entry.name.endswith(PLAYLIST_SUFFIX):
+            referenced |= playlist_references(entry.path)
+        elif entry.name.endswith(SEGMENT_SUFFIXES):
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            segments.append((entry.name, st.st_size, st.st_mtime))
+    return segments, referenced
+
+
+def filesystem_type(path, mounts_path="/proc/mounts"):
+    """返回路径所在文件系统的类型（取最长匹配的挂载点），无法判断时返回None"""
+    path = os.path.realpath(path)
+    try:
+        with open(mounts_path) as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return None
+    best, fstype = "", None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) > len(best):
+            best, fstype = mount_point, mount_type
+    return fstype
+
+
+def ram_backed_dir(hls_dir, ram_root=DEFAULT_RAM_ROOT, mounts_path="/proc/mounts"):
+    """
+    把HLS目录放到内存文件系统上，分片读写不再占用闪存/磁盘IO
+
+    hls_dir 已在tmpfs上时原样返回；不存在或本身是符号链接时，替换为指向 ram_root 下同名目录的符号链接，
+    外部服务（nginx、独立的 hls_server.py）仍可使用原路径；已是普通目录时不动它，直接返回内存目录路径。
+
+    Returns:
+        str: 实际写入HLS文件的目录
+    """
+    if filesystem_type(hls_dir if os.path.exists(hls_dir) else os.path.dirname(os.path.abspath(hls_dir)),
+                       mounts_path) in RAM_FILESYSTEMS:
+        os.makedirs(hls_dir, exist_ok=True)
+        return hls_dir
+    ram_dir = os.path.join(ram_root, os.path.basename(os.path.abspath(hls_dir)))
+    os.makedirs(ram_dir, exist_ok=True)
+    if os.path.islink(hls_dir) or not os.path.exists(hls_dir):
+        if os.path.islink(hls_dir):
+            if os.path.realpath(hls_dir) == os.path.realpath(ram_dir):
+                return hls_dir
+            os.unlink(hls_dir)
+        os.symlink(ram_dir, hls_dir)
+        return hls_dir
+    logger.warning("%s 已是普通目录，HLS文件改写到 %s", hls_dir, ram_dir)
+    return ram_dir
+
+
+class HlsJanitor:
+    """
+    HLS目录清理器
+
+    扫描 hls_dir 本身及其下一级子目录（每路摄像头一个 camera_<id> 目录），设置 directory 时只扫描该目录
+    （本进程写出的目录），每个目录按以下顺序清理：
+      1. 孤立分片：不被目录中任何播放列表引用、且超过 grace 秒未修改（正在写入的新分片尚未加入播放列表）；
+      2. 超过 max_age 秒的分片；
+      3. 目录超出 camera_max_bytes 时从最旧的分片删起；
+    最后整个HLS目录超出 total_max_bytes 时跨目录删除最旧的分片。
+    预算清理优先删除孤立分片，且每个目录始终保留最新的 keep_latest 个被引用的分片，保证直播可以继续播放。
+
+    多路摄像头共用一个HLS目录时，每个进程只清理自己的目录（directory），
+    全局预算由唯一的一个清理器负责（独立的 hls_server.py 或带 --hls_janitor_global 的进程），
+    否则多个清理器会争抢删除同一批分片，写入/删除统计也会重复计算。
+    """
+
+    def __init__(self, hls_dir, camera_max_bytes=None, total_max_bytes=None, max_age=None,
+                 grace=10.0, keep_latest=3, interval=5.0, clock=time.time, directory=None):
+        if directory is not None and total_max_bytes is not None:
+            raise ValueError("total_max_bytes 需要清理整个HLS目录，不能与 directory 同时设置")
+        self.hls_dir = hls_dir
+        self.directory = directory
+        self.camera_max_bytes = camera_max_bytes
+        self.total_max_bytes = total_max_bytes
+        self.max_age = max_age
+        self.grace = grace
+        self.keep_latest = keep_latest
+        self.interval = interval
+        self.clock = clock
+
+        self._known = {}
+        self._scanned = set()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.sweeps = 0
+        self.segments = 0
+        self.disk_bytes = 0
+        self.written_segments = 0
+        self.written_bytes = 0
+        self.deleted = {"orphan": 0, "age": 0, "camera_budget": 0, "total_budget": 0}
+        self.deleted_bytes = 0
+        self.delete_seconds = 0.0
+        self._rate_started = clock()
+        self._rate_written = 0
+        self._rate_deleted = 0
+
+    def _directories(self):
+        if self.directory is not None:
+            return [self.directory]
+        dirs = [self.hls_dir]
+        try:
+            dirs += sorted(e.path for e in os.scandir(self.hls_dir) if e.is_dir())
+        except OSError:
+            pass
+        return dirs
+
+    def _delete(self, path, size, reason):
+        started = time.perf_counter()
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning("删除分片失败 %s: %s", path, e)
+            return False
+        self.delete_seconds += time.perf_counter() - started
+        self.deleted[reason] += 1
+        self.deleted_bytes += size
+        self._rate_deleted += size
+        self._known.pop(path, None)
+        return True
+
+    def _sweep_directory(self, path, now, grace):
+        """清理单个目录，返回保留下来的分片 [(删除优先级, 修改时间, 路径, 字节数)]"""
+        segments, referenced = scan_directory(path)
+        by_age = sorted((mtime, name) for name, _, mtime in segments if name in referenced)
+        newest_referenced = {name for _, name in by_age[max(0, len(by_age) - self.keep_latest):]} if self.keep_latest else set()
+        # 目录第一次扫描时已有的分片不计入写入量
+        count_writes = path in self._scanned
+        self._scanned.add(path)
+
+        kept = []
+        for name, size, mtime in segments:
+            full = os.path.join(path, name)
+            if self._known.get(full) != (size, mtime):
+                # 新出现或仍在增长的分片计入写入量
+                if count_writes:
+                    grown = max(0, size - self._known.get(full, (0, 0))[0])
+                    self.written_segments += full not in self._known
+                    self.written_bytes += grown
+                    self._rate_written += grown
+                self._known[full] = (size, mtime)
+            age = now - mtime
+            if name not in referenced and age >= grace:
+                self._delete(full, size, "orphan")
+            elif self.max_age is not None and age > self.max_age and name not in newest_referenced:
+                self._delete(full, size, "age")
+            else:
+                # 孤立分片（尚在宽限期内）排在被引用分片之前删除
+                priority = 2 if name in newest_referenced else (1 if name in referenced else 0)
+                kept.append((priority, mtime, full, size))
+
+        if self.camera_max_bytes is not None:
+            kept = self._enforce_budget(kept, self.camera_max_bytes, "camera_budget")
+        return kept
+
+    def _enforce_budget(self, segments, max_bytes, reason):
+        total = sum(s[3] for s in segments)
+        remaining = []
+        for segment in sorted(segments):
+            priority, _, full, size = segment
+            if total > max_bytes and priority < 2 and self._delete(full, size, reason):
+                total -= size
+            else:
+                remaining.append(segment)
+        return remaining
+
+    def sweep(self, now=None, only=None, grace=None):
+        """
+        执行一次清理
+
+        Args:
+            now: 当前时间（默认 clock()）
+            only: 只清理该目录（如启动时本进程的输出目录），不更新分片数统计，默认清理本清理器负责的全部目录
+            grace: 覆盖孤立分片的宽限时间
+        """
+        now = self.clock() if now is None else now
+        grace = self.grace if grace is None else grace
+        with self._lock:
+            dirs = [only] if only is not None else self._directories()
+            kept = []
+            for path in dirs:
+                kept += self._sweep_directory(path, now, grace)
+            if self.total_max_bytes is not None and only is None:
+                kept = self._enforce_budget(kept, self.total_max_bytes, "total_budget")
+            if only is None:
+                # 被外部删除的分片（如FFmpeg的 delete_segments）不再跟踪
+                alive = {s[2] for s in kept}
+                self._known = {k: v for k, v in self._known.items() if k in alive}
+                self.segments = len(kept)
+                self.disk_bytes = sum(s[3] for s in kept)
+            self.sweeps += 1
+
+    def startup_clean(self, directory):
+        """
+        启动FFmpeg之前清理本进程的输出目录（即FFmpeg将要写入的目录）：上一次运行留下的孤立分片立即删除，
+        不等待宽限时间。其他摄像头的目录可能属于正在运行的进程，不在这里处理。
+        """
+        orphans, deleted_bytes = self.deleted["orphan"], self.deleted_bytes
+        self.sweep(only=directory, grace=0.0)
+        removed = self.deleted["orphan"] - orphans
+        if removed:
+            print(f"[HLS清理] 启动时删除上次运行遗留的分片 {removed} 个"
+                  f"（{(self.deleted_bytes - deleted_bytes) / (1024 * 1024):.1f} MB）")
+        return removed
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error("HLS清理失败: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="hls-janitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def stats(self):
+        now = self.clock()
+        elapsed = max(now - self._rate_started, 1e-6)
+        stats = {
+            "segments": self.segments,
+            "disk_mb": round(self.disk_bytes / (1024 * 1024), 1),
+            "written_segments": self.written_segments,
+            "written_mb": round(self.written_bytes / (1024 * 1024), 1),
+            "write_kb_s": round(self._rate_written / 1024 / elapsed, 1),
+            "deleted": dict(self.deleted),
+            "deleted_mb": round(self.deleted_bytes / (1024 * 1024), 1),
+            "delete_kb_s": round(self._rate_deleted / 1024 / elapsed, 1),
+            "delete_ms": round(self.delete_seconds * 1000, 1),
+        }
+        self._rate_started = now
+        self._rate_written = 0
+        self._rate_deleted = 0
+        return stats
@@ -0,0 +1,190 @@
+"""
+HLS检测结果元数据轨道
+WebSocket下发的锚框以真实时间为准，而HLS画面比真实时间晚数秒，前端按收到的时间绘制会画错帧。
+本模块把每次检测的锚框（DetectionPayload的JSON）作为WebVTT字幕轨道的cue写入HLS：
+cue的时间就是被检测那一帧在视频时间轴上的位置，播放器按视频时间触发cue，锚框与画面天然对齐，
+观看者也不再需要单独的WebSocket连接。
+
+输出（与视频播放列表在同一目录）：
+    metadata.m3u8 / metadata<N>.vtt   字幕媒体播放列表和分段，滑动窗口与视频一致
+    <name>_master.m3u8               主播放列表：视频 + SUBTITLES 组（AUTOSELECT=NO，默认不显示）
+前端用 hls.js 打开主播放列表，设置 hls.subtitleTrack = 0 并把对应 textTrack 设为 hidden，
+在 cuechange 事件中解析 cue.text（JSON）绘制锚框。
+"""
+
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = "metadata.m3u8"
+SEGMENT_TEMPLATE = "metadata{}.vtt"
+GROUP_ID = "detections"
+# FFmpeg mpegts封装默认的起始时间戳（muxdelay 0.7秒 × 2），无法从分片中读取时使用
+DEFAULT_MPEGTS = 126000
+TS_PACKET_SIZE = 188
+
+
+def first_video_pts(ts_path, max_bytes=512 * 1024):
+    """读取MPEG-TS分片中第一个视频PES的PTS（90kHz），即首帧的显示时间；读不到时返回None"""
+    try:
+        with open(ts_path, "rb") as f:
+            data = f.read(max_bytes)
+    except OSError:
+        return None
+    for pos in range(0, len(data) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        packet = data[pos:pos + TS_PACKET_SIZE]
+        if packet[0] != 0x47 or not packet[1] & 0x40:
+            continue
+        offset = 4
+        if packet[3] & 0x20:
+            offset += 1 + packet[4]
+        pes = packet[offset:]
+        # 视频流 stream_id 0xE0-0xEF，PTS_DTS_flags 最高位表示带PTS
+        if len(pes) >= 14 and pes[:3] == b"\0\0\1" and 0xE0 <= pes[3] <= 0xEF and pes[7] & 0x80:
+            b = pes[9:14]
+            return ((b[0] >> 1) & 0x07) << 30 | b[1] << 22 | (b[2] >> 1) << 15 | b[3] << 7 | b[4] >> 1
+    return None
+
+
+def vtt_timestamp(seconds):
+    seconds = max(0.0, seconds)
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def master_playlist(video_uri, metadata_uri, bandwidth, width, height):
+    """主播放列表：单一视频码率 + 检测结果字幕组"""
+    return (
+        "#EXTM3U\n"
+        "#EXT-X-VERSION:3\n"
+        f'#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="{GROUP_ID}",NAME="detections",LANGUAGE="zxx",'
+        f'AUTOSELECT=NO,DEFAULT=NO,URI="{metadata_uri}"\n'
+        f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height},SUBTITLES="{GROUP_ID}"\n'
+        f"{video_uri}\n"
+    )
+
+
+class WebVttMetadataTrack:
+    """
+    WebVTT元数据字幕轨道
+
+    add_cue(stream_time, text) 在视频时间 stream_time（秒，首帧为0）处加入一条cue，持续 cue_duration 秒，
+    下一条cue开始时上一条提前结束。advance(stream_time) 在视频写到 stream_time 时，
+    把结束时间早于 stream_time - delay 的分段写成文件并更新播放列表；delay 留给推理的时延，
+    检测结果晚于画面到达时仍能落入尚未写出的分段。
+    没有检测结果的时间段写出空分段，保持字幕轨道与视频连续。
+    """
+
+    def __init__(self, directory, video_playlist=None, segment_duration=2.0, list_size=5, cue_duration=1.0,
+                 delay=1.0, mpegts=None, video_start_number=0):
+        self.directory = directory
+        self.video_playlist = video_playlist
+        # 视频第一个分片的序号（FFmpeg的 -start_number）
+        self.video_start_number = video_start_number
+        self.segment_duration = segment_duration
+        self.list_size = list_size
+        self.cue_duration = cue_duration
+        self.delay = delay
+        self.mpegts = mpegts
+        self.playlist_path = os.path.join(directory, PLAYLIST_NAME)
+
+        self._cues = []  # [开始, 结束, 文本]
+        self._next_segment = 0
+        self._segments = []
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.cues = 0
+        self.late_cues = 0
+        self.segments_written = 0
+
+    def _resolve_mpegts(self):
+        """首帧的MPEG-TS时间戳从视频的第一个分片中读取，得到前不写出字幕分段"""
+        if self.mpegts is not None:
+            return True
+        if self.video_playlist is None:
+            self.mpegts = DEFAULT_MPEGTS
+            return True
+        try:
+            with open(self.video_playlist) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return False
+        first_sequence = f"#EXT-X-MEDIA-SEQUENCE:{self.video_start_number}"
+        if first_sequence not in lines and any(line.startswith("#EXT-X-MEDIA-SEQUENCE") for line in lines):
+            # 第一个分片已滑出播放列表
+            logger.warning("[HLS元数据] 无法读取视频首帧时间戳，使用默认值 %d", DEFAULT_MPEGTS)
+            self.mpegts = DEFAULT_MPEGTS
+            return True
+        uris = [line for line in lines if line and not line.startswith("#")]
+        if not uris:
+            return False
+        pts = first_video_pts(os.path.join(os.path.dirname(self.video_playlist), uris[0]))
+        if pts is None:
+            return False
+        self.mpegts = pts
+        return True
+
+    def add_cue(self, stream_time, text):
+        with self._lock:
+            self.cues += 1
+            if stream_time < self._next_segment * self.segment_duration:
+                # 所在分段已经写出
+                self.late_cues += 1
+                return
+            if self._cues and self._cues[-1][1] > stream_time:
+                self._cues[-1][1] = max(self._cues[-1][0], stream_time)
+            self._cues.append([stream_time, stream_time + self.cue_duration, text])
+
+    def advance(self, stream_time):
+        with self._lock:
+            if not self._resolve_mpegts():
+                return
+            while (self._next_segment + 1) * self.segment_duration + self.delay <= stream_time:
+                self._write_segment(self._next_segment)
+                self._next_segment += 1
+            self._cues = [c for c in self._cues if c[1] > self._next_segment * self.segment_duration]
+
+    def _write_segment(self, index):
+        start = index * self.segment_duration
+        end = start + self.segment_duration
+        lines = ["WEBVTT", f"X-TIMESTAMP-MAP=MPEGTS:{self.mpegts},LOCAL:00:00:00.000", ""]
+        for cue_start, cue_end, text in self._cues:
+            # 跨分段的cue在两个分段中都写出（起止时间相同，播放器会去重）
+            if cue_start < end and cue_end > start:
+                lines += [f"{vtt_timestamp(cue_start)} --> {vtt_timestamp(cue_end)}", text, ""]
+        name = SEGMENT_TEMPLATE.format(index)
+        _write_atomic(os.path.join(self.directory, name), "\n".join(lines) + "\n")
+        self._segments.append(name)
+        self.segments_written += 1
+
+        expired = self._segments[:-self.list_size]
+        self._segments = self._segments[-self.list_size:]
+        first = index - len(self._segments) + 1
+        playlist = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{int(self.segment_duration + 0.999)}",
+            f"#EXT-X-MEDIA-SEQUENCE:{first}",
+        ]
+        for segment in self._segments:
+            playlist += [f"#EXTINF:{self.segment_duration:.3f},", segment]
+        _write_atomic(self.playlist_path, "\n".join(playlist) + "\n")
+        for segment in expired:
+            try:
+                os.remove(os.path.join(self.directory, segment))
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"cues": self.cues, "late_cues": self.late_cues, "segments": self.segments_written}
+
+
+def _write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,178 @@
+"""
+HLS直通转封装
+摄像头本身输出H.264，不需要在Python中绘制锚框时，由FFmpeg直接把RTSP码流
+以 -c copy 方式转封装为HLS分片：不解码、不缩放、不重新编码，每路摄像头只占用极少CPU。
+FFmpeg因断流退出后按指数退避自动重启，播放列表以追加方式续写。
+"""
+
+import logging
+import random
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HlsRemuxer:
+    """
+    RTSP → HLS 直通转封装进程
+
+    监控线程负责启动FFmpeg并在其退出后重启，重启策略与ReconnectingFrameReader一致：
+    指数退避加随机抖动；进程稳定运行超过 healthy_after 秒后退避计数清零。
+    """
+
+    def __init__(self, source, output_path, hls_time=2, hls_list_size=5, segment_filename=None,
+                 initial_delay=1.0, max_delay=30.0, jitter=0.3, healthy_after=10.0, max_retries=None,
+                 ffmpeg_path="ffmpeg", popen=subprocess.Popen, name=None, start_number=0):
+        self.source = source
+        self.output_path = output_path
+        self.hls_time = hls_time
+        self.hls_list_size = hls_list_size
+        self.segment_filename = segment_filename
+        # 首次启动的分片序号；重启后由 append_list 接着播放列表中的序号继续
+        self.start_number = start_number
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.healthy_after = healthy_after
+        self.max_retries = max_retries  # None表示无限重启
+        self.ffmpeg_path = ffmpeg_path
+        self.popen = popen
+        self.name = name or str(source)
+
+        self.process = None
+        self.supervisor = None
+        self.ended = False
+        self._running = False
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.starts = 0
+        self.restarts = 0
+        self.last_exit_code = None
+        self._started_at = None
+
+    def _hls_flags(self):
+        flags = 'delete_segments+append_list+omit_endlist'
+        if self.starts:
+            # 重启后续写同一播放列表，并在衔接处标记不连续，播放器无需重新加载
+            flags += '+discont_start'
+        return flags
+
+    def build_command(self):
+        """构造FFmpeg转封装命令"""
+        source = str(self.source)
+        command = [self.ffmpeg_path, '-y', '-loglevel', 'warning']
+        if source.startswith('rtsp://'):
+            # TCP传输避免UDP丢包导致花屏；超时单位为微秒，断流时FFmpeg能及时退出以便重启
+            command += ['-rtsp_transport', 'tcp', '-timeout', '10000000']
+        elif '://' not in source:
+            # 本地文件按原始速率读取，模拟实时流
+            command += ['-re']
+        command += [
+            '-i', source,
+            '-map', '0:v:0',
+            '-c:v', 'copy',
+            '-an',
+            '-f', 'hls',
+            '-hls_time', str(self.hls_time),
+            '-hls_list_size', str(self.hls_list_size),
+            '-hls_flags', self._hls_flags(),
+            '-start_number', str(self.start_number),
+        ]
+        if self.segment_filename:
+            command += ['-hls_segment_filename', self.segment_filename]
+        command.append(self.output_path)
+        return command
+
+    def _spawn(self):
+        try:
+            process = self.popen(self.build_command(), stdin=subprocess.DEVNULL)
+        except Exception as e:
+            logger.error(f"[HLS直通] {self.name} 启动FFmpeg失败: {e}")
+            return None
+        with self._lock:
+            self.process = process
+        self.starts += 1
+        self._started_at = time.monotonic()
+        return process
+
+    def start(self):
+        """启动FFmpeg和监控线程"""
+        if self._running:
+            return
+        if self._spawn() is None:
+            raise IOError(f"Cannot start FFmpeg remux for {self.source}")
+        self._running = True
+        self.supervisor = threading.Thread(target=self._supervise, name=f"remux-{self.name}", daemon=True)
+        self.supervisor.start()
+        logger.info(f"[HLS直通] {self.name} 已启动转封装: {self.output_path}")
+
+    def _backoff_delay(self, attempt):
+        delay = min(self.max_delay, self.initial_delay * (2 ** attempt))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _supervise(self):
+        attempt = 0
+        while self._running:
+            with self._lock:
+                process = self.process
+            if process is not None:
+                code = process.poll()
+                if code is None:
+                    if time.monotonic() - self._started_at >= self.healthy_after:
+                        attempt = 0
+                    self._stop_event.wait(0.5)
+                    continue
+                self.last_exit_code = code
+                with self._lock:
+                    self.process = None
+                logger.warning(f"[HLS直通] {self.name} FFmpeg已退出（返回码 {code}）")
+
+            if self.max_retries is not None and attempt >= self.max_retries:
+                logger.error(f"[HLS直通] {self.name} 重启 {attempt} 次后放弃")
+                self.ended = True
+                self._running = False
+                break
+            delay = self._backoff_delay(attempt)
+            logger.info(f"[HLS直通] {self.name} 将在 {delay:.1f} 秒后进行第 {attempt + 1} 次重启")
+            if self._stop_event.wait(delay):
+                break
+            attempt += 1
+            if self._spawn() is not None:
+                self.restarts += 1
+
+    def is_running(self):
+        return self._running
+
+    def stop(self, timeout=5.0):
+        """停止监控线程并结束FFmpeg（先发送SIGTERM，超时后强制结束）"""
+        self._running = False
+        self._stop_event.set()
+        if self.supervisor and self.supervisor is not threading.current_thread():
+            self.supervisor.join(timeout=2.0)
+        with self._lock:
+            process = self.process
+            self.process = None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def stats(self):
+        with self._lock:
+            process = self.process
+        running = process is not None and process.poll() is None
+        return {
+            "running": running,
+            "starts": self.starts,
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code,
+            "uptime_s": round(time.monotonic() - self._started_at, 1) if running and self._started_at else 0.0,
+        }
@@ -0,0 +1,496 @@
+"""
+异步HLS/静态文件服务器
+替代Flask开发服务器（每个请求一个线程、每次轮询播放列表都读磁盘）：
+    - 基于asyncio，单线程处理所有连接，支持HTTP/1.1长连接
+    - 后台任务轮询HLS目录，播放列表（.m3u8）常驻内存，请求时不访问磁盘
+    - 分片（.ts/.m4s）用 sendfile 直接从文件发送到套接字
+    - 播放列表 no-cache（支持ETag协商），分片 immutable
+    - 同时提供 /api/coal_quantity；一个端口可以服务所有摄像头
+    - 在摄像头进程内运行时提供最新画面快照 /api/snapshot.jpg 和MJPEG流 /api/mjpeg（?overlay=1 带锚框）
+
+既可以在摄像头进程内以线程方式运行（替代 run_flask_server），
+也可以作为独立进程为所有摄像头服务：python hls_server.py --hls_dir hls_output --port 2000
+独立运行时各摄像头进程把煤量写入 <hls_dir>/camera_<id>/coal_quantity.json，由本服务器读取；
+加 --hls_total_max_mb 时由本服务器统一执行整个HLS目录的磁盘预算（各摄像头进程只清理自己的目录）。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import posixpath
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from hls_janitor import HlsJanitor
+from snapshot import MJPEG_CONTENT_TYPE, mjpeg_part, parse_variant
+
+logger = logging.getLogger(__name__)
+
+HLS_PREFIX = "/hls_output/"
+COAL_QUANTITY_PATH = "/api/coal_quantity"
+COAL_QUANTITY_FILE = "coal_quantity.json"
+SNAPSHOT_PATH = "/api/snapshot.jpg"
+MJPEG_PATH = "/api/mjpeg"
+
+MIME_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".vtt": "text/vtt",
+    ".jpg": "image/jpeg",
+    ".json": "application/json",
+    ".html": "text/html; charset=utf-8",
+}
+# 分片一旦写完、出现在播放列表中就不会再变化；各次运行的分片名互不相同（见 segment_start_number）
+IMMUTABLE_SUFFIXES = (".ts", ".m4s", ".mp4")
+NO_CACHE = "no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+REASONS = {200: "OK", 204: "No Content", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 503: "Service Unavailable"}
+
+MAX_HEADER_BYTES = 16 * 1024
+
+
+def publish_coal_quantity(hls_dir, camera_id, value):
+    """摄像头进程一侧：把煤量写入文件供独立的HLS服务器读取（先写临时文件再替换）"""
+    directory = os.path.join(hls_dir, f"camera_{camera_id}")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, COAL_QUANTITY_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"coal_quantity": value, "ts": time.time()}, f)
+    os.replace(tmp_path, path)
+
+
+def read_coal_quantity(hls_dir, camera_id):
+    try:
+        with open(os.path.join(hls_dir, f"camera_{camera_id}", COAL_QUANTITY_FILE)) as f:
+            return float(json.load(f)["coal_quantity"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def segment_start_number(clock=time.time):
+    """
+    本次运行的HLS分片起始序号（启动时刻的毫秒数）
+
+    分片按 IMMUTABLE 长期缓存，而FFmpeg默认每次从0编号，进程重启后会用同一个URI写出不同的内容。
+    序号每个分片只加1，分片时长远大于1毫秒，以启动时刻的毫秒数为起点时各次运行的分片名不会重复。
+    """
+    return int(clock() * 1000)
+
+
+class PlaylistCache:
+    """
+    把HLS目录下的播放列表缓存在内存中
+
+    scan() 遍历目录（只到摄像头子目录一级），按修改时间和大小判断是否需要重新读取。
+    FFmpeg先写临时文件再改名替换播放列表，因此读到的总是完整内容。
+    """
+
+    def __init__(self, root, max_depth=2):
+        self.root = root
+        self.max_depth = max_depth
+        self.entries = {}  # 相对路径 -> (内容, ETag)
+        self._stats = {}   # 相对路径 -> (mtime_ns, size)
+        self.reloads = 0
+
+    def _walk(self, directory, depth):
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if depth < self.max_depth:
+                            yield from self._walk(entry.path, depth + 1)
+                    elif entry.name.endswith(".m3u8"):
+                        yield entry
+        except OSError:
+            return
+
+    def scan(self):
+        seen = set()
+        for entry in self._walk(self.root, 1):
+            rel = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+            seen.add(rel)
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            key = (stat.st_mtime_ns, stat.st_size)
+            if self._stats.get(rel) == key:
+                continue
+            try:
+                with open(entry.path, "rb") as f:
+                    body = f.read()
+            except OSError:
+                continue
+            self._stats[rel] = key
+            self.entries[rel] = (body, f'"{key[0]:x}-{len(body):x}"')
+            self.reloads += 1
+        for rel in set(self.entries) - seen:
+            del self.entries[rel]
+            self._stats.pop(rel, None)
+
+    def get(self, rel):
+        return self.entries.get(rel)
+
+
+class HlsHttpServer:
+    """
+    HLS分片、播放列表和煤量接口的异步HTTP服务器
+
+    Args:
+        hls_dir: HLS根目录（对应URL前缀 /hls_output/）
+        ll_playlists: 低延迟HLS的内存播放列表 {目录: LowLatencyPlaylist}，阻塞式请求在线程池中处理
+        coal_quantity: 回调 camera_id -> 煤量，None时从 <hls_dir>/camera_<id>/coal_quantity.json 读取
+        default_camera_id: /api/coal_quantity 未指定 camera_id 时使用的摄像头
+        snapshots: 最新画面快照缓存（snapshot.SnapshotCache），None时不提供快照和MJPEG
+        serve_hls: False时只提供煤量接口（无画面模式），不扫描播放列表，HLS、快照和MJPEG一律返回404
+    """
+
+    def __init__(self, hls_dir, host="0.0.0.0", port=2000, ll_playlists=None, coal_quantity=None,
+                 default_camera_id=None, snapshots=None, poll_interval=0.1, idle_timeout=15.0, serve_hls=True):
+        self.hls_dir = os.path.abspath(hls_dir)
+        self.host = host
+        self.port = port
+        self.ll_playlists = ll_playlists if ll_playlists is not None else {}
+        self.coal_quantity = coal_quantity or (lambda camera_id: read_coal_quantity(self.hls_dir, camera_id))
+        self.default_camera_id = default_camera_id
+        self.serve_hls = serve_hls
+        self.snapshots = snapshots if serve_hls else None
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.playlists = PlaylistCache(self.hls_dir)
+
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self._watcher = None
+        self._ready = threading.Event()
+
+        # 统计信息
+        self.requests = 0
+        self.connections = 0
+        self.open_connections = 0
+        self.bytes_sent = 0
+        self.sendfile_bytes = 0
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if self.serve_hls:
+            self.playlists.scan()
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.serve_hls:
+            self._watcher = asyncio.ensure_future(self._watch())
+        self._ready.set()
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.playlists.scan()
+            except Exception as e:
+                logger.error(f"[HLS服务器] 扫描播放列表失败: {e}")
+
+    def start_in_thread(self, timeout=5.0):
+        """在独立线程的事件循环中运行，返回时服务器已开始监听"""
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self.serve_forever())
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                errors.append(e)
+                self._ready.set()
+
+        self.thread = threading.Thread(target=run, name=f"hls-server-{self.port}", daemon=True)
+        self.thread.start()
+        self._ready.wait(timeout)
+        if errors:
+            raise errors[0]
+        return self
+
+    def stop(self):
+        if self.loop is None or self.server is None:
+            return
+
+        def close():
+            if self._watcher is not None:
+                self._watcher.cancel()
+            self.server.close()
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+
+        self.loop.call_soon_threadsafe(close)
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        self.open_connections += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                if len(head) > MAX_HEADER_BYTES:
+                    break
+                keep_alive = await self._handle_request(head, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def _handle_request(self, head, writer):
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await self._send(writer, 400, b"bad request", keep_alive=False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        self.requests += 1
+
+        if method == "OPTIONS":
+            await self._send(writer, 204, b"", keep_alive=keep_alive, extra={
+                "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
+                "Access-Control-Allow-Headers": "*",
+            })
+            return keep_alive
+        if method not in ("GET", "HEAD"):
+            await self._send(writer, 405, b"method not allowed", keep_alive=keep_alive)
+            return keep_alive
+
+        url = urlsplit(target)
+        path = unquote(url.path)
+        query = parse_qs(url.query)
+        head_only = method == "HEAD"
+        if self.serve_hls and path.startswith(HLS_PREFIX):
+            await self._serve_hls(writer, path[len(HLS_PREFIX):], query, headers, keep_alive, head_only)
+        elif path.rstrip("/") == COAL_QUANTITY_PATH or path.startswith(COAL_QUANTITY_PATH + "/"):
+            await self._serve_coal_quantity(writer, path, query, keep_alive, head_only)
+        elif path == SNAPSHOT_PATH and self.snapshots is not None:
+            await self._serve_snapshot(writer, query, headers, keep_alive, head_only)
+        elif path == MJPEG_PATH and self.snapshots is not None:
+            await self._serve_mjpeg(writer, query)
+            return False
+        else:
+            await self._send(writer, 404, b"not found", keep_alive=keep_alive, head_only=head_only)
+        return keep_alive
+
+    async def _serve_hls(self, writer, rel, query, headers, keep_alive, head_only):
+        rel = posixpath.normpath(rel)
+        if rel.startswith("..") or rel.startswith("/") or rel == ".":
+            await self._send(writer, 404, b"not found", keep_alive=keep_alive, head_only=head_only)
+            return
+        directory, _, name = rel.rpartition("/")
+        ext = os.path.splitext(name)[1]
+
+        playlist = self.ll_playlists.get(directory)
+        if playlist is not None:
+            # 低延迟HLS的阻塞式刷新可能等待数秒，放到线程池中避免阻塞事件循环
+            msn = _int_arg(query, "_HLS_msn")
+            part = _int_arg(query, "_HLS_part")
+            status, mimetype, body = await self.loop.run_in_executor(None, playlist.serve, name, msn, part)
+            cacheable = status == 200 and ext != ".m3u8"
+            await self._send(writer, status, body, mimetype, keep_alive=keep_alive, head_only=head_only,
+                             cache=IMMUTABLE if cacheable else NO_CACHE)
+            return
+
+        if ext == ".m3u8":
+            cached = self.playlists.get(rel)
+            if cached is None:
+                # 刚创建、尚未被扫描到的播放列表
+                self.playlists.scan()
+                cached = self.playlists.get(rel)
+            if cached is None:
+                await self._send(writer, 404, b"not found", keep_alive=keep_alive, head_only=head_only)
+                return
+            body, etag = cached
+            if headers.get("if-none-match") == etag:
+                await self._send(writer, 304, b"", keep_alive=keep_alive, cache=NO_CACHE, extra={"ETag": etag})
+                return
+            await self._send(writer, 200, body, MIME_TYPES[ext], keep_alive=keep_alive, head_only=head_only,
+                             cache=NO_CACHE, extra={"ETag": etag})
+            return
+
+        await self._send_file(writer, os.path.join(self.hls_dir, *rel.split("/")), ext, keep_alive, head_only)
+
+    async def _send_file(self, writer, path, ext, keep_alive, head_only):
+        try:
+            f = open(path, "rb")
+        except OSError:
+            await self._send(writer, 404, b"not found", keep_alive=keep_alive, head_only=head_only)
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            cache = IMMUTABLE if ext in IMMUTABLE_SUFFIXES else NO_CACHE
+            self._write_head(writer, 200, MIME_TYPES.get(ext, "application/octet-stream"), size, keep_alive, cache)
+            await writer.drain()
+            if not head_only and size:
+                # 普通TCP连接上由内核完成文件到套接字的拷贝
+                sent = await self.loop.sendfile(writer.transport, f, 0, size)
+                self.sendfile_bytes += sent
+                self.bytes_sent += sent
+
+    async def _serve_coal_quantity(self, writer, path, query, keep_alive, head_only):
+        camera_id = path[len(COAL_QUANTITY_PATH):].strip("/") or (query.get("camera_id") or [None])[0]
+        if camera_id is None:
+            camera_id = self.default_camera_id
+        if camera_id is None:
+            body = {"coal_quantity": "0.0", "error": "Camera ID not specified"}
+            status = 400
+        else:
+            try:
+                camera_id = int(camera_id)
+            except ValueError:
+                pass
+            value = self.coal_quantity(camera_id)
+            body = {"coal_quantity": f"{value or 0:.1f}"}
+            status = 200
+        await self._send(writer, status, json.dumps(body).encode(), "application/json", keep_alive=keep_alive,
+                         head_only=head_only, cache=NO_CACHE)
+
+    async def _serve_snapshot(self, writer, query, headers, keep_alive, head_only):
+        # 编码可能需要几毫秒，放到线程池中；同一节拍内的并发请求共享同一次编码
+        variant = parse_variant((query.get("overlay") or [""])[0])
+        snapshot = await self.loop.run_in_executor(None, self.snapshots.get, variant)
+        if snapshot is None:
+            await self._send(writer, 503, b"no frame yet", keep_alive=keep_alive, head_only=head_only)
+            return
+        extra = {"ETag": snapshot.etag, "X-Timestamp": f"{snapshot.ts:.3f}"}
+        if headers.get("if-none-match") == snapshot.etag:
+            await self._send(writer, 304, b"", keep_alive=keep_alive, cache=NO_CACHE, extra=extra)
+            return
+        await self._send(writer, 200, snapshot.body, "image/jpeg", keep_alive=keep_alive, head_only=head_only,
+                         cache=NO_CACHE, extra=extra)
+
+    async def _serve_mjpeg(self, writer, query):
+        """MJPEG流：按帧率轮询快照缓存，画面更新后才发送；不占用线程池线程等待新画面"""
+        variant = parse_variant((query.get("overlay") or [""])[0])
+        fps = _float_arg(query, "fps") or self.snapshots.max_fps
+        interval = 1.0 / min(fps, self.snapshots.max_fps)
+        self._write_head(writer, 200, MJPEG_CONTENT_TYPE, None, False, NO_CACHE)
+        self.snapshots.streams += 1
+        try:
+            last_etag = None
+            while True:
+                snapshot = await self.loop.run_in_executor(None, self.snapshots.get, variant)
+                if snapshot is not None and snapshot.etag != last_etag:
+                    last_etag = snapshot.etag
+                    part = mjpeg_part(snapshot)
+                    writer.write(part)
+                    self.bytes_sent += len(part)
+                    await writer.drain()
+                await asyncio.sleep(interval)
+        except ConnectionError:
+            pass
+        finally:
+            self.snapshots.streams -= 1
+
+    def _write_head(self, writer, status, mimetype, length, keep_alive, cache=None, extra=None):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}"]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        lines += [
+            "Access-Control-Allow-Origin: *",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if mimetype:
+            lines.append(f"Content-Type: {mimetype}")
+        if cache:
+            lines.append(f"Cache-Control: {cache}")
+        for name, value in (extra or {}).items():
+            lines.append(f"{name}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send(self, writer, status, body, mimetype="text/plain", keep_alive=True, head_only=False,
+                    cache=None, extra=None):
+        self._write_head(writer, status, mimetype if body else None, len(body), keep_alive, cache, extra)
+        if body and not head_only:
+            writer.write(body)
+            self.bytes_sent += len(body)
+        await writer.drain()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "open_connections": self.open_connections,
+            "mb_sent": round(self.bytes_sent / (1024 * 1024), 1),
+            "sendfile_mb": round(self.sendfile_bytes / (1024 * 1024), 1),
+            "playlists": len(self.playlists.entries),
+            "playlist_reloads": self.playlists.reloads,
+        }
+
+
+def _int_arg(query, name):
+    values = query.get(name)
+    try:
+        return int(values[0]) if values else None
+    except ValueError:
+        return None
+
+
+def _float_arg(query, name):
+    values = query.get(name)
+    try:
+        return float(values[0]) if values else None
+    except ValueError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve HLS output and coal quantity for all cameras from one port")
+    parser.add_argument('--hls_dir', type=str, default='hls_output')
+    parser.add_argument('--host', type=str, default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=2000)
+    parser.add_argument('--hls_total_max_mb', type=float, default=None,
+                        help="Disk budget in MB for the whole HLS directory; this server is then its only enforcer")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    janitor = None
+    if args.hls_total_max_mb:
+        # 各摄像头进程只清理自己的目录，整个HLS目录的预算由这里统一执行
+        janitor = HlsJanitor(args.hls_dir, total_max_bytes=args.hls_total_max_mb * 1024 * 1024).start()
+        print(f"[HLS清理] HLS目录总预算: {args.hls_total_max_mb} MB")
+    server = HlsHttpServer(args.hls_dir, args.host, args.port)
+    print(f"[HLS服务器] 已启动，地址: http://{args.host}:{args.port}{HLS_PREFIX}，"
+          f"煤量接口: {COAL_QUANTITY_PATH}/<camera_id>")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if janitor is not None:
+            janitor.stop()
+
+
+if __name__ == '__main__':
+    main()
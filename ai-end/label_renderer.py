@@ -0,0 +1,109 @@
+"""
+锚框标签文字渲染
+把 (标签文字, 字号, 颜色) 预先光栅化为字形位图并放入LRU缓存，绘制时只在标签所在的
+小块区域内做alpha混合，避免每个锚框都把整帧在BGR/RGB/PIL之间来回转换。
+混合公式与PIL ImageDraw.text 的整数混合一致，输出与原PIL绘制逐像素相同。
+"""
+
+import collections
+import functools
+import threading
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_FONT_PATH = "./WenJinMincho-TTF.ttc"
+
+
+@functools.lru_cache(maxsize=32)
+def get_font(size=60, font_path=None):
+    """加载字体（按字号和路径缓存，避免每次绘制都从磁盘读取TTC文件）"""
+    try:
+        font_path = font_path or DEFAULT_FONT_PATH
+        return ImageFont.truetype(font_path, size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+class Glyph:
+    """预光栅化的标签位图"""
+    __slots__ = ("alpha", "ink", "offset")
+
+    def __init__(self, alpha, ink, offset):
+        self.alpha = alpha    # uint8 (h, w)，文字覆盖度
+        self.ink = ink        # int32 (3,)，BGR颜色
+        self.offset = offset  # 位图左上角相对于绘制原点的偏移 (dx, dy)
+
+
+class LabelRenderer:
+    """带LRU字形缓存的标签渲染器（线程安全）"""
+
+    def __init__(self, max_entries=256, font_loader=get_font):
+        self.max_entries = max_entries
+        self.font_loader = font_loader
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _rasterize(self, text, font_size, color):
+        font = self.font_loader(font_size)
+        left, top, right, bottom = font.getbbox(text)
+        width, height = max(1, right - left), max(1, bottom - top)
+        # 在灰度画布上用白色绘制，得到的像素值即PIL混合时使用的覆盖度
+        canvas = Image.new("L", (width, height), 0)
+        ImageDraw.Draw(canvas).text((-left, -top), text, font=font, fill=255)
+        return Glyph(np.asarray(canvas, dtype=np.uint8), np.array(color, dtype=np.int32), (left, top))
+
+    def get_glyph(self, text, font_size, color):
+        key = (text, font_size, tuple(color))
+        with self._lock:
+            glyph = self._cache.get(key)
+            if glyph is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return glyph
+        glyph = self._rasterize(text, font_size, color)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = glyph
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return glyph
+
+    def draw(self, frame, text, origin, font_size, color):
+        """
+        在BGR帧上原地绘制标签文字
+
+        Args:
+            frame: BGR图像（numpy数组，原地修改）
+            text: 标签文字
+            origin: 文字绘制原点 (x, y)，与 ImageDraw.text 的坐标含义相同
+            font_size: 字号
+            color: BGR颜色
+        """
+        if not text:
+            return frame
+        glyph = self.get_glyph(text, font_size, color)
+        gh, gw = glyph.alpha.shape
+        x0 = int(origin[0]) + glyph.offset[0]
+        y0 = int(origin[1]) + glyph.offset[1]
+
+        # 裁剪到画面范围内
+        fh, fw = frame.shape[:2]
+        fx0, fy0 = max(x0, 0), max(y0, 0)
+        fx1, fy1 = min(x0 + gw, fw), min(y0 + gh, fh)
+        if fx0 >= fx1 or fy0 >= fy1:
+            return frame
+
+        alpha = glyph.alpha[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0].astype(np.int32)[..., None]
+        roi = frame[fy0:fy1, fx0:fx1]
+        dst = roi.astype(np.int32)
+        # 与PIL的BLEND/DIV255宏相同的整数混合: out = (dst * (255 - a) + ink * a) / 255（带舍入）
+        tmp = dst * (255 - alpha) + glyph.ink * alpha + 128
+        roi[...] = (tmp + (tmp >> 8)) >> 8
+        return frame
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,447 @@
+"""
+低延迟HLS（LL-HLS）打包
+FFmpeg把编码结果以分片MP4（fMP4）写到标准输出，每个 moof+mdat 即一个部分分片（part，约0.2秒），
+本模块在内存中把部分分片组装成完整分片，生成带 EXT-X-PART / EXT-X-PRELOAD-HINT /
+EXT-X-SERVER-CONTROL 的播放列表，并支持 _HLS_msn/_HLS_part 阻塞式刷新。
+播放器无需等待整个分片写完即可拿到最新画面，端到端延迟从数秒降到1秒左右。
+"""
+
+import collections
+import logging
+import math
+import re
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INIT_NAME = "init.mp4"
+PART_PATTERN = re.compile(r"^part(\d+)\.(\d+)\.m4s$")
+SEGMENT_PATTERN = re.compile(r"^seg(\d+)\.m4s$")
+
+# trun/tfhd 中 sample_flags 的 sample_is_non_sync_sample 位
+NON_SYNC_SAMPLE = 0x00010000
+
+
+def iter_boxes(data, start=0, end=None):
+    """遍历MP4盒子，依次返回 (类型, 内容起始偏移, 盒子结束偏移)"""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield box_type.decode("latin-1"), pos + header, pos + size
+        pos += size
+
+
+def find_box(data, path, start=0, end=None):
+    """按路径（如 ['moov', 'trak', 'mdia', 'mdhd']）查找第一个匹配的盒子，返回 (内容起始, 结束) 或None"""
+    for box_type, body, box_end in iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return body, box_end
+            found = find_box(data, path[1:], body, box_end)
+            if found is not None:
+                return found
+    return None
+
+
+class TrackDefaults:
+    """初始化分片（ftyp+moov）中解析出的时间基和默认样本参数"""
+    __slots__ = ("timescale", "default_duration", "default_flags")
+
+    def __init__(self, timescale, default_duration=0, default_flags=0):
+        self.timescale = timescale
+        self.default_duration = default_duration
+        self.default_flags = default_flags
+
+
+def parse_init(data):
+    """解析初始化分片，返回TrackDefaults"""
+    mdhd = find_box(data, ["moov", "trak", "mdia", "mdhd"])
+    if mdhd is None:
+        raise ValueError("初始化分片中没有mdhd")
+    version = data[mdhd[0]]
+    timescale = struct.unpack_from(">I", data, mdhd[0] + (20 if version == 1 else 12))[0]
+    defaults = TrackDefaults(timescale)
+    trex = find_box(data, ["moov", "mvex", "trex"])
+    if trex is not None:
+        # version/flags, track_ID, sample_description_index, duration, size, flags
+        _, _, _, duration, _, flags = struct.unpack_from(">IIIIII", data, trex[0])
+        defaults.default_duration = duration
+        defaults.default_flags = flags
+    return defaults
+
+
+def parse_fragment(data, defaults):
+    """
+    解析 moof 盒子
+
+    Returns:
+        tuple: (时长秒数, 是否以关键帧开头)
+    """
+    moof = find_box(data, ["moof"])
+    if moof is None:
+        raise ValueError("分片中没有moof")
+    total_ticks = 0
+    independent = False
+    first_traf = True
+    for box_type, body, box_end in iter_boxes(data, *moof):
+        if box_type != "traf":
+            continue
+        default_duration = defaults.default_duration
+        default_flags = defaults.default_flags
+        tfhd = find_box(data, ["tfhd"], body, box_end)
+        if tfhd is not None:
+            flags = struct.unpack_from(">I", data, tfhd[0])[0] & 0xFFFFFF
+            pos = tfhd[0] + 8  # version/flags + track_ID
+            if flags & 0x01:
+                pos += 8
+            if flags & 0x02:
+                pos += 4
+            if flags & 0x08:
+                default_duration = struct.unpack_from(">I", data, pos)[0]
+                pos += 4
+            if flags & 0x10:
+                pos += 4
+            if flags & 0x20:
+                default_flags = struct.unpack_from(">I", data, pos)[0]
+
+        for run_type, run_body, run_end in iter_boxes(data, body, box_end):
+            if run_type != "trun":
+                continue
+            flags = struct.unpack_from(">I", data, run_body)[0] & 0xFFFFFF
+            sample_count = struct.unpack_from(">I", data, run_body + 4)[0]
+            pos = run_body + 8
+            if flags & 0x01:
+                pos += 4
+            first_flags = None
+            if flags & 0x04:
+                first_flags = struct.unpack_from(">I", data, pos)[0]
+                pos += 4
+            field_count = sum(1 for bit in (0x100, 0x200, 0x400, 0x800) if flags & bit)
+            for i in range(sample_count):
+                fields = struct.unpack_from(f">{field_count}I", data, pos) if field_count else ()
+                pos += 4 * field_count
+                index = 0
+                duration = default_duration
+                if flags & 0x100:
+                    duration = fields[index]
+                    index += 1
+                if flags & 0x200:
+                    index += 1
+                sample_flags = default_flags
+                if flags & 0x400:
+                    sample_flags = fields[index]
+                if i == 0 and first_flags is not None:
+                    sample_flags = first_flags
+                if i == 0 and first_traf:
+                    independent = not (sample_flags & NON_SYNC_SAMPLE)
+                    first_traf = False
+                total_ticks += duration
+    return total_ticks / defaults.timescale, independent
+
+
+class Segment:
+    """一个完整分片及其部分分片"""
+    __slots__ = ("msn", "parts", "duration", "complete", "program_date_time")
+
+    def __init__(self, msn, program_date_time):
+        self.msn = msn
+        self.parts = []          # [(data, duration, independent)]
+        self.duration = 0.0
+        self.complete = False
+        self.program_date_time = program_date_time
+
+
+class LowLatencyPlaylist:
+    """
+    内存中的LL-HLS媒体播放列表
+
+    部分分片按到达顺序追加，遇到以关键帧开头的部分分片且当前分片时长已接近目标时切分新分片。
+    只保留最近 window 个完整分片；播放列表只列出最近 part_segments 个分片的部分分片。
+    msn每次运行都从0开始，给出 run_id 时初始化段和分片名加上 "<run_id>_" 前缀，
+    重启后的URI与上次运行不同，不会命中浏览器和CDN中长期缓存的旧分片。
+    """
+
+    def __init__(self, playlist_name="output.m3u8", part_target=0.2, segment_target=1.0, window=6,
+                 part_segments=3, run_id=None):
+        self.playlist_name = playlist_name
+        self.prefix = f"{run_id}_" if run_id is not None else ""
+        self.part_target = part_target
+        self.segment_target = segment_target
+        self.window = window
+        self.part_segments = part_segments
+        self.init_data = None
+        self.ended = False
+        self._segments = collections.deque()
+        self._next_msn = 0
+        self._cond = threading.Condition()
+
+        # 统计信息
+        self.parts_added = 0
+        self.max_segment_duration = 0.0
+
+    def set_init(self, data):
+        with self._cond:
+            self.init_data = bytes(data)
+            self._cond.notify_all()
+
+    def _current(self):
+        return self._segments[-1] if self._segments and not self._segments[-1].complete else None
+
+    def _close_current(self):
+        current = self._current()
+        if current is not None:
+            current.complete = True
+            self.max_segment_duration = max(self.max_segment_duration, current.duration)
+
+    def add_part(self, data, duration, independent):
+        """追加一个部分分片（moof+mdat）"""
+        with self._cond:
+            current = self._current()
+            if (current is not None and independent
+                    and current.duration >= self.segment_target - self.part_target / 2):
+                self._close_current()
+                current = None
+            if current is None:
+                current = Segment(self._next_msn, time.time())
+                self._next_msn += 1
+                self._segments.append(current)
+            current.parts.append((bytes(data), duration, independent))
+            current.duration += duration
+            self.parts_added += 1
+            while len(self._segments) > self.window + 1:
+                self._segments.popleft()
+            self._cond.notify_all()
+
+    def close(self):
+        """输入结束：最后一个分片标记为完整，唤醒所有等待者"""
+        with self._cond:
+            self._close_current()
+            self.ended = True
+            self._cond.notify_all()
+
+    def _has(self, msn, part):
+        if not self._segments:
+            return False
+        last = self._segments[-1]
+        if msn < last.msn:
+            return True
+        if msn > last.msn:
+            return False
+        if part is None:
+            return last.complete
+        return len(last.parts) > part or last.complete
+
+    def wait_for(self, msn, part=None, timeout=None):
+        """阻塞直到播放列表包含分片msn（及其第part个部分分片），超时或输入结束返回False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._has(msn, part) or self.ended, timeout) and self._has(msn, part)
+
+    def next_part(self):
+        """下一个将要产生的部分分片 (msn, part)"""
+        with self._cond:
+            return self._next_part()
+
+    def _next_part(self):
+        current = self._current()
+        if current is None:
+            return self._next_msn, 0
+        return current.msn, len(current.parts)
+
+    def get_init(self, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self.init_data is not None or self.ended, timeout)
+            return self.init_data
+
+    def get_part(self, msn, index, timeout=None):
+        """获取部分分片，尚未产生时（预加载提示）阻塞等待；已被淘汰或超时返回None"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._has(msn, index) or self.ended, timeout)
+            for segment in self._segments:
+                if segment.msn == msn and index < len(segment.parts):
+                    return segment.parts[index][0]
+            return None
+
+    def get_segment(self, msn):
+        """获取完整分片（部分分片按顺序拼接）"""
+        with self._cond:
+            for segment in self._segments:
+                if segment.msn == msn and segment.complete:
+                    return b"".join(part[0] for part in segment.parts)
+            return None
+
+    def render(self):
+        """生成媒体播放列表文本"""
+        with self._cond:
+            segments = list(self._segments)
+            next_msn, next_index = self._next_part()
+            ended = self.ended
+        max_duration = max([self.max_segment_duration, self.segment_target] + [s.duration for s in segments])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:6",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max_duration)}",
+            f"#EXT-X-PART-INF:PART-TARGET={self.part_target:.3f}",
+            f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={self.part_target * 3:.3f}",
+            f"#EXT-X-MEDIA-SEQUENCE:{segments[0].msn if segments else 0}",
+            f'#EXT-X-MAP:URI="{self.prefix}{INIT_NAME}"',
+        ]
+        first_with_parts = len(segments) - self.part_segments
+        for i, segment in enumerate(segments):
+            lines.append("#EXT-X-PROGRAM-DATE-TIME:" + time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(segment.program_date_time))
+                         + f".{int(segment.program_date_time * 1000) % 1000:03d}Z")
+            if i >= first_with_parts:
+                for index, (_, duration, independent) in enumerate(segment.parts):
+                    attrs = f'DURATION={duration:.3f},URI="{self.prefix}part{segment.msn}.{index}.m4s"'
+                    if independent:
+                        attrs += ",INDEPENDENT=YES"
+                    lines.append(f"#EXT-X-PART:{attrs}")
+            if segment.complete:
+                lines.append(f"#EXTINF:{segment.duration:.3f},")
+                lines.append(f"{self.prefix}seg{segment.msn}.m4s")
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        else:
+            lines.append(f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="{self.prefix}part{next_msn}.{next_index}.m4s"')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, name, msn=None, part=None):
+        """
+        处理对播放列表目录下文件的请求（与Web框架无关）
+
+        Args:
+            name: 文件名（播放列表、init.mp4、partN.M.m4s 或 segN.m4s，后三者带 run_id 前缀）
+            msn, part: 阻塞式刷新参数 _HLS_msn / _HLS_part
+
+        Returns:
+            tuple: (状态码, MIME类型, 内容)
+        """
+        hold = self.segment_target * 3
+        if name == self.playlist_name:
+            if msn is not None:
+                with self._cond:
+                    last_msn = self._segments[-1].msn if self._segments else -1
+                if msn > last_msn + 2:
+                    return 400, "text/plain", b"_HLS_msn too far in the future"
+                if not self.wait_for(msn, part, timeout=hold) and not self.ended:
+                    return 503, "text/plain", b"playlist update timed out"
+            return 200, "application/vnd.apple.mpegurl", self.render().encode("utf-8")
+        if not name.startswith(self.prefix):
+            # 上次运行的分片
+            return 404, "text/plain", b"not found"
+        name = name[len(self.prefix):]
+        if name == INIT_NAME:
+            data = self.get_init(timeout=hold)
+            return (200, "video/mp4", data) if data is not None else (404, "text/plain", b"not found")
+        match = PART_PATTERN.match(name)
+        if match:
+            data = self.get_part(int(match.group(1)), int(match.group(2)), timeout=hold)
+            return (200, "video/mp4", data) if data is not None else (404, "text/plain", b"not found")
+        match = SEGMENT_PATTERN.match(name)
+        if match:
+            data = self.get_segment(int(match.group(1)))
+            return (200, "video/mp4", data) if data is not None else (404, "text/plain", b"not found")
+        return 404, "text/plain", b"not found"
+
+    def stats(self):
+        with self._cond:
+            return {
+                "segments": len(self._segments),
+                "parts": self.parts_added,
+                "next_msn": self._next_msn,
+                "max_segment_s": round(self.max_segment_duration, 3),
+            }
+
+
+def read_box(stream):
+    """从流中读取一个完整的MP4盒子，流结束返回None"""
+    header = _read_exact(stream, 8)
+    if header is None:
+        return None
+    size, box_type = struct.unpack(">I4s", header)
+    if size == 1:
+        extended = _read_exact(stream, 8)
+        if extended is None:
+            return None
+        header += extended
+        size = struct.unpack(">Q", extended)[0]
+    if size < len(header):
+        raise ValueError(f"MP4盒子长度异常: {size}")
+    body = _read_exact(stream, size - len(header))
+    if body is None:
+        return None
+    return box_type.decode("latin-1"), header + body
+
+
+def _read_exact(stream, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+class LowLatencyHlsPackager:
+    """
+    读取FFmpeg输出的分片MP4流并写入LowLatencyPlaylist
+
+    ftyp+moov 作为初始化分片，此后每对 moof+mdat 作为一个部分分片。
+    """
+
+    def __init__(self, stream, playlist, name="ll-hls"):
+        self.stream = stream
+        self.playlist = playlist
+        self.name = name
+        self.thread = None
+        self.defaults = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=f"{self.name}-packager", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        init = []
+        moof = None
+        try:
+            while True:
+                box = read_box(self.stream)
+                if box is None:
+                    break
+                box_type, data = box
+                if self.defaults is None:
+                    init.append(data)
+                    if box_type == "moov":
+                        init_data = b"".join(init)
+                        self.defaults = parse_init(init_data)
+                        self.playlist.set_init(init_data)
+                    continue
+                if box_type == "moof":
+                    moof = data
+                elif box_type == "mdat" and moof is not None:
+                    duration, independent = parse_fragment(moof, self.defaults)
+                    self.playlist.add_part(moof + data, duration, independent)
+                    moof = None
+        except Exception as e:
+            logger.error(f"[LL-HLS] {self.name} 解析分片MP4失败: {e}", exc_info=True)
+        finally:
+            self.playlist.close()
+            logger.info(f"[LL-HLS] {self.name} 输入结束: {self.playlist.stats()}")
+
+    def join(self, timeout=None):
+        if self.thread:
+            self.thread.join(timeout)
@@ -0,0 +1,363 @@
+"""
+多摄像头拼接画面（监控墙）
+每个摄像头进程把缩小后的画面写入各自的共享内存图块，拼接进程按固定帧率把所有图块
+复制到预分配的网格画布上，只用一个编码器输出一路HLS（hls_output/mosaic/），
+监控墙不再需要拉取N路HLS、主机也不必为此运行N个编码器。
+
+共享内存图块布局：
+    [0:8)   seq     uint64  写入序号，写入过程中为奇数（顺序锁）
+    [8:16)  ts      float64 画面采集时间
+    [16:20) width   uint32
+    [20:24) height  uint32
+    [24:32) generation uint64 创建图块时生成的随机数，摄像头进程重启重建图块后改变
+    [64:)   像素    BGR24
+"""
+
+import argparse
+import math
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+SHM_PREFIX = "beltmonitor_mosaic"
+HEADER_SIZE = 64
+MOSAIC_DIRNAME = "mosaic"
+
+
+def tile_name(camera_id, prefix=SHM_PREFIX):
+    return f"{prefix}_{camera_id}"
+
+
+def _generation(shm):
+    return int.from_bytes(bytes(shm.buf[24:32]), "little")
+
+
+def parse_size(spec):
+    """解析 "320x180" 形式的尺寸，宽高取偶数"""
+    width, height = (int(v) for v in spec.lower().split("x"))
+    if width <= 0 or height <= 0:
+        raise ValueError(f"无效的尺寸: {spec}")
+    return width - width % 2, height - height % 2
+
+
+def _attach(name):
+    """
+    挂接已有的共享内存，不让本进程的资源跟踪器在退出时删除它
+    （Python 3.13 之前挂接方也会被跟踪，退出时会误删摄像头进程创建的图块）
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class TileWriter:
+    """摄像头进程一侧：把画面缩放后写入共享内存图块"""
+
+    def __init__(self, camera_id, width, height, prefix=SHM_PREFIX):
+        self.camera_id = camera_id
+        self.width = width
+        self.height = height
+        self.name = tile_name(camera_id, prefix)
+        size = HEADER_SIZE + width * height * 3
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # 上次异常退出遗留的图块，删除后重新创建
+            stale = _attach(self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self._seq = np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf)
+        self._ts = np.ndarray((1,), dtype=np.float64, buffer=self.shm.buf, offset=8)
+        np.ndarray((2,), dtype=np.uint32, buffer=self.shm.buf, offset=16)[:] = (width, height)
+        self.generation = int.from_bytes(os.urandom(8), "little")
+        np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf, offset=24)[0] = self.generation
+        self.pixels = np.ndarray((height, width, 3), dtype=np.uint8, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.written = 0
+
+    def write(self, frame, ts=None):
+        """缩放并写入一帧，直接缩放到共享内存中，不产生中间数组"""
+        self._seq[0] += 1
+        cv2.resize(frame, (self.width, self.height), dst=self.pixels, interpolation=cv2.INTER_AREA)
+        self._ts[0] = time.time() if ts is None else ts
+        self._seq[0] += 1
+        self.written += 1
+
+    def close(self):
+        # 先释放指向共享内存的数组视图，否则 close() 会报 BufferError
+        self._seq = self._ts = self.pixels = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class TileReader:
+    """拼接进程一侧：从共享内存图块读取最新画面，摄像头进程未启动时返回None"""
+
+    def __init__(self, camera_id, width, height, prefix=SHM_PREFIX):
+        self.camera_id = camera_id
+        self.width = width
+        self.height = height
+        self.name = tile_name(camera_id, prefix)
+        self.shm = None
+        self.generation = None
+        self.torn_reads = 0
+        self.reopened = 0
+        self._checked_at = 0.0
+
+    def _open(self):
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return False
+        width, height = (int(v) for v in np.ndarray((2,), dtype=np.uint32, buffer=shm.buf, offset=16))
+        if (width, height) != (self.width, self.height):
+            shm.close()
+            raise ValueError(f"摄像头 {self.camera_id} 的图块尺寸为 {width}x{height}，"
+                             f"与拼接画面的 {self.width}x{self.height} 不一致")
+        self.shm = shm
+        self.generation = _generation(shm)
+        self._seq = np.ndarray((1,), dtype=np.uint64, buffer=shm.buf)
+        self._ts = np.ndarray((1,), dtype=np.float64, buffer=shm.buf, offset=8)
+        self._pixels = np.ndarray((self.height, self.width, 3), dtype=np.uint8, buffer=shm.buf,
+                                  offset=HEADER_SIZE)
+        return True
+
+    def read_into(self, out, retries=2):
+        """
+        把最新画面复制到 out
+
+        Returns:
+            float | None: 画面采集时间；图块不存在或尚未写入时返回None
+        """
+        if self.shm is None and not self._open():
+            return None
+        for _ in range(retries + 1):
+            before = int(self._seq[0])
+            if before == 0:
+                return None
+            if before % 2:
+                # 正在写入，稍后重试
+                self.torn_reads += 1
+                time.sleep(0.001)
+                continue
+            np.copyto(out, self._pixels)
+            ts = float(self._ts[0])
+            if int(self._seq[0]) == before:
+                return ts
+            self.torn_reads += 1
+        return None
+
+    def refresh(self, interval=1.0):
+        """
+        图块长时间没有更新时调用，检查摄像头进程是否已删除或重建了图块（最多每 interval 秒一次）
+
+        已挂接的旧图块被删除后仍可读，只是不再更新，因此按名称重新挂接比较代次：
+        图块已不存在或代次变化时断开旧映射，下次读取时重新挂接。
+        """
+        now = time.monotonic()
+        if self.shm is None or now - self._checked_at < interval:
+            return
+        self._checked_at = now
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            self.close()
+            return
+        generation = _generation(shm)
+        shm.close()
+        if generation != self.generation:
+            self.close()
+            self.reopened += 1
+
+    def close(self):
+        if self.shm is not None:
+            self._seq = self._ts = self._pixels = None
+            self.shm.close()
+            self.shm = None
+
+
+class MosaicCompositor:
+    """
+    把多个摄像头图块拼接到网格画布上
+
+    画布按环形缓冲预分配 ring 块，每块画布中各格子的视图也预先切好；
+    环的长度须大于编码输出端可能同时持有的帧数（队列容量 + 正在写入的帧 + 用于补帧的上一帧），
+    保证正在被写入FFmpeg的画布不会被覆盖。
+
+    某个图块一次读取失败（例如顺序锁读到写入中途）时沿用上一帧画布中的该格子，
+    超过 stale_after 秒没有读到新画面才显示离线占位图。
+    """
+
+    def __init__(self, camera_ids, tile_width, tile_height, cols=None, stale_after=3.0, ring=5,
+                 prefix=SHM_PREFIX):
+        self.camera_ids = list(camera_ids)
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.cols = cols or max(1, math.ceil(math.sqrt(len(self.camera_ids))))
+        self.rows = max(1, math.ceil(len(self.camera_ids) / self.cols))
+        self.width = self.cols * tile_width
+        self.height = self.rows * tile_height
+        self.stale_after = stale_after
+
+        self.readers = [TileReader(cid, tile_width, tile_height, prefix) for cid in self.camera_ids]
+        self.canvases = [np.zeros((self.height, self.width, 3), dtype=np.uint8) for _ in range(ring)]
+        self.tiles = [[canvas[y:y + tile_height, x:x + tile_width] for x, y in self.positions()]
+                      for canvas in self.canvases]
+        self.offline_tiles = [self._offline_tile(cid) for cid in self.camera_ids]
+        self.last_ts = [None] * len(self.camera_ids)
+        self._index = 0
+
+        # 统计信息
+        self.composed = 0
+        self.offline = 0
+        self.held = 0
+
+    def positions(self):
+        """各格子左上角坐标，按行优先排列"""
+        return [((i % self.cols) * self.tile_width, (i // self.cols) * self.tile_height)
+                for i in range(len(self.camera_ids))]
+
+    def _offline_tile(self, camera_id):
+        tile = np.full((self.tile_height, self.tile_width, 3), 32, dtype=np.uint8)
+        text = f"CAMERA {camera_id} OFFLINE"
+        font_scale = max(0.35, self.tile_width / 800)
+        (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        origin = ((self.tile_width - text_w) // 2, (self.tile_height + text_h) // 2)
+        cv2.putText(tile, text, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (200, 200, 200), 1, cv2.LINE_AA)
+        return tile
+
+    def compose(self, now=None):
+        """拼接一帧，返回环形缓冲中的下一块画布"""
+        now = time.time() if now is None else now
+        canvas = self.canvases[self._index]
+        tiles = self.tiles[self._index]
+        previous_tiles = self.tiles[self._index - 1]
+        self._index = (self._index + 1) % len(self.canvases)
+        for i, (reader, tile) in enumerate(zip(self.readers, tiles)):
+            ts = reader.read_into(tile)
+            if ts is not None:
+                self.last_ts[i] = ts
+            last_ts = self.last_ts[i]
+            if last_ts is None or now - last_ts > self.stale_after:
+                np.copyto(tile, self.offline_tiles[i])
+                self.offline += 1
+                # 摄像头进程退出或重启后重建了图块时断开旧映射
+                reader.refresh()
+            elif ts is None:
+                np.copyto(tile, previous_tiles[i])
+                self.held += 1
+        self.composed += 1
+        return canvas
+
+    def run(self, sink, fps, stop_event):
+        """按帧率拼接并送入编码输出端，直到 stop_event 被设置"""
+        interval = 1.0 / fps
+        next_time = time.monotonic()
+        while not stop_event.is_set():
+            now = time.time()
+            sink.submit(self.compose(now), ts=now)
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                stop_event.wait(delay)
+            else:
+                next_time = time.monotonic()
+
+    def stats(self):
+        return {
+            "composed": self.composed,
+            "offline_tiles": self.offline,
+            "held_tiles": self.held,
+            "reopened": sum(r.reopened for r in self.readers),
+            "torn_reads": sum(r.torn_reads for r in self.readers),
+            "canvas": f"{self.width}x{self.height}",
+        }
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+
+def mosaic_command(registry, width, height, fps, output_path, start_number=0):
+    """拼接画面的FFmpeg命令，编码参数和码率来自编码器注册表"""
+    return [
+        registry.ffmpeg_path, '-y',
+        '-f', 'rawvideo',
+        '-vcodec', 'rawvideo',
+        '-pix_fmt', 'bgr24',
+        '-s', f'{width}x{height}',
+        '-r', str(fps),
+        '-i', '-',
+    ] + registry.video_args(width, height, fps) + [
+        '-f', 'hls',
+        '-hls_time', '2',
+        '-hls_list_size', '5',
+        '-hls_flags', 'delete_segments+program_date_time',
+        '-start_number', str(start_number),
+        output_path
+    ]
+
+
+def main():
+    from encoder_registry import get_encoder_registry
+    from encoder_sink import EncoderSink
+    from hls_server import segment_start_number
+
+    parser = argparse.ArgumentParser(description="Composite camera tiles from shared memory into one HLS mosaic stream")
+    parser.add_argument('--cameras', type=str, required=True, help="Comma-separated camera IDs in grid order")
+    parser.add_argument('--tile', type=str, default="320x180", help="Tile size, must match --mosaic_tile of the camera processes")
+    parser.add_argument('--cols', type=int, default=None, help="Grid columns (default: ceil(sqrt(N)))")
+    parser.add_argument('--fps', type=float, default=15.0)
+    parser.add_argument('--hls_dir', type=str, default="hls_output")
+    parser.add_argument('--hls_filename', type=str, default="output.m3u8")
+    args = parser.parse_args()
+
+    tile_width, tile_height = parse_size(args.tile)
+    camera_ids = [cid.strip() for cid in args.cameras.split(',') if cid.strip()]
+    compositor = MosaicCompositor(camera_ids, tile_width, tile_height, cols=args.cols)
+    registry = get_encoder_registry()
+    if not registry.available:
+        raise SystemExit("FFmpeg is not installed or not found in PATH.")
+
+    output_dir = os.path.join(args.hls_dir, MOSAIC_DIRNAME)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, args.hls_filename)
+    command = mosaic_command(registry, compositor.width, compositor.height, args.fps, output_path,
+                             start_number=segment_start_number())
+    sink = EncoderSink(command, args.fps, name="encoder-mosaic").start()
+    print(f"[拼接画面] {len(camera_ids)} 路摄像头，{compositor.cols}x{compositor.rows} 网格，"
+          f"画布 {compositor.width}x{compositor.height} @ {args.fps} fps → {output_path}")
+    print(f"[拼接画面] 各摄像头的HLS服务器均可访问: /hls_output/{MOSAIC_DIRNAME}/{args.hls_filename}")
+
+    stop_event = threading.Event()
+    try:
+        compositor_thread = threading.Thread(target=compositor.run, args=(sink, args.fps, stop_event),
+                                             name="mosaic-compositor", daemon=True)
+        compositor_thread.start()
+        while compositor_thread.is_alive() and not sink.failed:
+            compositor_thread.join(30)
+            print(f"[拼接画面] {compositor.stats()} | [编码输出] {sink.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        sink.close()
+        compositor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+检测叠加层合成
+每次检测结果（或煤量标签、人员区域）变化时只渲染一次叠加层，存为稀疏的像素索引 + 颜色，
+之后每一帧只需一次向量化的混合即可把锚框和标签盖到画面上，而不是逐框重新绘制。
+"""
+
+import numpy as np
+
+
+class OverlayLayer:
+    """
+    稀疏叠加层
+
+    渲染时把同一组绘制操作分别画在全黑和全白的画布上，由两者之差得到每个像素的覆盖度
+    （差值抠像），因此任意顺序的矩形、抗锯齿文字叠加都能被正确还原：
+        out = B0 + frame * (255 - A) / 255，其中 B0 为黑底渲染结果，255 - A = 白底 - 黑底
+    完全不透明的像素直接赋值，半透明像素（文字边缘）做整数混合。
+    """
+
+    __slots__ = ("shape", "opaque_idx", "opaque_color", "blend_idx", "blend_color", "blend_inv_alpha")
+
+    def __init__(self, shape, opaque_idx, opaque_color, blend_idx, blend_color, blend_inv_alpha):
+        self.shape = shape
+        self.opaque_idx = opaque_idx
+        self.opaque_color = opaque_color
+        self.blend_idx = blend_idx
+        self.blend_color = blend_color
+        self.blend_inv_alpha = blend_inv_alpha
+
+    @classmethod
+    def empty(cls, shape):
+        """不包含任何像素的空叠加层"""
+        idx = np.empty(0, dtype=np.intp)
+        color = np.empty((0, 3), dtype=np.uint8)
+        return cls(tuple(shape), idx, color, idx, color.astype(np.uint16), color.astype(np.uint16))
+
+    @classmethod
+    def render(cls, shape, draw_func):
+        """
+        渲染叠加层
+
+        Args:
+            shape: 帧尺寸 (height, width, 3)
+            draw_func: 绘制函数 draw_func(canvas) -> canvas，在BGR画布上绘制叠加内容
+        """
+        shape = tuple(shape)
+        black = draw_func(np.zeros(shape, dtype=np.uint8))
+        white = draw_func(np.full(shape, 255, dtype=np.uint8))
+
+        flat_black = black.reshape(-1, 3)
+        # 255 - A：像素保留原画面的比例
+        inv_alpha = (white.astype(np.int16) - black.astype(np.int16)).clip(0, 255).reshape(-1, 3)
+
+        covered = (inv_alpha < 255).any(axis=1)
+        opaque = (inv_alpha == 0).all(axis=1)
+        opaque_idx = np.flatnonzero(opaque)
+        blend_idx = np.flatnonzero(covered & ~opaque)
+        return cls(
+            shape,
+            opaque_idx,
+            flat_black[opaque_idx].copy(),
+            blend_idx,
+            flat_black[blend_idx].astype(np.uint16),
+            inv_alpha[blend_idx].astype(np.uint16),
+        )
+
+    @property
+    def pixel_count(self):
+        return len(self.opaque_idx) + len(self.blend_idx)
+
+    def apply(self, frame):
+        """把叠加层原地合成到帧上（帧必须是C连续的BGR数组）"""
+        if frame.shape != self.shape:
+            raise ValueError(f"叠加层尺寸 {self.shape} 与帧尺寸 {frame.shape} 不一致")
+        if not frame.flags.c_contiguous:
+            raise ValueError("叠加层只能合成到C连续的帧上")
+        flat = frame.reshape(-1, 3)
+        if len(self.blend_idx):
+            tmp = flat[self.blend_idx].astype(np.uint16) * self.blend_inv_alpha + 128
+            blended = self.blend_color + ((tmp + (tmp >> 8)) >> 8)
+            flat[self.blend_idx] = np.minimum(blended, 255)
+        if len(self.opaque_idx):
+            flat[self.opaque_idx] = self.opaque_color
+        return frame
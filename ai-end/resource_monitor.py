@@ -0,0 +1,125 @@
+"""
+进程资源统计
+按进程（含FFmpeg等子进程）统计CPU占用和常驻内存，以及进程启动以来的耗时，
+用于比较不同运行模式（完整模式 / 直通 / 无画面）在边缘设备上的开销。
+Linux下读取 /proc，其他系统退化为只统计本进程。
+"""
+
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # 非POSIX系统
+    CLOCK_TICKS = 100
+    PAGE_SIZE = 4096
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _stat_fields(pid, proc_root):
+    """返回 /proc/<pid>/stat 中进程名之后的字段（第3个字段起）"""
+    stat = _read(os.path.join(proc_root, str(pid), "stat"))
+    if stat is None:
+        return None
+    return stat[stat.rindex(")") + 2:].split()
+
+
+def process_usage(pid, proc_root="/proc"):
+    """
+    Returns:
+        tuple | None: (CPU秒数, 常驻内存字节数)，进程不存在时返回None
+    """
+    fields = _stat_fields(pid, proc_root)
+    statm = _read(os.path.join(proc_root, str(pid), "statm"))
+    if fields is None or statm is None:
+        return None
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    rss = int(statm.split()[1]) * PAGE_SIZE
+    return cpu, rss
+
+
+def child_pids(pid, proc_root="/proc"):
+    """列出直接子进程（需要内核提供 /proc/<pid>/task/<tid>/children）"""
+    task_dir = os.path.join(proc_root, str(pid), "task")
+    try:
+        tids = os.listdir(task_dir)
+    except OSError:
+        return []
+    pids = []
+    for tid in tids:
+        children = _read(os.path.join(task_dir, tid, "children"))
+        if children:
+            pids.extend(int(p) for p in children.split())
+    return pids
+
+
+def process_uptime(pid=None, proc_root="/proc"):
+    """进程启动以来经过的秒数（包含解释器启动和模块导入），无法获取时返回None"""
+    fields = _stat_fields(pid or os.getpid(), proc_root)
+    uptime = _read(os.path.join(proc_root, "uptime"))
+    if fields is None or uptime is None:
+        return None
+    return float(uptime.split()[0]) - int(fields[19]) / CLOCK_TICKS
+
+
+class ResourceMeter:
+    """
+    统计进程及其子进程的CPU占用和常驻内存
+
+    sample() 返回距上次采样期间的平均CPU占用（单核百分比）和当前常驻内存。
+    子进程在两次采样之间退出时，其最后一段CPU时间不再计入。
+    """
+
+    def __init__(self, pid=None, include_children=True, proc_root="/proc", clock=time.monotonic):
+        self.pid = pid or os.getpid()
+        self.include_children = include_children
+        self.proc_root = proc_root
+        self.clock = clock
+        self.available = process_usage(self.pid, proc_root) is not None
+        self.max_rss_mb = 0.0
+        self._last_cpu = {}
+        self._last_time = self.clock()
+        self.sample()
+
+    def _usage(self):
+        if not self.available:
+            # 非Linux：只统计本进程，内存取峰值
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource else 0
+            return {self.pid: (time.process_time(), max_rss)}
+        pids = [self.pid] + (child_pids(self.pid, self.proc_root) if self.include_children else [])
+        usage = {}
+        for pid in pids:
+            result = process_usage(pid, self.proc_root)
+            if result is not None:
+                usage[pid] = result
+        return usage
+
+    def sample(self):
+        now = self.clock()
+        usage = self._usage()
+        elapsed = max(now - self._last_time, 1e-6)
+        # 两次采样之间新启动的子进程，其全部CPU时间都发生在本次采样区间内
+        cpu_delta = sum(max(0.0, cpu - self._last_cpu.get(pid, 0.0)) for pid, (cpu, _) in usage.items())
+        rss_mb = sum(rss for _, rss in usage.values()) / (1024 * 1024)
+        self.max_rss_mb = max(self.max_rss_mb, rss_mb)
+        self._last_cpu = {pid: cpu for pid, (cpu, _) in usage.items()}
+        self._last_time = now
+        return {
+            "cpu_percent": round(cpu_delta / elapsed * 100, 1),
+            "rss_mb": round(rss_mb, 1),
+            "max_rss_mb": round(self.max_rss_mb, 1),
+            "processes": len(usage),
+        }
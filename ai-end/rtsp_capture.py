@@ -0,0 +1,382 @@
+"""
+RTSP视频采集
+在独立线程上持续解码，只保留最新一帧（单槽缓冲），下游处理变慢时直接跳过旧帧，
+避免OpenCV内部缓冲区堆积导致输出延迟逐渐增大。
+
+只需要给推理供帧时（HLS直通等场景）可以按间隔抽帧：每一帧只grab()推进码流，
+到达间隔的帧才retrieve()转换为BGR图像，省去其余帧的色彩转换和内存拷贝。
+"""
+
+import logging
+import random
+import threading
+import time
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameReader:
+    """
+    最新帧读取器
+
+    解码线程把每一帧写入单槽缓冲并分配单调递增的序号；消费者调用read()时
+    总是拿到最新的一帧，中间被覆盖的帧计入跳帧数。
+
+    decode_interval > 0 时按该间隔（秒）抽帧，未到间隔的帧只grab()不retrieve()，
+    不分配序号也不进入缓冲，计入 grabbed 统计。
+    """
+
+    def __init__(self, source, buffer_size=1, capture_factory=cv2.VideoCapture, name=None, decode_interval=0.0):
+        self.source = source
+        self.buffer_size = buffer_size
+        self.decode_interval = decode_interval
+        self.capture_factory = capture_factory
+        self.name = name or str(source)
+        self.cap = None
+        self.thread = None
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_ts = 0.0
+        self._frame_monotonic = 0.0
+        self._last_retrieve = None
+        self._seq = 0
+        self._running = False
+        self.ended = False  # 解码线程因读取失败而退出
+
+        # 统计信息
+        self.decoded = 0
+        self.delivered = 0
+        self.skipped = 0
+        self.grabbed = 0  # 只grab()未retrieve()的帧数
+
+    def open(self):
+        """打开视频源，成功返回True"""
+        self.cap = self.capture_factory(self.source)
+        if not self.cap.isOpened():
+            return False
+        # 尽量缩小OpenCV内部缓冲（部分后端不支持，忽略返回值）
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        return True
+
+    def get(self, prop_id):
+        """读取视频源属性（宽、高、帧率等）"""
+        return self.cap.get(prop_id) if self.cap is not None else 0
+
+    def start(self):
+        """启动解码线程"""
+        if self._running:
+            return
+        if self.cap is None and not self.open():
+            raise IOError(f"Cannot open RTSP stream {self.source}")
+        self._running = True
+        self.ended = False
+        self._frame_monotonic = time.monotonic()
+        self.thread = threading.Thread(target=self._decode_loop, name=f"capture-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _next_frame(self):
+        """
+        读取下一帧
+
+        Returns:
+            tuple: (ok, frame)，抽帧模式下跳过的帧返回 (True, None)
+        """
+        if self.decode_interval <= 0:
+            return self.cap.read()
+        if not self.cap.grab():
+            return False, None
+        now = time.monotonic()
+        if self._last_retrieve is not None and now - self._last_retrieve < self.decode_interval:
+            with self._cond:
+                # 码流仍在推进，刷新存活时间，避免被判定为断流
+                self._frame_monotonic = now
+                self.grabbed += 1
+            return True, None
+        self._last_retrieve = now
+        return self.cap.retrieve()
+
+    def _decode_loop(self):
+        while self._running:
+            ret, frame = self._next_frame()
+            if ret and frame is None:
+                continue
+            if not ret:
+                logger.warning(f"[视频采集] {self.name} 读取帧失败，解码线程退出")
+                with self._cond:
+                    self.ended = True
+                    self._cond.notify_all()
+                break
+            with self._cond:
+                self._seq += 1
+                self._frame = frame
+                self._frame_ts = time.time()
+                self._frame_monotonic = time.monotonic()
+                self.decoded += 1
+                self._cond.notify_all()
+
+    def read(self, last_seq=0, timeout=1.0):
+        """
+        获取比last_seq更新的最新一帧
+
+        Args:
+            last_seq: 消费者上一次拿到的帧序号
+            timeout: 等待新帧的最长时间（秒）
+
+        Returns:
+            tuple: (seq, ts, frame)，超时或读取结束时返回None
+        """
+        with self._cond:
+            deadline = time.monotonic() + timeout
+            while self._seq <= last_seq:
+                if self.ended or not self._running:
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            seq = self._seq
+            if last_seq > 0 and seq > last_seq + 1:
+                self.skipped += seq - last_seq - 1
+            self.delivered += 1
+            return seq, self._frame_ts, self._frame
+
+    @property
+    def seq(self):
+        with self._cond:
+            return self._seq
+
+    def seconds_since_last_frame(self):
+        """距离最近一次成功解码的秒数（尚未解码任何帧时从启动开始计时）"""
+        with self._cond:
+            return time.monotonic() - self._frame_monotonic
+
+    def stop(self):
+        """停止解码线程"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    def release(self):
+        """停止解码并释放视频源"""
+        self.stop()
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "seq": self._seq,
+                "decoded": self.decoded,
+                "delivered": self.delivered,
+                "skipped": self.skipped,
+                "grabbed": self.grabbed,
+            }
+
+
+class ReconnectingFrameReader:
+    """
+    自动重连的视频源
+
+    包装LatestFrameReader：读取失败或长时间无新帧时，在后台线程中按指数退避加随机抖动
+    重新打开视频源，而不是让整个进程退出。帧序号在重连前后保持单调递增，
+    接口与LatestFrameReader一致，调用方无需感知重连。
+    """
+
+    def __init__(self, source, initial_delay=1.0, max_delay=30.0, jitter=0.3, stall_timeout=10.0,
+                 max_retries=None, reader_factory=LatestFrameReader, name=None, decode_interval=0.0):
+        self.source = source
+        self.decode_interval = decode_interval
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.stall_timeout = stall_timeout
+        self.max_retries = max_retries  # None表示无限重试
+        self.reader_factory = reader_factory
+        self.name = name or str(source)
+
+        self._lock = threading.Lock()
+        self._reader = None
+        self._seq_base = 0       # 当前读取器之前累计的帧序号
+        self._totals = {"decoded": 0, "delivered": 0, "skipped": 0, "grabbed": 0}
+        self._running = False
+        self._stop_event = threading.Event()
+        self.supervisor = None
+        self.ended = False
+
+        # 断流/重连统计
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.outage_count = 0
+        self.total_outage = 0.0
+        self.last_outage = 0.0
+        self._outage_start = None
+
+    def _new_reader(self):
+        reader = self.reader_factory(self.source, name=self.name, decode_interval=self.decode_interval)
+        try:
+            opened = reader.open()
+        except Exception as e:
+            logger.error(f"[视频采集] 打开视频源 {self.name} 时发生异常: {e}")
+            opened = False
+        if not opened:
+            reader.release()
+            return None
+        return reader
+
+    def open(self):
+        """首次打开视频源，成功返回True"""
+        reader = self._new_reader()
+        if reader is None:
+            return False
+        with self._lock:
+            self._reader = reader
+        return True
+
+    def get(self, prop_id):
+        with self._lock:
+            reader = self._reader
+        return reader.get(prop_id) if reader is not None else 0
+
+    def start(self):
+        if self._running:
+            return
+        if self._reader is None and not self.open():
+            raise IOError(f"Cannot open RTSP stream {self.source}")
+        self._running = True
+        self._reader.start()
+        self.supervisor = threading.Thread(target=self._supervise, name=f"reconnect-{self.name}", daemon=True)
+        self.supervisor.start()
+
+    @property
+    def in_outage(self):
+        return self._outage_start is not None
+
+    def outage_elapsed(self):
+        """当前断流已持续的秒数，未断流时为0"""
+        start = self._outage_start
+        return time.monotonic() - start if start is not None else 0.0
+
+    def _backoff_delay(self, attempt):
+        delay = min(self.max_delay, self.initial_delay * (2 ** attempt))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _is_healthy(self, reader):
+        if reader.ended:
+            return False
+        return reader.seconds_since_last_frame() < self.stall_timeout
+
+    def _retire_reader(self, background=True):
+        """释放失效的读取器，并把其统计和帧序号累加到总量中"""
+        with self._lock:
+            reader = self._reader
+            self._reader = None
+            if reader is None:
+                return
+            stats = reader.stats()
+            self._seq_base += stats["seq"]
+            for key in self._totals:
+                self._totals[key] += stats[key]
+        if background:
+            # 卡死的RTSP读取可能阻塞数十秒，放到后台释放，不耽误重连
+            threading.Thread(target=reader.release, name=f"release-{self.name}", daemon=True).start()
+        else:
+            reader.release()
+
+    def _supervise(self):
+        while self._running:
+            with self._lock:
+                reader = self._reader
+            if reader is not None and self._is_healthy(reader):
+                self._stop_event.wait(0.5)
+                continue
+
+            reason = "读取结束" if reader is None or reader.ended else f"超过 {self.stall_timeout} 秒无新帧"
+            logger.warning(f"[视频采集] {self.name} 断流（{reason}），开始重连")
+            self._outage_start = time.monotonic()
+            self.outage_count += 1
+            self._retire_reader()
+
+            attempt = 0
+            while self._running:
+                if self.max_retries is not None and attempt >= self.max_retries:
+                    logger.error(f"[视频采集] {self.name} 重连 {attempt} 次均失败，放弃重连")
+                    self.ended = True
+                    self._running = False
+                    break
+                delay = self._backoff_delay(attempt)
+                logger.info(f"[视频采集] {self.name} 将在 {delay:.1f} 秒后进行第 {attempt + 1} 次重连")
+                if self._stop_event.wait(delay):
+                    break
+                new_reader = self._new_reader()
+                if new_reader is not None:
+                    new_reader.start()
+                    with self._lock:
+                        self._reader = new_reader
+                    self.reconnects += 1
+                    self.last_outage = self.outage_elapsed()
+                    self.total_outage += self.last_outage
+                    self._outage_start = None
+                    logger.info(f"[视频采集] {self.name} 重连成功，断流持续 {self.last_outage:.1f} 秒，累计重连 {self.reconnects} 次")
+                    break
+                attempt += 1
+                self.failed_attempts += 1
+
+    def read(self, last_seq=0, timeout=1.0):
+        """与LatestFrameReader.read相同，返回的帧序号在重连前后连续递增"""
+        with self._lock:
+            reader = self._reader
+            base = self._seq_base
+        if reader is None:
+            # 断流中：等待重连，不占用CPU
+            self._stop_event.wait(timeout)
+            return None
+        latest = reader.read(max(0, last_seq - base), timeout)
+        if latest is None:
+            if reader.ended:
+                # 读取器已失效但监控线程尚未替换，避免调用方空转
+                self._stop_event.wait(timeout)
+            return None
+        seq, ts, frame = latest
+        return base + seq, ts, frame
+
+    @property
+    def skipped(self):
+        return self.stats()["skipped"]
+
+    def stop(self):
+        self._running = False
+        self._stop_event.set()
+        if self.supervisor and self.supervisor is not threading.current_thread():
+            self.supervisor.join(timeout=2.0)
+
+    def release(self):
+        self.stop()
+        self._retire_reader(background=False)
+
+    def stats(self):
+        with self._lock:
+            reader = self._reader
+            stats = dict(self._totals)
+            base = self._seq_base
+        if reader is not None:
+            current = reader.stats()
+            for key in stats:
+                stats[key] += current[key]
+            stats["seq"] = base + current["seq"]
+        else:
+            stats["seq"] = base
+        stats.update({
+            "reconnects": self.reconnects,
+            "failed_attempts": self.failed_attempts,
+            "outages": self.outage_count,
+            "total_outage_s": round(self.total_outage + self.outage_elapsed(), 1),
+            "last_outage_s": round(self.last_outage, 1),
+            "current_outage_s": round(self.outage_elapsed(), 1),
+        })
+        return stats
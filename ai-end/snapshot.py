@@ -0,0 +1,137 @@
+"""
+最新画面快照
+流水线只保存最新一帧的引用（不拷贝、不编码），有请求时才编码为JPEG，
+每个节拍（1/max_fps 秒）每种画面（原始/带锚框）最多编码一次，所有请求者共享同一份结果：
+50个轮询 /api/snapshot.jpg 的客户端和若干MJPEG观看者只产生一次编码。
+快照带ETag，画面未更新时客户端可以用 If-None-Match 得到304。
+"""
+
+import collections
+import os
+import threading
+import time
+
+import cv2
+
+RAW = "raw"
+OVERLAY = "overlay"
+VARIANTS = (RAW, OVERLAY)
+MJPEG_BOUNDARY = "frame"
+MJPEG_CONTENT_TYPE = f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+
+Snapshot = collections.namedtuple("Snapshot", ["seq", "ts", "body", "etag", "encoded_at"])
+
+
+def mjpeg_part(snapshot):
+    """MJPEG（multipart/x-mixed-replace）流中的一帧"""
+    head = (f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+            f"Content-Length: {len(snapshot.body)}\r\nX-Timestamp: {snapshot.ts:.3f}\r\n\r\n")
+    return head.encode("latin-1") + snapshot.body + b"\r\n"
+
+
+def parse_variant(value):
+    """查询参数 overlay=1/true 选择带锚框的画面"""
+    return OVERLAY if str(value).lower() in ("1", "true", "yes", "on") else RAW
+
+
+class SnapshotCache:
+    """
+    按需编码的最新画面JPEG缓存
+
+    publish() 在流水线中每帧调用，只替换帧引用；画面不能在发布后被原地修改
+    （预处理阶段 cv2.resize 的结果每帧都是新数组）。
+    overlay 为回调 (画面副本, 时间戳) -> 画面，在副本上叠加当前的检测锚框。
+    """
+
+    def __init__(self, quality=80, max_fps=5.0, clock=time.monotonic):
+        self.quality = quality
+        self.max_fps = max_fps
+        self.clock = clock
+        self.overlay = None
+        # ETag带上进程标识，进程重启后序号从头开始也不会与旧快照混淆
+        self._epoch = f"{os.getpid():x}{int(time.time()) & 0xffff:04x}"
+        self._frame = None
+        self._ts = 0.0
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._cache = {}
+        self._encode_locks = {variant: threading.Lock() for variant in VARIANTS}
+
+        # 统计信息
+        self.requests = 0
+        self.encodes = 0
+        self.encode_seconds = 0.0
+        self.streams = 0
+
+    def publish(self, frame, ts):
+        with self._cond:
+            self._frame = frame
+            self._ts = ts
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait(self, after_seq, timeout=None):
+        """等待序号大于 after_seq 的新画面，返回最新序号"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq, timeout)
+            return self._seq
+
+    def get(self, variant=RAW):
+        """
+        Returns:
+            Snapshot | None: 最新画面的JPEG，尚无画面时返回None
+        """
+        self.requests += 1
+        with self._encode_locks[variant]:
+            with self._cond:
+                frame, ts, seq = self._frame, self._ts, self._seq
+            if frame is None:
+                return None
+            cached = self._cache.get(variant)
+            now = self.clock()
+            if cached is not None and (cached.seq == seq or now - cached.encoded_at < 1.0 / self.max_fps):
+                return cached
+            started = time.perf_counter()
+            canvas = frame
+            if variant == OVERLAY and self.overlay is not None:
+                canvas = self.overlay(frame.copy(), ts)
+            ok, buffer = cv2.imencode(".jpg", canvas, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                return cached
+            self.encodes += 1
+            self.encode_seconds += time.perf_counter() - started
+            snapshot = Snapshot(seq, ts, buffer.tobytes(), f'"{self._epoch}-{seq:x}-{variant}"', now)
+            self._cache[variant] = snapshot
+            return snapshot
+
+    def mjpeg(self, variant=RAW, fps=None, stop_event=None, idle_timeout=5.0):
+        """
+        MJPEG流生成器：有新画面时立即发送（低延迟），但不超过 fps 帧/秒。
+        画面长时间不更新（断流且没有占位画面）时每 idle_timeout 秒重发一次最新帧，及时发现已断开的客户端。
+        """
+        interval = 1.0 / min(fps or self.max_fps, self.max_fps)
+        self.streams += 1
+        try:
+            seq = 0
+            next_frame = 0.0
+            while stop_event is None or not stop_event.is_set():
+                delay = next_frame - self.clock()
+                if delay > 0:
+                    time.sleep(delay)
+                self.wait(seq, idle_timeout)
+                snapshot = self.get(variant)
+                if snapshot is None:
+                    continue
+                seq = snapshot.seq
+                next_frame = self.clock() + interval
+                yield mjpeg_part(snapshot)
+        finally:
+            self.streams -= 1
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "encodes": self.encodes,
+            "avg_encode_ms": round(self.encode_seconds / self.encodes * 1000, 2) if self.encodes else 0.0,
+            "mjpeg_streams": self.streams,
+        }
@@ -0,0 +1,91 @@
+"""
+Unit tests for the multi-rendition HLS ladder
+"""
+
+import pytest
+
+import abr_ladder
+from abr_ladder import (
+    Rendition, RenditionCpuMeter, abr_output_args, filter_graph, parse_ladder, stream_args, thread_cpu_times
+)
+
+
+class FakeRegistry:
+    def video_args(self, width, height, fps):
+        return ['-c:v', 'libx264', '-preset', 'veryfast', '-maxrate', f'{height}k', '-pix_fmt', 'yuv420p']
+
+
+def write_thread(proc_root, pid, tid, comm, utime, stime):
+    task = proc_root / str(pid) / "task" / str(tid)
+    task.mkdir(parents=True, exist_ok=True)
+    fields = ["S"] + ["0"] * 10 + [str(utime), str(stime)] + ["0"] * 10
+    (task / "stat").write_text(f"{tid} ({comm}) {' '.join(fields)}\n")
+
+
+def test_parse_ladder_keeps_aspect_and_skips_upscales():
+    """Test that heights are sorted, deduplicated and capped at the source"""
+    renditions = parse_ladder("240, 450,360,720,360", 800, 450)
+    assert renditions == [Rendition(800, 450), Rendition(640, 360), Rendition(426, 240)]
+    assert [r.name for r in renditions] == ["450p", "360p", "240p"]
+    assert parse_ladder("", 800, 450) == []
+    with pytest.raises(ValueError):
+        parse_ladder("0", 800, 450)
+
+
+def test_stream_args_scope_options_to_output_stream():
+    """Test that codec options get a per-stream specifier"""
+    assert stream_args(['-c:v', 'libx264', '-b:v', '800k', '-preset', 'fast'], 2) == [
+        '-c:v:2', 'libx264', '-b:v:2', '800k', '-preset:v:2', 'fast'
+    ]
+
+
+def test_filter_graph_splits_once_and_scales_smaller_rungs():
+    """Test the shared split/scale graph"""
+    graph = filter_graph(parse_ladder("450,240", 800, 450), 800, 450)
+    assert graph == "[0:v]split=2[s0][s1];[s0]null[r0];[s1]scale=426:240[r1]"
+
+
+def test_abr_output_args_write_master_and_variant_playlists():
+    """Test var_stream_map, aligned GOPs and playlist naming"""
+    renditions = parse_ladder("450,360", 800, 450)
+    args = abr_output_args(renditions, FakeRegistry(), 800, 450, 25, "hls/camera_1/output.m3u8",
+                           start_number=1700000000000)
+    assert args[args.index('-master_pl_name') + 1] == "output.m3u8"
+    assert args[args.index('-start_number') + 1] == "1700000000000"
+    assert args[args.index('-var_stream_map') + 1] == "v:0,name:450p v:1,name:360p"
+    assert args[args.index('-hls_segment_filename') + 1] == "hls/camera_1/output_%v_%d.ts"
+    assert args[-1] == "hls/camera_1/output_%v.m3u8"
+    assert args[args.index('-g') + 1] == args[args.index('-keyint_min') + 1] == "50"
+    assert args.count('-map') == 2
+    assert args[args.index('-maxrate:v:1') + 1] == "360k"
+
+
+def test_cpu_meter_attributes_encoder_threads_to_renditions(tmp_path, monkeypatch):
+    """Test per-rendition CPU from thread names, with the rest counted as shared"""
+    monkeypatch.setattr(abr_ladder, "CLOCK_TICKS", 100)
+    renditions = parse_ladder("450,240", 800, 450)
+    now = [0.0]
+    write_thread(tmp_path, 42, 1, "ffmpeg", 0, 0)
+    write_thread(tmp_path, 42, 2, "enc0:0:libx264", 0, 0)
+    write_thread(tmp_path, 42, 3, "enc0:1:libx264", 0, 0)
+    write_thread(tmp_path, 42, 4, "fc0", 0, 0)
+    meter = RenditionCpuMeter(42, renditions, proc_root=str(tmp_path), clock=lambda: now[0])
+
+    now[0] = 2.0
+    write_thread(tmp_path, 42, 2, "enc0:0:libx264", 60, 20)
+    write_thread(tmp_path, 42, 5, "enc0:0:libx264", 40, 0)  # encoder worker thread
+    write_thread(tmp_path, 42, 3, "enc0:1:libx264", 30, 10)
+    write_thread(tmp_path, 42, 4, "fc0", 20, 0)
+    assert meter.sample() == {"450p": 60.0, "240p": 20.0, "shared": 10.0}
+    assert thread_cpu_times(7, proc_root=str(tmp_path)) == {}
+
+
+def test_cpu_meter_without_named_encoder_threads(tmp_path, monkeypatch):
+    """Test that builds before FFmpeg 7.0 report shared CPU only"""
+    monkeypatch.setattr(abr_ladder, "CLOCK_TICKS", 100)
+    now = [0.0]
+    write_thread(tmp_path, 42, 1, "ffmpeg", 0, 0)
+    meter = RenditionCpuMeter(42, parse_ladder("450,240", 800, 450), proc_root=str(tmp_path), clock=lambda: now[0])
+    now[0] = 2.0
+    write_thread(tmp_path, 42, 1, "ffmpeg", 150, 50)
+    assert meter.sample() == {"shared": 100.0}
@@ -0,0 +1,176 @@
+"""
+Unit tests for the detection hub (camera processes → one WebSocket port)
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import urllib.request
+
+import pytest
+from websockets.asyncio.client import connect
+
+import ws_server
+from detection_hub import DetectionHub, HubPublisher, pack_detections, unpack_detections
+from ws_codec import BoxDecoder, BoxFrame, boxes_from_results, encode_class_table
+from ws_models import DetectionPayload
+from ws_producer import DetectionProducer
+from ws_server import FanoutHub
+
+CLASS_NAMES = {2: "大块", 6: "人员"}
+
+
+class MockBox:
+    def __init__(self, cls_id, confidence, x1, y1, x2, y2):
+        self.cls = [cls_id]
+        self.conf = [confidence]
+        self.xyxy = [[x1, y1, x2, y2]]
+
+
+class MockResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message, text=None):
+        self.sent.append(message)
+
+
+def make_frame(camera_id, seq, results):
+    return BoxFrame(camera_id, seq, 1700000000.0 + seq, boxes_from_results(results),
+                    encode_class_table(camera_id, CLASS_NAMES),
+                    to_json=lambda: DetectionPayload.json_from_detections(camera_id, results, CLASS_NAMES, 1.0))
+
+
+def test_datagram_round_trip_and_bad_datagrams():
+    """Test the datagram layout and that malformed datagrams are counted, not raised"""
+    frame = make_frame(3, 1, [MockResult([MockBox(2, 0.9, 1, 2, 30, 40)])])
+    data = pack_detections(3, frame.class_table, frame.encoded("json"), frame.encoded("binary"))
+    assert unpack_detections(data) == (3, frame.class_table, frame.encoded("json"), frame.encoded("binary"))
+
+    hub = DetectionHub("/nonexistent.sock", fanout=FanoutHub())
+    for bad in (b"", b"XX" + data[2:], data[:-20]):
+        hub.handle_datagram(bad)
+    assert hub.bad_datagrams == 3 and hub.feeds == {}
+
+
+@pytest.mark.asyncio
+async def test_hub_republishes_in_every_format():
+    """Test JSON pass-through, hub-side deltas and a stable class table object"""
+    fanout = FanoutHub()
+    hub = DetectionHub("/nonexistent.sock", fanout=fanout)
+    json_client, delta_client = RecordingWebSocket(), RecordingWebSocket()
+    slots = [fanout.subscribe(json_client, 5), fanout.subscribe(delta_client, 5, "delta")]
+    pumps = [asyncio.ensure_future(fanout.pump(slot)) for slot in slots]
+
+    results = [MockResult([MockBox(2, 0.9, 1, 2, 30, 40), MockBox(6, 0.7, 100, 100, 150, 190)])]
+    # a restarted camera process starts its own sequence again; the hub numbers frames itself
+    for seq in (1, 1):
+        frame = make_frame(5, seq, results)
+        hub.handle_datagram(pack_detections(5, frame.class_table, frame.encoded("json"), frame.encoded("binary")))
+        await asyncio.sleep(0.01)
+
+    assert json_client.sent == [frame.encoded("json")] * 2
+    decoder = BoxDecoder()
+    decoded = [decoder.decode(message) for message in delta_client.sent]
+    # class table once, a full frame, then a delta that keeps both boxes
+    assert decoded[0] is None and len(delta_client.sent) == 3
+    assert len(delta_client.sent[2]) < len(delta_client.sent[1])
+    assert [box["cls"] for box in decoded[2]["boxes"]] == ["大块", "人员"]
+    assert hub.stats()["cameras"][5]["received"] == 2
+    assert hub.health()["active_cameras"] == [5]
+
+    for pump in pumps:
+        pump.cancel()
+
+
+def test_hub_matches_boxes_only_for_delta_subscribers():
+    """Test that frames carry a delta base only while a delta client is subscribed"""
+    fanout = FanoutHub()
+    hub = DetectionHub("/nonexistent.sock", fanout=fanout)
+    frame = make_frame(4, 1, [MockResult([MockBox(2, 0.9, 1, 2, 30, 40)])])
+    datagram = pack_detections(4, frame.class_table, frame.encoded("json"), frame.encoded("binary"))
+
+    fanout.subscribe(RecordingWebSocket(), 4, "binary")
+    for _ in range(2):
+        hub.handle_datagram(datagram)
+    assert hub.feeds[4].last_frame.base_seq is None
+
+    fanout.subscribe(RecordingWebSocket(), 4, "delta")
+    hub.handle_datagram(datagram)
+    assert hub.feeds[4].last_frame.base_seq == 2
+
+
+@pytest.mark.asyncio
+async def test_start_refuses_a_live_socket_and_replaces_a_stale_one(tmp_path):
+    """Test that a second hub does not steal the socket of a running one"""
+    socket_path = str(tmp_path / "hub.sock")
+    running = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    running.bind(socket_path)
+    try:
+        with pytest.raises(RuntimeError):
+            await DetectionHub(socket_path, fanout=FanoutHub()).start()
+        assert os.path.exists(socket_path)
+    finally:
+        running.close()
+
+    # the process that bound it is gone, only the file is left
+    hub = DetectionHub(socket_path, fanout=FanoutHub())
+    await hub.start()
+    try:
+        assert hub.health()["status"] == "healthy"
+    finally:
+        hub.close()
+
+
+def test_publisher_drops_when_hub_is_down(tmp_path):
+    """Test that publishing without a running hub neither blocks nor raises"""
+    publisher = HubPublisher(str(tmp_path / "missing.sock"))
+    frame = make_frame(1, 1, [])
+    assert publisher.publish(frame) is False
+    assert publisher.dropped == 1
+    publisher.close()
+
+
+@pytest.mark.asyncio
+async def test_camera_processes_share_one_port(tmp_path):
+    """Test producers of two cameras publishing through a real hub to real clients"""
+    socket_path = str(tmp_path / "hub.sock")
+    hub = DetectionHub(socket_path)
+    ready = threading.Event()
+    thread = threading.Thread(target=lambda: asyncio.run(hub.serve_forever("127.0.0.1", 0, ready)), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    port = ws_server.manager.port
+
+    producers = [DetectionProducer(), DetectionProducer()]
+    for producer in producers:
+        producer.start(hub_socket=socket_path)
+    results = [MockResult([MockBox(2, 0.9, 1, 2, 30, 40)])]
+    try:
+        async with connect(f"ws://127.0.0.1:{port}/ws/boxes/1") as first, \
+                connect(f"ws://127.0.0.1:{port}/ws/boxes/2?format=binary") as second:
+            await asyncio.sleep(0.1)
+            producers[0].send_detections(1, results, CLASS_NAMES)
+            producers[1].send_detections(2, results, CLASS_NAMES)
+            payload = json.loads(await asyncio.wait_for(first.recv(), 2))
+            assert payload["camera_id"] == 1 and payload["boxes"][0]["cls"] == "大块"
+            decoder = BoxDecoder()
+            decoder.decode(await asyncio.wait_for(second.recv(), 2))
+            assert decoder.decode(await asyncio.wait_for(second.recv(), 2))["boxes"][0]["cls"] == "大块"
+
+        loop = asyncio.get_running_loop()
+        health = await loop.run_in_executor(
+            None, lambda: json.loads(urllib.request.urlopen(f"http://127.0.0.1:{port}/health").read()))
+        assert health["status"] == "healthy" and health["active_cameras"] == [1, 2]
+    finally:
+        for producer in producers:
+            producer.stop()
+        ws_server.stop_websocket_server()
+        thread.join(5)
@@ -0,0 +1,121 @@
+"""
+Unit tests for the encoder capability registry
+"""
+
+import os
+import subprocess
+
+from encoder_registry import EncoderRegistry, bitrate_for, parse_encoders
+
+ENCODERS_OUTPUT = """Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ V....D h264_nvenc           NVIDIA NVENC H.264 encoder (codec h264)
+ V....D h264_qsv             H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (Intel Quick Sync Video acceleration) (codec h264)
+ A....D aac                  AAC (Advanced Audio Coding)
+"""
+
+
+class FakeRunner:
+    """Records FFmpeg invocations; test encodes succeed only for `working` encoders"""
+    def __init__(self, working=("h264_qsv",)):
+        self.working = working
+        self.calls = []
+
+    def __call__(self, command, **kwargs):
+        self.calls.append(command)
+        if '-encoders' in command:
+            return subprocess.CompletedProcess(command, 0, stdout=ENCODERS_OUTPUT, stderr="")
+        encoder = command[command.index('-c:v') + 1]
+        return subprocess.CompletedProcess(command, 0 if encoder in self.working else 1, stdout="", stderr="")
+
+
+def make_registry(tmp_path, runner):
+    ffmpeg = tmp_path / "ffmpeg"
+    if not ffmpeg.exists():
+        ffmpeg.write_text("")
+    return EncoderRegistry(cache_path=str(tmp_path / "cache" / "encoders.json"), runner=runner,
+                           which=lambda name: str(ffmpeg)), ffmpeg
+
+
+def test_parse_encoders_lists_video_encoders_only():
+    """Test that the legend and audio encoders are skipped"""
+    assert parse_encoders(ENCODERS_OUTPUT) == ["libx264", "h264_nvenc", "h264_qsv"]
+
+
+def test_probe_keeps_only_hardware_encoders_that_work(tmp_path):
+    """Test that listed hardware encoders must pass a test encode"""
+    runner = FakeRunner()
+    registry = make_registry(tmp_path, runner)[0].load()
+    assert registry.hardware == ["h264_qsv"]
+    assert registry.h264_encoder() == "h264_qsv"
+    assert registry.h264_encoder(prefer_hardware=False) == "libx264"
+    assert registry.probes == 1
+    assert len(runner.calls) == 3
+
+
+def test_cache_is_reused_until_ffmpeg_changes(tmp_path):
+    """Test that a second load costs no probes and a new mtime re-probes"""
+    runner = FakeRunner()
+    registry, ffmpeg = make_registry(tmp_path, runner)
+    registry.load()
+    calls = len(runner.calls)
+
+    cached = make_registry(tmp_path, runner)[0].load()
+    assert cached.from_cache
+    assert cached.probes == 0
+    assert len(runner.calls) == calls
+    assert cached.hardware == ["h264_qsv"]
+
+    stat = os.stat(ffmpeg)
+    os.utime(ffmpeg, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reprobed = make_registry(tmp_path, runner)[0].load()
+    assert not reprobed.from_cache
+    assert reprobed.probes == 1
+    assert len(runner.calls) > calls
+
+
+def test_missing_ffmpeg_is_reported(tmp_path):
+    """Test that an unresolved binary leaves the registry unavailable"""
+    registry = EncoderRegistry(cache_path=str(tmp_path / "encoders.json"), runner=FakeRunner(),
+                               which=lambda name: None).load()
+    assert not registry.available
+    assert not os.path.exists(tmp_path / "encoders.json")
+
+
+def test_video_args_follow_bitrate_ladder(tmp_path):
+    """Test encoder-specific presets, rate control and output pixel format"""
+    registry = make_registry(tmp_path, FakeRunner())[0].load()
+    x264 = registry.video_args(800, 450, 25, low_latency=True, prefer_hardware=False)
+    assert x264[:6] == ['-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'zerolatency']
+    assert x264[x264.index('-maxrate') + 1] == '900k'
+    qsv = registry.video_args(1920, 1080, 25)
+    assert qsv[:2] == ['-c:v', 'h264_qsv']
+    assert qsv[qsv.index('-b:v') + 1] == '3500k'
+    assert qsv[-2:] == ['-pix_fmt', 'nv12']
+    assert bitrate_for(640, 352, 15) == 360
+    assert bitrate_for(3840, 2160, 25) == 12000
+
+
+def test_unrunnable_ffmpeg_falls_back_to_libx264(tmp_path):
+    """Test that a failing `ffmpeg -encoders` neither raises nor gets cached"""
+    def broken(command, **kwargs):
+        raise PermissionError(13, "Permission denied")
+
+    registry = make_registry(tmp_path, broken)[0].load()
+    assert registry.encoders == [] and registry.hardware == []
+    assert registry.video_args(800, 450, 25)[:2] == ['-c:v', 'libx264']
+    assert registry.stats()["h264_encoder"] == "libx264"
+    assert not os.path.exists(tmp_path / "cache" / "encoders.json")
+
+
+def test_stats_without_h264_encoder(tmp_path):
+    """Test that stats() reports a build without H.264 encoders instead of raising"""
+    def no_h264(command, **kwargs):
+        return subprocess.CompletedProcess(command, 0, stdout=" ------\n V....D mpeg4  MPEG-4 part 2\n", stderr="")
+
+    registry = make_registry(tmp_path, no_h264)[0].load()
+    assert registry.encoders == ["mpeg4"]
+    assert registry.stats()["h264_encoder"] == "unavailable"
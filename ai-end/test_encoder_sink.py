@@ -0,0 +1,265 @@
+"""
+Unit tests for the FFmpeg encoder sink
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from encoder_sink import EncoderSink, RateCounter, PIX_FMT_I420, frame_nbytes
+
+
+class MockStdin:
+    """Mock unbuffered pipe that accepts at most `chunk` bytes per write"""
+    def __init__(self, chunk=None, fail_after=None, stall=None):
+        self.chunk = chunk
+        self.fail_after = fail_after
+        self.stall = stall or {}  # write index -> seconds to block
+        self.data = bytearray()
+        self.writes = 0
+        self.closed = False
+
+    def write(self, view):
+        if self.fail_after is not None and self.writes >= self.fail_after:
+            raise BrokenPipeError("ffmpeg exited")
+        time.sleep(self.stall.get(self.writes, 0))
+        self.writes += 1
+        n = len(view) if self.chunk is None else min(self.chunk, len(view))
+        self.data += view[:n]
+        return n
+
+    def close(self):
+        self.closed = True
+
+
+class MockProcess:
+    def __init__(self, command, stdin=None, bufsize=-1, **kwargs):
+        self.command = command
+        self.bufsize = bufsize
+        self.stdin = None
+        self.returncode = None
+
+    def wait(self, timeout=None):
+        self.returncode = 0
+        return 0
+
+    def kill(self):
+        self.returncode = -9
+
+
+def make_sink(fps=100, chunk=None, fail_after=None, stall=None, **kwargs):
+    processes = []
+
+    def popen(command, **popen_kwargs):
+        process = MockProcess(command, **popen_kwargs)
+        process.stdin = MockStdin(chunk, fail_after, stall)
+        processes.append(process)
+        return process
+
+    sink = EncoderSink(["ffmpeg", "-i", "-"], fps, popen=popen, pipe_size=None, **kwargs)
+    return sink, processes
+
+
+def make_frame(value, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_partial_writes_deliver_whole_frame():
+    """Test that short pipe writes are retried until the frame is complete"""
+    sink, processes = make_sink(chunk=10, duplicate_last=False)
+    frame = np.arange(72, dtype=np.uint8).reshape(4, 6, 3)
+    sink.submit(frame)
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.written == 1)
+    finally:
+        sink.close()
+    stdin = processes[0].stdin
+    assert bytes(stdin.data) == frame.tobytes()
+    assert stdin.writes == 8
+    assert stdin.closed
+    assert processes[0].bufsize == 0
+
+
+def test_non_contiguous_frame_is_written_in_order():
+    """Test that a sliced view is made contiguous before writing"""
+    sink, processes = make_sink(duplicate_last=False)
+    frame = np.arange(144, dtype=np.uint8).reshape(4, 12, 3)[:, ::2]
+    sink.submit(frame)
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.written == 1)
+    finally:
+        sink.close()
+    assert bytes(processes[0].stdin.data) == np.ascontiguousarray(frame).tobytes()
+
+
+def test_duplicates_last_frame_to_hold_rate():
+    """Test that the writer repeats the last frame when no new frame arrives"""
+    sink, processes = make_sink(fps=200)
+    sink.submit(make_frame(7))
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.written >= 10)
+    finally:
+        sink.close()
+    stats = sink.stats()
+    assert stats["duplicated"] >= 9
+    assert stats["written"] == stats["duplicated"] + 1
+    assert set(processes[0].stdin.data) == {7}
+
+
+def test_stream_time_maps_capture_timestamps_to_video_time():
+    """Test the timeline of new frames, including duplicated and unseen timestamps"""
+    sink, _ = make_sink(fps=100)
+    assert sink.stream_time() is None
+    sink.submit(make_frame(1), ts=50.0)
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.written >= 5)
+        sink.submit(make_frame(2), ts=50.5)
+        assert wait_for(lambda: len(sink.timeline) == 2)
+    finally:
+        sink.close()
+    position = sink.timeline[1][1]
+    assert sink.stream_time(50.0) == 0.0
+    assert sink.stream_time(50.5) == position
+    assert position >= 0.05
+    # a frame that never reached the encoder is placed relative to its predecessor
+    assert abs(sink.stream_time(50.52) - (position + 0.02)) < 1e-9
+    assert sink.stream_time(49.0) == 0.0
+
+
+def test_drops_oldest_when_encoder_falls_behind():
+    """Test that queued frames are dropped and only the newest is written"""
+    sink, processes = make_sink(queue_size=2)
+    for value in range(5):
+        sink.submit(make_frame(value))
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.written >= 1)
+    finally:
+        sink.close()
+    assert sink.stats()["dropped"] == 4
+    assert processes[0].stdin.data[0] == 4
+
+
+def test_broken_pipe_calls_error_handler():
+    """Test that a dead encoder stops the writer and reports the error"""
+    errors = []
+    sink, _ = make_sink(fail_after=1, on_error=errors.append)
+    sink.submit(make_frame(1))
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.failed)
+        assert wait_for(lambda: not sink.is_alive())
+    finally:
+        sink.close()
+    assert isinstance(errors[0], BrokenPipeError)
+    assert sink.written == 1
+    assert not sink.submit(make_frame(2))
+
+
+def test_pacing_follows_the_clock():
+    """Test that the frame count tracks elapsed time at the declared rate"""
+    sink, _ = make_sink(fps=100)
+    sink.submit(make_frame(1), ts=time.time() - 0.5)
+    sink.start()
+    try:
+        time.sleep(0.5)
+        stats = sink.stats()
+    finally:
+        sink.close()
+    assert 40 <= stats["written"] <= 55
+    assert -30 < stats["drift_ms"] <= 0
+    assert stats["resyncs"] == 0
+    assert stats["avg_frame_age_ms"] >= 500
+
+
+def test_slow_write_is_caught_up():
+    """Test that frames missed during a short encoder stall are written afterwards"""
+    sink, _ = make_sink(fps=100, stall={1: 0.15})
+    sink.submit(make_frame(1))
+    sink.start()
+    try:
+        time.sleep(0.4)
+        stats = sink.stats()
+    finally:
+        sink.close()
+    assert stats["written"] >= 34
+    assert stats["max_drift_ms"] >= 100
+    assert stats["drift_ms"] > -30
+    assert stats["resyncs"] == 0
+
+
+def test_long_stall_resyncs_instead_of_bursting():
+    """Test that falling further behind than max_catchup re-anchors the clock"""
+    sink, _ = make_sink(fps=100, stall={1: 0.2}, max_catchup=0.05)
+    sink.submit(make_frame(1))
+    sink.start()
+    try:
+        time.sleep(0.4)
+        stats = sink.stats()
+    finally:
+        sink.close()
+    assert stats["resyncs"] == 1
+    assert stats["written"] < 34
+    assert stats["drift_ms"] > -30
+
+
+def test_i420_frames_use_preallocated_buffer():
+    """Test that BGR frames are converted to I420 into a reused buffer"""
+    sink, processes = make_sink(duplicate_last=False, pix_fmt=PIX_FMT_I420)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (6, 8, 3), dtype=np.uint8) for _ in range(2)]
+    sink.submit(frames[0])
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.written == 1)
+        buffer = sink._i420_buffer
+        sink.submit(frames[1])
+        assert wait_for(lambda: sink.written == 2)
+        assert sink._i420_buffer is buffer
+    finally:
+        sink.close()
+    expected = b"".join(cv2.cvtColor(f, cv2.COLOR_BGR2YUV_I420).tobytes() for f in frames)
+    assert bytes(processes[0].stdin.data) == expected
+    assert len(expected) == 2 * frame_nbytes(8, 6, PIX_FMT_I420)
+    assert sink.stats()["pix_fmt"] == PIX_FMT_I420
+
+
+def test_i420_rejects_odd_frame_size():
+    """Test that odd dimensions fail the sink instead of writing garbage"""
+    errors = []
+    sink, processes = make_sink(duplicate_last=False, pix_fmt=PIX_FMT_I420, on_error=errors.append)
+    sink.submit(make_frame(1, shape=(5, 8, 3)))
+    sink.start()
+    try:
+        assert wait_for(lambda: sink.failed)
+    finally:
+        sink.close()
+    assert isinstance(errors[0], ValueError)
+    assert not processes[0].stdin.data
+
+
+def test_rate_counter_reports_last_full_second(monkeypatch):
+    """Test that per-second counters roll over on second boundaries"""
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    counter = RateCounter(("written", "dropped"))
+    counter.add("written", 3)
+    counter.add("dropped")
+    assert counter.last_second() == {"written": 0, "dropped": 0}
+    now[0] = 101.2
+    assert counter.last_second() == {"written": 3, "dropped": 1}
+    counter.add("written")
+    now[0] = 104.0
+    assert counter.last_second() == {"written": 0, "dropped": 0}
@@ -0,0 +1,46 @@
+"""
+Unit tests for alarm event reporting
+"""
+
+import numpy as np
+
+import event_reporter
+from event_reporter import EventReporter
+
+
+class FakeResponse:
+    status_code = 200
+    text = ""
+
+    def json(self):
+        return {"success": True, "data": {"data": {"eventID": 7}}}
+
+
+class SnapshotRenderer:
+    """Stands in for the lazy snapshot callback passed by the detection loop"""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return np.zeros((36, 64, 3), dtype=np.uint8)
+
+
+def test_lazy_frame_is_rendered_only_when_the_alarm_fires(tmp_path, monkeypatch):
+    """Test that the snapshot callable runs once per report and never during cooldown"""
+    work_dir = tmp_path / "ai-end"
+    work_dir.mkdir()
+    monkeypatch.chdir(work_dir)
+    posts = []
+    monkeypatch.setattr(event_reporter.requests, "post", lambda url, **kwargs: posts.append(kwargs) or FakeResponse())
+    reporter = EventReporter()
+
+    render = SnapshotRenderer()
+    assert reporter.report_alarm_event(1, "大块报警", 0.9, render, 3) == 7
+    assert render.calls == 1 and len(posts) == 1
+    assert (tmp_path / "frontend-new" / "assets" / "images" / "alarm" / "alarm7.jpg").exists()
+
+    suppressed = SnapshotRenderer()
+    for _ in range(5):
+        assert reporter.report_alarm_event(1, "大块报警", 0.9, suppressed, 3) is None
+    assert suppressed.calls == 0 and len(posts) == 1
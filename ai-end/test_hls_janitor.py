@@ -0,0 +1,148 @@
+"""
+Unit tests for the HLS segment janitor
+"""
+
+import os
+
+import pytest
+
+from hls_janitor import HlsJanitor, playlist_references, ram_backed_dir
+
+NOW = 1_000_000.0
+
+
+def write_segment(directory, name, size, age):
+    path = directory / name
+    path.write_bytes(b"\0" * size)
+    os.utime(path, (NOW - age, NOW - age))
+    return path
+
+
+def write_playlist(directory, names, name="output.m3u8"):
+    body = "#EXTM3U\n" + "".join(f"#EXTINF:2.0,\n{n}\n" for n in names)
+    (directory / name).write_text(body)
+
+
+def camera_dir(root, camera_id, count, size=1000):
+    """Create a camera directory whose playlist references the newest `count` segments"""
+    directory = root / f"camera_{camera_id}"
+    directory.mkdir()
+    for i in range(count):
+        write_segment(directory, f"output{i}.ts", size, age=2 * (count - i))
+    write_playlist(directory, [f"output{i}.ts" for i in range(count)])
+    return directory
+
+
+def test_orphans_are_deleted_after_grace_period(tmp_path):
+    """Test that leftovers go, while referenced and still-being-written segments stay"""
+    directory = camera_dir(tmp_path, 1, 3)
+    write_segment(directory, "output54.ts", 5000, age=3600)
+    write_segment(directory, "output3.ts", 700, age=1)
+    janitor = HlsJanitor(str(tmp_path), grace=10, clock=lambda: NOW)
+    janitor.sweep()
+    assert sorted(os.listdir(directory)) == ["output.m3u8", "output0.ts", "output1.ts", "output2.ts", "output3.ts"]
+    stats = janitor.stats()
+    assert stats["deleted"]["orphan"] == 1
+    assert stats["segments"] == 4
+
+
+def test_startup_clean_only_touches_own_directory(tmp_path):
+    """Test that startup removes fresh orphans in this camera's directory only"""
+    own = camera_dir(tmp_path, 1, 2)
+    other = camera_dir(tmp_path, 2, 2)
+    write_segment(own, "output9.ts", 100, age=1)
+    write_segment(other, "output9.ts", 100, age=1)
+    janitor = HlsJanitor(str(tmp_path), clock=lambda: NOW)
+    assert janitor.startup_clean(str(own)) == 1
+    assert not (own / "output9.ts").exists()
+    assert (other / "output9.ts").exists()
+
+
+def test_directory_scopes_sweeps_and_stats_to_own_camera(tmp_path):
+    """Test that a per-process janitor never sweeps or counts other cameras' directories"""
+    own = camera_dir(tmp_path, 1, 3)
+    other = camera_dir(tmp_path, 2, 3)
+    write_segment(own, "output54.ts", 100, age=3600)
+    write_segment(other, "output54.ts", 100, age=3600)
+    janitor = HlsJanitor(str(tmp_path), camera_max_bytes=1000, keep_latest=1, directory=str(own), clock=lambda: NOW)
+    janitor.sweep()
+    assert sorted(os.listdir(own)) == ["output.m3u8", "output2.ts"]
+    assert len(os.listdir(other)) == 5
+    stats = janitor.stats()
+    assert stats["segments"] == 1
+    assert stats["deleted"] == {"orphan": 1, "age": 0, "camera_budget": 2, "total_budget": 0}
+
+    with pytest.raises(ValueError):
+        HlsJanitor(str(tmp_path), total_max_bytes=1000, directory=str(own))
+
+
+def test_camera_budget_deletes_oldest_but_keeps_latest(tmp_path):
+    """Test the per-camera byte budget and the keep_latest floor"""
+    directory = camera_dir(tmp_path, 1, 6)
+    janitor = HlsJanitor(str(tmp_path), camera_max_bytes=2500, keep_latest=3, clock=lambda: NOW)
+    janitor.sweep()
+    assert sorted(n for n in os.listdir(directory) if n.endswith(".ts")) == ["output3.ts", "output4.ts", "output5.ts"]
+    assert janitor.deleted["camera_budget"] == 3
+
+    # the floor wins over the budget
+    janitor = HlsJanitor(str(tmp_path), camera_max_bytes=100, keep_latest=3, clock=lambda: NOW)
+    janitor.sweep()
+    assert len([n for n in os.listdir(directory) if n.endswith(".ts")]) == 3
+
+
+def test_total_budget_and_max_age_across_cameras(tmp_path):
+    """Test the global budget removes the globally oldest segments, and the age limit"""
+    first = camera_dir(tmp_path, 1, 4)
+    second = camera_dir(tmp_path, 2, 4)
+    for i in range(4):
+        os.utime(second / f"output{i}.ts", (NOW - 100 - i, NOW - 100 - i))
+    janitor = HlsJanitor(str(tmp_path), total_max_bytes=6000, keep_latest=1, clock=lambda: NOW)
+    janitor.sweep()
+    assert janitor.deleted["total_budget"] == 2
+    assert len(os.listdir(first)) == 5
+    assert len(os.listdir(second)) == 3
+
+    janitor = HlsJanitor(str(tmp_path), max_age=5, keep_latest=1, clock=lambda: NOW)
+    janitor.sweep()
+    assert sorted(os.listdir(first)) == ["output.m3u8", "output2.ts", "output3.ts"]
+
+
+def test_write_metrics_and_fmp4_references(tmp_path):
+    """Test write accounting between sweeps and URI attributes in fMP4 playlists"""
+    directory = tmp_path / "camera_1"
+    directory.mkdir()
+    (directory / "output.m3u8").write_text(
+        '#EXTM3U\n#EXT-X-MAP:URI="init.mp4"\n#EXT-X-PART:DURATION=0.2,URI="part1.0.m4s"\n'
+        '#EXTINF:1.0,\nseg0.m4s?x=1\n#EXT-X-PRELOAD-HINT:TYPE=PART,URI="part1.1.m4s"\n')
+    assert playlist_references(str(directory / "output.m3u8")) == {"init.mp4", "part1.0.m4s", "seg0.m4s", "part1.1.m4s"}
+
+    now = [NOW]
+    write_segment(directory, "init.mp4", 800, age=30)
+    janitor = HlsJanitor(str(tmp_path), clock=lambda: now[0])
+    janitor.sweep()
+    write_segment(directory, "seg0.m4s", 4096, age=0)
+    write_segment(directory, "part1.0.m4s", 1024, age=0)
+    now[0] += 2
+    janitor.sweep()
+    stats = janitor.stats()
+    assert stats["written_segments"] == 2
+    assert janitor.written_bytes == 5120
+    assert stats["write_kb_s"] > 0
+    assert stats["deleted"]["orphan"] == 0
+
+
+def test_ram_backed_dir_symlinks_missing_directory(tmp_path):
+    """Test that a missing hls_dir becomes a symlink into the RAM root"""
+    mounts = tmp_path / "mounts"
+    mounts.write_text(f"/dev/root / ext4 rw 0 0\ntmpfs {tmp_path}/ram tmpfs rw 0 0\n")
+    hls_dir = str(tmp_path / "hls_output")
+    assert ram_backed_dir(hls_dir, ram_root=str(tmp_path / "ram"), mounts_path=str(mounts)) == hls_dir
+    assert os.path.realpath(hls_dir) == str(tmp_path / "ram" / "hls_output")
+    # calling again is a no-op now that the directory is on tmpfs
+    assert ram_backed_dir(hls_dir, ram_root=str(tmp_path / "ram"), mounts_path=str(mounts)) == hls_dir
+
+    existing = tmp_path / "existing"
+    existing.mkdir()
+    result = ram_backed_dir(str(existing), ram_root=str(tmp_path / "ram"), mounts_path=str(mounts))
+    assert result == str(tmp_path / "ram" / "existing")
+    assert not os.path.islink(existing)
@@ -0,0 +1,99 @@
+"""
+Unit tests for the WebVTT detection metadata track
+"""
+
+import os
+
+from hls_metadata import (DEFAULT_MPEGTS, WebVttMetadataTrack, first_video_pts, master_playlist,
+                          vtt_timestamp)
+
+
+def pes_packet(pts, stream_id=0xE0):
+    """One MPEG-TS packet starting a PES with the given PTS"""
+    pts_bytes = bytes([
+        0x21 | ((pts >> 29) & 0x0E),
+        (pts >> 22) & 0xFF,
+        0x01 | ((pts >> 14) & 0xFE),
+        (pts >> 7) & 0xFF,
+        0x01 | ((pts << 1) & 0xFE),
+    ])
+    pes = b"\0\0\1" + bytes([stream_id, 0, 0, 0x80, 0x80, 5]) + pts_bytes
+    return bytes([0x47, 0x41, 0x00, 0x10]) + pes + b"\xff" * (184 - len(pes))
+
+
+def read_segment(directory, index):
+    return (directory / f"metadata{index}.vtt").read_text()
+
+
+def test_first_video_pts_skips_non_video_packets(tmp_path):
+    """Test PTS parsing from the first video PES of a segment"""
+    path = tmp_path / "output0.ts"
+    path.write_bytes(b"\x47\x40\x00\x10" + b"\xff" * 184 + pes_packet(90000, 0xC0) + pes_packet(133200))
+    assert first_video_pts(str(path)) == 133200
+    assert first_video_pts(str(tmp_path / "missing.ts")) is None
+
+
+def test_segments_are_written_after_the_inference_delay(tmp_path):
+    """Test cue placement, the delay window and empty gap segments"""
+    track = WebVttMetadataTrack(str(tmp_path), segment_duration=2.0, delay=1.0, mpegts=133200)
+    track.add_cue(0.5, '{"boxes":[1]}')
+    track.add_cue(1.2, '{"boxes":[2]}')
+    track.advance(2.9)
+    assert not (tmp_path / "metadata0.vtt").exists()
+    track.advance(3.0)
+    segment = read_segment(tmp_path, 0)
+    assert segment.startswith("WEBVTT\nX-TIMESTAMP-MAP=MPEGTS:133200,LOCAL:00:00:00.000\n")
+    # the first cue ends where the next detection starts
+    assert "00:00:00.500 --> 00:00:01.200\n{\"boxes\":[1]}" in segment
+    assert "00:00:01.200 --> 00:00:02.200\n{\"boxes\":[2]}" in segment
+
+    track.advance(7.0)
+    # a cue spanning a boundary is repeated, a segment without detections is empty
+    assert "00:00:01.200 --> 00:00:02.200" in read_segment(tmp_path, 1)
+    assert "-->" not in read_segment(tmp_path, 2)
+    track.add_cue(3.0, "late")
+    assert track.stats() == {"cues": 3, "late_cues": 1, "segments": 3}
+
+
+def test_playlist_slides_and_removes_old_segments(tmp_path):
+    """Test the media sequence and deletion outside the window"""
+    track = WebVttMetadataTrack(str(tmp_path), segment_duration=2.0, list_size=3, delay=0, mpegts=0)
+    track.advance(10.0)
+    playlist = (tmp_path / "metadata.m3u8").read_text().splitlines()
+    assert "#EXT-X-MEDIA-SEQUENCE:2" in playlist
+    assert [line for line in playlist if line.endswith(".vtt")] == ["metadata2.vtt", "metadata3.vtt", "metadata4.vtt"]
+    assert not (tmp_path / "metadata1.vtt").exists()
+
+
+def test_timestamp_map_waits_for_the_first_video_segment(tmp_path):
+    """Test that the MPEG-TS offset comes from the video's first segment"""
+    playlist = tmp_path / "output.m3u8"
+    track = WebVttMetadataTrack(str(tmp_path), video_playlist=str(playlist), delay=0)
+    track.advance(4.0)
+    assert not (tmp_path / "metadata.m3u8").exists()
+
+    (tmp_path / "output0.ts").write_bytes(pes_packet(129600))
+    playlist.write_text("#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:0\n#EXTINF:2.0,\noutput0.ts\n")
+    track.advance(4.0)
+    assert "MPEGTS:129600," in read_segment(tmp_path, 0)
+
+    late = WebVttMetadataTrack(str(tmp_path / "late"), video_playlist=str(playlist))
+    playlist.write_text("#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:7\n#EXTINF:2.0,\noutput7.ts\n")
+    os.makedirs(tmp_path / "late")
+    late.advance(0)
+    assert late.mpegts == DEFAULT_MPEGTS
+
+    # the video numbers its segments from a per-run start number
+    (tmp_path / "output7.ts").write_bytes(pes_packet(90000))
+    numbered = WebVttMetadataTrack(str(tmp_path / "late"), video_playlist=str(playlist), video_start_number=7)
+    numbered.advance(0)
+    assert numbered.mpegts == 90000
+
+
+def test_master_playlist_and_timestamps():
+    """Test the master playlist subtitle group and WebVTT time formatting"""
+    master = master_playlist("output.m3u8", "metadata.m3u8", 1200000, 800, 450)
+    assert 'TYPE=SUBTITLES,GROUP-ID="detections"' in master
+    assert 'URI="metadata.m3u8"' in master
+    assert master.endswith('RESOLUTION=800x450,SUBTITLES="detections"\noutput.m3u8\n')
+    assert vtt_timestamp(3723.5) == "01:02:03.500"
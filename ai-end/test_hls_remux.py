@@ -0,0 +1,123 @@
+"""
+Unit tests for the pass-through HLS remuxer
+"""
+
+import subprocess
+import time
+
+from hls_remux import HlsRemuxer
+
+
+class MockProcess:
+    """Mock subprocess.Popen that runs until told to exit"""
+    def __init__(self, command, **kwargs):
+        self.command = command
+        self.returncode = None
+        self.terminated = False
+
+    def poll(self):
+        return self.returncode
+
+    def exit(self, code):
+        self.returncode = code
+
+    def terminate(self):
+        self.terminated = True
+        self.returncode = -15
+
+    def kill(self):
+        self.returncode = -9
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+
+def make_remuxer(source="rtsp://camera/stream", **kwargs):
+    processes = []
+
+    def popen(command, **popen_kwargs):
+        process = MockProcess(command, **popen_kwargs)
+        processes.append(process)
+        return process
+
+    remuxer = HlsRemuxer(source, "/tmp/out/output.m3u8", initial_delay=0.01, max_delay=0.02,
+                         popen=popen, **kwargs)
+    return remuxer, processes
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_command_copies_video_without_reencoding():
+    """Test that the RTSP input is stream-copied into HLS"""
+    remuxer, _ = make_remuxer()
+    command = remuxer.build_command()
+    assert command[command.index('-c:v') + 1] == 'copy'
+    assert command[command.index('-rtsp_transport') + 1] == 'tcp'
+    assert command[command.index('-f') + 1] == 'hls'
+    assert 'append_list' in command[command.index('-hls_flags') + 1]
+    assert command[command.index('-start_number') + 1] == '0'
+    assert 'libx264' not in command
+    assert command[-1] == "/tmp/out/output.m3u8"
+
+
+def test_local_file_is_read_in_real_time():
+    """Test that non-network sources are paced with -re"""
+    remuxer, _ = make_remuxer(source="test.mp4")
+    command = remuxer.build_command()
+    assert '-re' in command
+    assert '-rtsp_transport' not in command
+
+
+def test_restarts_after_ffmpeg_exits():
+    """Test that a crashed FFmpeg is restarted"""
+    remuxer, processes = make_remuxer()
+    remuxer.start()
+    try:
+        processes[0].exit(1)
+        assert wait_for(lambda: remuxer.restarts >= 1)
+        assert remuxer.stats()["last_exit_code"] == 1
+        assert remuxer.stats()["running"]
+        assert len(processes) == 2
+        assert 'discont_start' not in processes[0].command[processes[0].command.index('-hls_flags') + 1]
+        assert 'discont_start' in processes[1].command[processes[1].command.index('-hls_flags') + 1]
+    finally:
+        remuxer.stop()
+    assert processes[-1].terminated
+
+
+def test_gives_up_after_max_retries():
+    """Test that a non-live source is not restarted"""
+    remuxer, processes = make_remuxer(max_retries=0)
+    remuxer.start()
+    try:
+        processes[0].exit(0)
+        assert wait_for(lambda: remuxer.ended)
+        assert not remuxer.is_running()
+        assert len(processes) == 1
+    finally:
+        remuxer.stop()
+
+
+def test_stop_kills_unresponsive_process():
+    """Test that stop falls back to kill when terminate times out"""
+    remuxer, processes = make_remuxer()
+    remuxer.start()
+    process = processes[0]
+    process.terminate = lambda: None
+    calls = []
+
+    def wait(timeout=None):
+        calls.append(timeout)
+        if timeout is not None:
+            raise subprocess.TimeoutExpired("ffmpeg", timeout)
+        return process.returncode
+
+    process.wait = wait
+    remuxer.stop(timeout=0.01)
+    assert process.returncode == -9
+    assert calls == [0.01, None]
@@ -0,0 +1,180 @@
+"""
+Unit tests for the asyncio HLS/static server
+"""
+
+import http.client
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from hls_server import HlsHttpServer, publish_coal_quantity
+from snapshot import MJPEG_CONTENT_TYPE, SnapshotCache
+
+
+class FakeLowLatencyPlaylist:
+    def __init__(self):
+        self.calls = []
+
+    def serve(self, name, msn=None, part=None):
+        self.calls.append((name, msn, part))
+        if name == "output.m3u8":
+            return 200, "application/vnd.apple.mpegurl", b"#EXTM3U\n"
+        return 404, "text/plain", b"not found"
+
+
+@pytest.fixture
+def hls_dir(tmp_path):
+    camera = tmp_path / "camera_1"
+    camera.mkdir()
+    (camera / "output.m3u8").write_text("#EXTM3U\n#EXTINF:2.0,\noutput0.ts\n")
+    (camera / "output0.ts").write_bytes(os.urandom(300_000))
+    return tmp_path
+
+
+@pytest.fixture
+def server(hls_dir):
+    ll_playlists = {"camera_2": FakeLowLatencyPlaylist()}
+    server = HlsHttpServer(str(hls_dir), "127.0.0.1", 0, ll_playlists=ll_playlists, poll_interval=0.02,
+                           coal_quantity=lambda camera_id: {1: 42.26}.get(camera_id),
+                           default_camera_id=1).start_in_thread()
+    yield server
+    server.stop()
+
+
+def get(conn, path, headers=None, method="GET"):
+    conn.request(method, path, headers=headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def test_playlist_and_segment_share_one_keep_alive_connection(server, hls_dir):
+    """Test cache headers, sendfile body and connection reuse"""
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    response, body = get(conn, "/hls_output/camera_1/output.m3u8")
+    assert response.status == 200
+    assert response.getheader("Cache-Control") == "no-cache"
+    assert response.getheader("Content-Type") == "application/vnd.apple.mpegurl"
+    assert response.getheader("Access-Control-Allow-Origin") == "*"
+    assert body.startswith(b"#EXTM3U")
+
+    response, body = get(conn, "/hls_output/camera_1/output0.ts")
+    assert response.status == 200
+    assert "immutable" in response.getheader("Cache-Control")
+    assert body == (hls_dir / "camera_1" / "output0.ts").read_bytes()
+    assert server.stats()["connections"] == 1
+    assert server.stats()["sendfile_mb"] > 0
+    conn.close()
+
+
+def test_playlist_is_served_from_memory_and_revalidated(server, hls_dir):
+    """Test ETag revalidation and pickup of a rewritten playlist"""
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    response, _ = get(conn, "/hls_output/camera_1/output.m3u8")
+    etag = response.getheader("ETag")
+    response, body = get(conn, "/hls_output/camera_1/output.m3u8", {"If-None-Match": etag})
+    assert response.status == 304
+    assert body == b""
+
+    reloads = server.playlists.reloads
+    path = hls_dir / "camera_1" / "output.m3u8"
+    path.write_text("#EXTM3U\n#EXTINF:2.0,\noutput1.ts\n")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+    deadline = time.time() + 2
+    while server.playlists.reloads == reloads and time.time() < deadline:
+        time.sleep(0.01)
+    response, body = get(conn, "/hls_output/camera_1/output.m3u8", {"If-None-Match": etag})
+    assert response.status == 200
+    assert b"output1.ts" in body
+    conn.close()
+
+
+def test_missing_files_and_path_traversal_return_404(server):
+    """Test that requests cannot escape the HLS directory"""
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    assert get(conn, "/hls_output/camera_1/missing.ts")[0].status == 404
+    assert get(conn, "/hls_output/../test_hls_server.py")[0].status == 404
+    assert get(conn, "/other")[0].status == 404
+    response, body = get(conn, "/hls_output/camera_1/output0.ts", method="HEAD")
+    assert response.status == 200
+    assert int(response.getheader("Content-Length")) == 300_000
+    conn.close()
+
+
+def test_low_latency_playlists_are_served_from_memory(server):
+    """Test that blocking-reload query parameters reach the in-memory playlist"""
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    response, body = get(conn, "/hls_output/camera_2/output.m3u8?_HLS_msn=3&_HLS_part=1")
+    assert response.status == 200
+    assert body == b"#EXTM3U\n"
+    assert server.ll_playlists["camera_2"].calls == [("output.m3u8", 3, 1)]
+    conn.close()
+
+
+def test_coal_quantity_for_default_and_named_camera(server):
+    """Test the coal quantity API in per-camera and shared forms"""
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    assert json.loads(get(conn, "/api/coal_quantity")[1]) == {"coal_quantity": "42.3"}
+    assert json.loads(get(conn, "/api/coal_quantity/1")[1]) == {"coal_quantity": "42.3"}
+    assert json.loads(get(conn, "/api/coal_quantity?camera_id=7")[1]) == {"coal_quantity": "0.0"}
+    conn.close()
+
+
+def test_shared_server_reads_published_coal_quantity(tmp_path):
+    """Test that the standalone server picks up quantities written by camera processes"""
+    publish_coal_quantity(str(tmp_path), 3, 17.04)
+    server = HlsHttpServer(str(tmp_path), "127.0.0.1", 0).start_in_thread()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.port)
+        assert json.loads(get(conn, "/api/coal_quantity/3")[1]) == {"coal_quantity": "17.0"}
+        response, _ = get(conn, "/api/coal_quantity")
+        assert response.status == 400
+        conn.close()
+    finally:
+        server.stop()
+
+
+def test_snapshot_and_mjpeg_from_shared_cache(hls_dir):
+    """Test snapshot revalidation and the first MJPEG part"""
+    snapshots = SnapshotCache()
+    server = HlsHttpServer(str(hls_dir), "127.0.0.1", 0, snapshots=snapshots).start_in_thread()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.port)
+        assert get(conn, "/api/snapshot.jpg")[0].status == 503
+        snapshots.publish(np.zeros((36, 64, 3), dtype=np.uint8), ts=5.0)
+        response, body = get(conn, "/api/snapshot.jpg?overlay=1")
+        assert response.status == 200
+        assert response.getheader("Content-Type") == "image/jpeg"
+        assert body[:2] == b"\xff\xd8"
+        response, body = get(conn, "/api/snapshot.jpg?overlay=1", {"If-None-Match": response.getheader("ETag")})
+        assert response.status == 304
+        conn.close()
+
+        conn = http.client.HTTPConnection("127.0.0.1", server.port)
+        conn.request("GET", "/api/mjpeg?fps=10")
+        response = conn.getresponse()
+        assert response.getheader("Content-Type") == MJPEG_CONTENT_TYPE
+        assert response.read(len(b"--frame\r\n")) == b"--frame\r\n"
+        conn.close()
+        assert snapshots.encodes == 2
+    finally:
+        server.stop()
+
+
+def test_coal_quantity_only_when_not_serving_hls(hls_dir):
+    """Test that a headless server answers the coal quantity API and nothing else"""
+    snapshots = SnapshotCache()
+    snapshots.publish(np.zeros((36, 64, 3), dtype=np.uint8), ts=5.0)
+    server = HlsHttpServer(str(hls_dir), "127.0.0.1", 0, coal_quantity=lambda camera_id: 3.0,
+                           snapshots=snapshots, serve_hls=False).start_in_thread()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.port)
+        assert json.loads(get(conn, "/api/coal_quantity/1")[1]) == {"coal_quantity": "3.0"}
+        for path in ("/hls_output/camera_1/output.m3u8", "/api/snapshot.jpg", "/api/mjpeg"):
+            assert get(conn, path)[0].status == 404
+        conn.close()
+        assert server.playlists.entries == {} and snapshots.encodes == 0
+    finally:
+        server.stop()
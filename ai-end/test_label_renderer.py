@@ -0,0 +1,81 @@
+"""
+Unit tests for the glyph-cached label renderer
+"""
+
+import glob
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from label_renderer import LabelRenderer, get_font
+
+
+def pil_draw(frame, text, origin, font, color):
+    """Reference implementation: the original PIL round-trip from Drawer.draw"""
+    pil_img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(pil_img)
+    draw.text(origin, text, font=font, fill=(color[2], color[1], color[0]))
+    return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+
+
+def truetype_loader():
+    """Use a real TrueType font when one is installed, else PIL's default"""
+    fonts = sorted(glob.glob("/usr/share/fonts/**/*.ttf", recursive=True))
+    if not fonts:
+        return get_font
+    return lambda size: ImageFont.truetype(fonts[0], size)
+
+
+@pytest.mark.parametrize("origin", [(100, 80), (-15, -20), (780, 440), (0, 0)])
+@pytest.mark.parametrize("color", [(255, 0, 0), (0, 255, 255), (12, 200, 99)])
+def test_matches_pil_output(origin, color):
+    """Test that cached glyph blending is pixel-identical to PIL drawing"""
+    loader = truetype_loader()
+    renderer = LabelRenderer(font_loader=loader)
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (450, 800, 3), dtype=np.uint8)
+    text = "Coal: 45.2%"
+
+    expected = pil_draw(frame, text, origin, loader(37), color)
+    actual = renderer.draw(frame.copy(), text, origin, 37, color)
+
+    assert np.array_equal(actual, expected)
+
+
+def test_draw_modifies_only_label_region():
+    """Test that drawing only touches pixels inside the glyph bounding box"""
+    renderer = LabelRenderer(font_loader=truetype_loader())
+    frame = np.zeros((200, 300, 3), dtype=np.uint8)
+    renderer.draw(frame, "abc", (50, 60), 30, (255, 255, 255))
+    ys, xs = np.nonzero(frame.any(axis=2))
+    assert len(ys) > 0
+    glyph = renderer.get_glyph("abc", 30, (255, 255, 255))
+    assert xs.min() >= 50 + glyph.offset[0]
+    assert ys.min() >= 60 + glyph.offset[1]
+    assert xs.max() < 50 + glyph.offset[0] + glyph.alpha.shape[1]
+
+
+def test_glyph_cache_hits_and_eviction():
+    """Test LRU behaviour of the glyph cache"""
+    renderer = LabelRenderer(max_entries=2, font_loader=truetype_loader())
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    renderer.draw(frame, "a", (0, 0), 20, (255, 0, 0))
+    renderer.draw(frame, "a", (10, 10), 20, (255, 0, 0))
+    assert renderer.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+    renderer.draw(frame, "b", (0, 0), 20, (255, 0, 0))
+    renderer.draw(frame, "c", (0, 0), 20, (255, 0, 0))
+    stats = renderer.stats()
+    assert stats["entries"] == 2
+    assert stats["misses"] == 3
+
+
+def test_offscreen_label_is_ignored():
+    """Test that a label entirely outside the frame leaves it untouched"""
+    renderer = LabelRenderer(font_loader=truetype_loader())
+    frame = np.zeros((50, 50, 3), dtype=np.uint8)
+    renderer.draw(frame, "abc", (500, 500), 20, (255, 255, 255))
+    renderer.draw(frame, "", (10, 10), 20, (255, 255, 255))
+    assert not frame.any()
@@ -0,0 +1,156 @@
+"""
+Unit tests for the low-latency HLS packager
+"""
+
+import io
+import struct
+import threading
+import time
+
+from ll_hls import (
+    LowLatencyPlaylist, LowLatencyHlsPackager, parse_init, parse_fragment, NON_SYNC_SAMPLE
+)
+
+TIMESCALE = 12800
+SAMPLE_DURATION = 512  # 25 fps
+
+
+def box(box_type, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), box_type.encode("latin-1")) + payload
+
+
+def full_box(box_type, flags, payload, version=0):
+    return box(box_type, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+def make_init():
+    mdhd = full_box("mdhd", 0, struct.pack(">IIII", 0, 0, TIMESCALE, 0) + b"\x00" * 4)
+    trex = full_box("trex", 0, struct.pack(">IIIII", 1, 1, 0, 0, 0))
+    moov = box("moov", box("trak", box("mdia", mdhd)) + box("mvex", trex))
+    return box("ftyp", b"isom\x00\x00\x02\x00") + moov
+
+
+def make_moof(samples=5, keyframe=True):
+    first_flags = 0x02000000 if keyframe else 0x01010000
+    tfhd = full_box("tfhd", 0x020038, struct.pack(">IIII", 1, SAMPLE_DURATION, 100, NON_SYNC_SAMPLE | 0x01000000))
+    trun = full_box("trun", 0x000205, struct.pack(">III", samples, 0, first_flags) + struct.pack(">I", 100) * samples)
+    return box("moof", full_box("mfhd", 0, struct.pack(">I", 1)) + box("traf", tfhd + trun))
+
+
+def make_part(keyframe=True):
+    return make_moof(keyframe=keyframe) + box("mdat", b"\x00" * 500)
+
+
+def fill(playlist, parts, keyframe_every=5):
+    for i in range(parts):
+        playlist.add_part(make_part(), 0.2, i % keyframe_every == 0)
+
+
+def test_parse_init_and_fragment():
+    """Test that timescale and fragment duration/keyframe flags are parsed"""
+    defaults = parse_init(make_init())
+    assert defaults.timescale == TIMESCALE
+    duration, independent = parse_fragment(make_moof(), defaults)
+    assert abs(duration - 0.2) < 1e-9
+    assert independent
+    _, independent = parse_fragment(make_moof(keyframe=False), defaults)
+    assert not independent
+
+
+def test_parts_are_grouped_into_segments_at_keyframes():
+    """Test segment boundaries, part listing and preload hint"""
+    playlist = LowLatencyPlaylist(part_target=0.2, segment_target=1.0)
+    fill(playlist, 12)
+    text = playlist.render()
+    assert "#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK=0.600" in text
+    assert "#EXT-X-PART-INF:PART-TARGET=0.200" in text
+    assert '#EXT-X-MAP:URI="init.mp4"' in text
+    assert "#EXTINF:1.000,\nseg0.m4s" in text
+    assert "#EXTINF:1.000,\nseg1.m4s" in text
+    assert "seg2.m4s" not in text
+    assert '#EXT-X-PART:DURATION=0.200,URI="part2.0.m4s",INDEPENDENT=YES' in text
+    assert '#EXT-X-PART:DURATION=0.200,URI="part2.1.m4s"\n' in text
+    assert text.rstrip().endswith('#EXT-X-PRELOAD-HINT:TYPE=PART,URI="part2.2.m4s"')
+    assert playlist.get_segment(0) == make_part() * 5
+    assert playlist.get_segment(2) is None
+
+
+def test_run_id_makes_uris_unique_per_run():
+    """Test that a run prefix is used in every media URI and old-run names are not served"""
+    playlist = LowLatencyPlaylist(run_id=1700000000000)
+    playlist.set_init(b"init")
+    fill(playlist, 6)
+    text = playlist.render()
+    assert '#EXT-X-MAP:URI="1700000000000_init.mp4"' in text
+    assert "#EXTINF:1.000,\n1700000000000_seg0.m4s" in text
+    assert 'URI="1700000000000_part1.0.m4s",INDEPENDENT=YES' in text
+    assert text.rstrip().endswith('URI="1700000000000_part1.1.m4s"')
+    assert playlist.serve("1700000000000_init.mp4") == (200, "video/mp4", b"init")
+    assert playlist.serve("1700000000000_seg0.m4s")[0] == 200
+    assert playlist.serve("seg0.m4s")[0] == 404
+    assert playlist.serve("1600000000000_seg0.m4s")[0] == 404
+
+
+def test_window_evicts_old_segments():
+    """Test that only the most recent segments are kept"""
+    playlist = LowLatencyPlaylist(window=2, part_segments=1)
+    fill(playlist, 30)
+    text = playlist.render()
+    assert "#EXT-X-MEDIA-SEQUENCE:3" in text
+    assert "part4.0.m4s" not in text
+    assert "part5.0.m4s" in text
+    assert playlist.get_segment(0) is None
+
+
+def test_blocking_reload_waits_for_requested_part():
+    """Test that _HLS_msn/_HLS_part requests are held until the part exists"""
+    playlist = LowLatencyPlaylist()
+    fill(playlist, 3)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(playlist.serve("output.m3u8", msn=0, part=4)))
+    thread.start()
+    time.sleep(0.05)
+    assert not results
+    fill(playlist, 2, keyframe_every=10)
+    thread.join(timeout=1)
+    status, mimetype, body = results[0]
+    assert status == 200
+    assert mimetype == "application/vnd.apple.mpegurl"
+    assert b'URI="part0.4.m4s"' in body
+
+
+def test_blocking_reload_rejects_far_future_and_times_out():
+    """Test 400 for requests too far ahead and 503 when nothing arrives"""
+    playlist = LowLatencyPlaylist(segment_target=0.02)
+    fill(playlist, 1)
+    assert playlist.serve("output.m3u8", msn=5)[0] == 400
+    assert playlist.serve("output.m3u8", msn=1)[0] == 503
+
+
+def test_preload_hinted_part_is_served_when_ready():
+    """Test that requesting the hinted part blocks until it is produced"""
+    playlist = LowLatencyPlaylist()
+    fill(playlist, 1)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(playlist.serve("part0.1.m4s")))
+    thread.start()
+    time.sleep(0.05)
+    playlist.add_part(b"next-part", 0.2, False)
+    thread.join(timeout=1)
+    assert results[0] == (200, "video/mp4", b"next-part")
+    assert playlist.serve("unknown.ts")[0] == 404
+
+
+def test_packager_reads_fragmented_mp4_stream():
+    """Test that the packager splits init and moof+mdat parts from a pipe"""
+    stream = io.BytesIO(make_init() + make_part() + make_part(keyframe=False))
+    playlist = LowLatencyPlaylist()
+    packager = LowLatencyHlsPackager(stream, playlist).start()
+    packager.join(timeout=1)
+    assert playlist.ended
+    assert playlist.serve("init.mp4") == (200, "video/mp4", make_init())
+    assert playlist.get_part(0, 1) == make_part(keyframe=False)
+    text = playlist.render()
+    assert '#EXT-X-PART:DURATION=0.200,URI="part0.0.m4s",INDEPENDENT=YES' in text
+    assert "#EXTINF:0.400,\nseg0.m4s" in text
+    assert text.rstrip().endswith("#EXT-X-ENDLIST")
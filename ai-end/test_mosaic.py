@@ -0,0 +1,114 @@
+"""
+Unit tests for the shared-memory mosaic tiles and compositor
+"""
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+from mosaic import MosaicCompositor, TileReader, TileWriter, parse_size
+
+
+@pytest.fixture
+def prefix():
+    return f"beltmonitor_test_{os.getpid()}_{time.monotonic_ns()}"
+
+
+def test_tile_round_trip_through_shared_memory(prefix):
+    """Test that a written frame is downscaled and read back with its timestamp"""
+    writer = TileWriter(1, 32, 18, prefix=prefix)
+    reader = TileReader(1, 32, 18, prefix=prefix)
+    out = np.zeros((18, 32, 3), dtype=np.uint8)
+    try:
+        assert reader.read_into(out) is None
+        writer.write(np.full((180, 320, 3), 77, dtype=np.uint8), ts=123.5)
+        assert reader.read_into(out) == 123.5
+        assert (out == 77).all()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_rejects_mismatched_tile_size(prefix):
+    """Test that camera and compositor tile sizes must agree"""
+    writer = TileWriter(1, 32, 18, prefix=prefix)
+    try:
+        with pytest.raises(ValueError):
+            TileReader(1, 64, 36, prefix=prefix).read_into(np.zeros((36, 64, 3), dtype=np.uint8))
+    finally:
+        writer.close()
+
+
+def test_compositor_places_tiles_and_marks_missing_cameras(prefix):
+    """Test grid layout, offline placeholders for absent or stale cameras"""
+    writers = [TileWriter(cid, 32, 18, prefix=prefix) for cid in (1, 2, 4)]
+    compositor = MosaicCompositor([1, 2, 3, 4], 32, 18, prefix=prefix)
+    try:
+        now = time.time()
+        writers[0].write(np.full((18, 32, 3), 10, dtype=np.uint8), ts=now)
+        writers[1].write(np.full((18, 32, 3), 20, dtype=np.uint8), ts=now - 10)
+        writers[2].write(np.full((18, 32, 3), 40, dtype=np.uint8), ts=now)
+        canvas = compositor.compose(now)
+        assert canvas.shape == (36, 64, 3)
+        assert (canvas[:18, :32] == 10).all()
+        assert (canvas[18:, 32:] == 40).all()
+        # camera 2 is stale and camera 3 never started
+        assert (canvas[:18, 32:] == compositor.offline_tiles[1]).all()
+        assert (canvas[18:, :32] == compositor.offline_tiles[2]).all()
+        assert compositor.stats()["offline_tiles"] == 2
+    finally:
+        compositor.close()
+        for writer in writers:
+            writer.close()
+
+
+def test_compositor_cycles_preallocated_canvases(prefix):
+    """Test that consecutive frames use different canvases from the ring"""
+    compositor = MosaicCompositor([1], 16, 8, ring=3, prefix=prefix)
+    frames = [compositor.compose() for _ in range(4)]
+    assert frames[0] is not frames[1] and frames[1] is not frames[2]
+    assert frames[3] is frames[0]
+    assert parse_size("321x181") == (320, 180)
+
+
+def test_torn_read_keeps_previous_tile(prefix):
+    """Test that a read during a write shows the last tile instead of OFFLINE"""
+    writer = TileWriter(1, 16, 8, prefix=prefix)
+    compositor = MosaicCompositor([1], 16, 8, ring=3, prefix=prefix)
+    try:
+        now = time.time()
+        writer.write(np.full((8, 16, 3), 50, dtype=np.uint8), ts=now)
+        assert (compositor.compose(now) == 50).all()
+        writer._seq[0] += 1  # the camera process is halfway through a write
+        assert (compositor.compose(now + 1) == 50).all()
+        assert compositor.stats()["held_tiles"] == 1 and compositor.stats()["offline_tiles"] == 0
+        assert compositor.readers[0].shm is not None
+        # once the tile has been stale for longer than stale_after it is shown as offline
+        assert (compositor.compose(now + 5) == compositor.offline_tiles[0]).all()
+    finally:
+        compositor.close()
+        writer.close()
+
+
+def test_reader_follows_a_recreated_tile(prefix):
+    """Test that a restarted camera process is picked up once its old tile goes stale"""
+    crashed = TileWriter(1, 16, 8, prefix=prefix)
+    compositor = MosaicCompositor([1], 16, 8, prefix=prefix)
+    restarted = None
+    try:
+        now = time.time()
+        crashed.write(np.full((8, 16, 3), 10, dtype=np.uint8), ts=now)
+        assert (compositor.compose(now) == 10).all()
+        restarted = TileWriter(1, 16, 8, prefix=prefix)
+        restarted.write(np.full((8, 16, 3), 90, dtype=np.uint8), ts=now + 5)
+        # still mapped to the old tile, which no longer updates
+        assert (compositor.compose(now + 5) == compositor.offline_tiles[0]).all()
+        assert compositor.stats()["reopened"] == 1
+        assert (compositor.compose(now + 5) == 90).all()
+    finally:
+        compositor.close()
+        if restarted is not None:
+            restarted.close()
+        crashed.close()
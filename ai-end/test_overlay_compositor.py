@@ -0,0 +1,59 @@
+"""
+Unit tests for the sparse overlay layer
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from overlay_compositor import OverlayLayer
+from test_label_renderer import truetype_loader
+from label_renderer import LabelRenderer
+
+
+def draw_boxes(canvas, renderer):
+    """Two overlapping labelled boxes, drawn the way Drawer.draw does"""
+    cv2.rectangle(canvas, (10, 20), (300, 200), (0, 255, 0), 2)
+    renderer.draw(canvas, "belt", (10, 0), 30, (0, 255, 0))
+    cv2.rectangle(canvas, (50, 60), (150, 150), (0, 0, 255), 1)
+    renderer.draw(canvas, "coal: 45.2%", (50, 40), 24, (0, 0, 255))
+    return canvas
+
+
+def test_apply_matches_direct_drawing():
+    """Test that stamping the cached layer equals drawing directly on the frame"""
+    renderer = LabelRenderer(font_loader=truetype_loader())
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+
+    layer = OverlayLayer.render(frame.shape, lambda c: draw_boxes(c, renderer))
+    expected = draw_boxes(frame.copy(), renderer)
+    actual = layer.apply(frame.copy())
+
+    assert np.array_equal(actual, expected)
+    assert 0 < layer.pixel_count < frame.shape[0] * frame.shape[1] // 4
+
+
+def test_layer_is_reusable_across_frames():
+    """Test that one layer can be stamped on many different frames"""
+    renderer = LabelRenderer(font_loader=truetype_loader())
+    layer = OverlayLayer.render((120, 160, 3), lambda c: draw_boxes(c, renderer))
+    rng = np.random.default_rng(1)
+    for _ in range(3):
+        frame = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        assert np.array_equal(layer.apply(frame.copy()), draw_boxes(frame.copy(), renderer))
+
+
+def test_empty_layer_leaves_frame_untouched():
+    """Test that an empty layer is a no-op"""
+    frame = np.full((10, 10, 3), 7, dtype=np.uint8)
+    layer = OverlayLayer.empty(frame.shape)
+    assert layer.pixel_count == 0
+    assert np.array_equal(layer.apply(frame.copy()), frame)
+
+
+def test_shape_mismatch_is_rejected():
+    """Test that a layer cannot be applied to a frame of another size"""
+    layer = OverlayLayer.empty((10, 10, 3))
+    with pytest.raises(ValueError):
+        layer.apply(np.zeros((20, 10, 3), dtype=np.uint8))
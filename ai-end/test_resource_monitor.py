@@ -0,0 +1,54 @@
+"""
+Unit tests for process resource accounting
+"""
+
+import resource_monitor
+from resource_monitor import ResourceMeter, child_pids, process_uptime
+
+
+def write_process(proc_root, pid, utime, stime, rss_pages, children=(), starttime=0):
+    task = proc_root / str(pid) / "task" / str(pid)
+    task.mkdir(parents=True, exist_ok=True)
+    fields = ["S"] + ["0"] * 10 + [str(utime), str(stime)] + ["0"] * 6 + [str(starttime)] + ["0"] * 5
+    (proc_root / str(pid) / "stat").write_text(f"{pid} (python3 main) {' '.join(fields)}\n")
+    (proc_root / str(pid) / "statm").write_text(f"1000 {rss_pages} 0 0 0 0 0\n")
+    (task / "children").write_text(" ".join(str(c) for c in children))
+
+
+def test_meter_sums_process_and_children(tmp_path, monkeypatch):
+    """Test CPU percent and RSS across the process and its FFmpeg child"""
+    monkeypatch.setattr(resource_monitor, "CLOCK_TICKS", 100)
+    monkeypatch.setattr(resource_monitor, "PAGE_SIZE", 4096)
+    now = [0.0]
+    write_process(tmp_path, 10, 0, 0, 256, children=[11])
+    write_process(tmp_path, 11, 0, 0, 512)
+    meter = ResourceMeter(10, proc_root=str(tmp_path), clock=lambda: now[0])
+    assert child_pids(10, str(tmp_path)) == [11]
+
+    now[0] = 2.0
+    write_process(tmp_path, 10, 30, 10, 256, children=[11])
+    write_process(tmp_path, 11, 60, 0, 768)
+    stats = meter.sample()
+    assert stats == {"cpu_percent": 50.0, "rss_mb": 4.0, "max_rss_mb": 4.0, "processes": 2}
+
+
+def test_meter_without_children_and_exited_child(tmp_path, monkeypatch):
+    """Test that a vanished child neither errors nor produces negative usage"""
+    monkeypatch.setattr(resource_monitor, "CLOCK_TICKS", 100)
+    now = [0.0]
+    write_process(tmp_path, 10, 0, 0, 256, children=[99])
+    meter = ResourceMeter(10, proc_root=str(tmp_path), clock=lambda: now[0])
+    now[0] = 1.0
+    write_process(tmp_path, 10, 10, 0, 256)
+    stats = meter.sample()
+    assert stats["cpu_percent"] == 10.0
+    assert stats["processes"] == 1
+
+
+def test_process_uptime_from_start_time(tmp_path, monkeypatch):
+    """Test uptime is system uptime minus the process start tick"""
+    monkeypatch.setattr(resource_monitor, "CLOCK_TICKS", 100)
+    write_process(tmp_path, 10, 0, 0, 1, starttime=50000)
+    (tmp_path / "uptime").write_text("512.25 1000.00\n")
+    assert process_uptime(10, str(tmp_path)) == 12.25
+    assert process_uptime(12, str(tmp_path)) is None
@@ -0,0 +1,211 @@
+"""
+Unit tests for the latest-frame RTSP reader
+"""
+
+import threading
+import time
+
+from rtsp_capture import LatestFrameReader, ReconnectingFrameReader
+
+
+class MockCapture:
+    """Mock cv2.VideoCapture producing numbered frames"""
+    def __init__(self, source, total=None, delay=0.0):
+        self.source = source
+        self.total = total
+        self.delay = delay
+        self.count = 0
+        self.released = False
+        self.retrieved = []
+        self.pending = None
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop_id, value):
+        return True
+
+    def get(self, prop_id):
+        return 25.0
+
+    def read(self):
+        self.gate.wait()
+        if self.delay:
+            time.sleep(self.delay)
+        if self.total is not None and self.count >= self.total:
+            return False, None
+        self.count += 1
+        return True, self.count
+
+    def grab(self):
+        ok, _ = self.read()
+        if ok:
+            self.pending = self.count
+        return ok
+
+    def retrieve(self):
+        self.retrieved.append(self.pending)
+        return True, self.pending
+
+    def release(self):
+        self.released = True
+
+
+def make_reader(decode_interval=0.0, **kwargs):
+    mock = MockCapture("rtsp://test", **kwargs)
+    reader = LatestFrameReader("rtsp://test", capture_factory=lambda source: mock, decode_interval=decode_interval)
+    return reader, mock
+
+
+def test_read_returns_increasing_sequence():
+    """Test that consecutive reads return strictly newer frames"""
+    reader, mock = make_reader(delay=0.005)
+    reader.start()
+    try:
+        seq1, ts1, frame1 = reader.read(0, timeout=1)
+        seq2, ts2, frame2 = reader.read(seq1, timeout=1)
+        assert seq2 > seq1
+        assert ts2 >= ts1
+        assert frame2 == seq2
+    finally:
+        reader.release()
+    assert mock.released
+
+
+def test_slow_consumer_skips_stale_frames():
+    """Test that a slow consumer always gets the freshest frame"""
+    reader, mock = make_reader(delay=0.001)
+    reader.start()
+    try:
+        seq1, _, _ = reader.read(0, timeout=1)
+        time.sleep(0.1)  # consumer falls behind
+        seq2, _, frame = reader.read(seq1, timeout=1)
+        assert seq2 > seq1 + 1
+        assert frame == seq2
+        stats = reader.stats()
+        assert stats["skipped"] == seq2 - seq1 - 1
+        assert stats["delivered"] == 2
+    finally:
+        reader.release()
+
+
+def test_read_times_out_without_new_frame():
+    """Test that read returns None if no newer frame arrives"""
+    reader, mock = make_reader()
+    mock.gate.clear()
+    reader.start()
+    try:
+        assert reader.read(0, timeout=0.05) is None
+        assert not reader.ended
+    finally:
+        mock.gate.set()
+        reader.release()
+
+
+def test_end_of_stream_sets_ended():
+    """Test that a failed read ends the decode thread"""
+    reader, mock = make_reader(total=3)
+    reader.start()
+    reader.thread.join(timeout=1)
+    assert reader.ended
+    seq, _, frame = reader.read(0, timeout=0.1)
+    assert seq == 3 and frame == 3
+    assert reader.read(seq, timeout=0.1) is None
+    reader.release()
+
+
+def test_decode_interval_retrieves_only_sampled_frames():
+    """Test that frames between decode intervals are grabbed but not retrieved"""
+    reader, mock = make_reader(decode_interval=0.05, total=100, delay=0.002)
+    reader.start()
+    reader.thread.join(timeout=2)
+    stats = reader.stats()
+    assert mock.count == 100
+    assert len(mock.retrieved) == stats["decoded"] == stats["seq"]
+    assert 2 <= stats["decoded"] < 20
+    assert stats["grabbed"] == 100 - stats["decoded"]
+    seq, _, frame = reader.read(0, timeout=0.1)
+    assert frame == mock.retrieved[-1]
+    reader.release()
+
+
+def make_reconnecting_reader(session_frames, open_results=None, **kwargs):
+    """Build a ReconnectingFrameReader whose sessions end after a few frames"""
+    open_results = list(open_results or [])
+    sessions = []
+
+    def reader_factory(source, name=None, decode_interval=0.0):
+        opened = open_results.pop(0) if open_results else True
+        mock = MockCapture(source, total=session_frames, delay=0.001)
+        mock.isOpened = lambda: opened
+        sessions.append(mock)
+        return LatestFrameReader(source, capture_factory=lambda s: mock, name=name, decode_interval=decode_interval)
+
+    reader = ReconnectingFrameReader("rtsp://test", initial_delay=0.01, max_delay=0.02,
+                                     reader_factory=reader_factory, **kwargs)
+    return reader, sessions
+
+
+def read_until(reader, count, timeout=2.0):
+    """Read frames until `count` distinct sequence numbers have been seen"""
+    seqs = []
+    last_seq = 0
+    deadline = time.time() + timeout
+    while len(seqs) < count and time.time() < deadline:
+        latest = reader.read(last_seq, timeout=0.05)
+        if latest is not None:
+            last_seq = latest[0]
+            seqs.append(last_seq)
+    return seqs
+
+
+def test_reconnects_after_stream_ends():
+    """Test that the reader reopens the source and keeps sequence numbers increasing"""
+    reader, sessions = make_reconnecting_reader(session_frames=3, open_results=[True, False, True])
+    reader.start()
+    try:
+        seqs = read_until(reader, 5)
+        assert len(seqs) == 5
+        assert seqs == sorted(set(seqs))
+        stats = reader.stats()
+        assert stats["reconnects"] >= 1
+        assert stats["failed_attempts"] >= 1
+        assert stats["outages"] >= 1
+        assert stats["last_outage_s"] >= 0
+        assert len(sessions) >= 3
+    finally:
+        reader.release()
+
+
+def test_gives_up_after_max_retries():
+    """Test that a non-live source ends instead of reconnecting"""
+    reader, sessions = make_reconnecting_reader(session_frames=2, max_retries=0)
+    reader.start()
+    try:
+        read_until(reader, 2)
+        deadline = time.time() + 2
+        while not reader.ended and time.time() < deadline:
+            time.sleep(0.01)
+        assert reader.ended
+        assert reader.stats()["reconnects"] == 0
+        assert len(sessions) == 1
+    finally:
+        reader.release()
+
+
+def test_stalled_stream_triggers_reconnect():
+    """Test that a stream delivering no frames is treated as an outage"""
+    reader, sessions = make_reconnecting_reader(session_frames=None, stall_timeout=0.1)
+    reader.start()
+    sessions[0].gate.clear()
+    try:
+        deadline = time.time() + 2
+        while reader.stats()["reconnects"] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert reader.stats()["reconnects"] >= 1
+        assert len(read_until(reader, 1)) == 1
+    finally:
+        sessions[0].gate.set()
+        reader.release()
@@ -0,0 +1,77 @@
+"""
+Unit tests for the shared latest-frame JPEG cache
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from snapshot import MJPEG_BOUNDARY, OVERLAY, RAW, SnapshotCache, parse_variant
+
+
+def frame(value):
+    return np.full((36, 64, 3), value, dtype=np.uint8)
+
+
+def test_concurrent_requests_share_one_encode():
+    """Test that 50 pollers of the same frame cost one encode"""
+    cache = SnapshotCache()
+    assert cache.get() is None
+    cache.publish(frame(100), ts=1.0)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(50)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.encodes == 1
+    assert len({r.etag for r in results}) == 1
+    decoded = cv2.imdecode(np.frombuffer(results[0].body, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (36, 64, 3)
+
+
+def test_new_frames_are_encoded_at_most_once_per_tick():
+    """Test the max_fps limit and that ETags change with the frame"""
+    now = [0.0]
+    cache = SnapshotCache(max_fps=5, clock=lambda: now[0])
+    cache.publish(frame(10), ts=1.0)
+    first = cache.get()
+    cache.publish(frame(20), ts=1.04)
+    now[0] = 0.1
+    assert cache.get() is first
+    now[0] = 0.25
+    second = cache.get()
+    assert second.etag != first.etag
+    assert second.ts == 1.04
+    assert cache.encodes == 2
+
+
+def test_overlay_variant_draws_on_a_copy():
+    """Test that the overlay callback never touches the published frame"""
+    cache = SnapshotCache()
+    cache.overlay = lambda canvas, ts: cv2.rectangle(canvas, (0, 0), (63, 35), (0, 0, 255), -1)
+    raw = frame(0)
+    cache.publish(raw, ts=1.0)
+    overlay = cv2.imdecode(np.frombuffer(cache.get(OVERLAY).body, np.uint8), cv2.IMREAD_COLOR)
+    plain = cv2.imdecode(np.frombuffer(cache.get(RAW).body, np.uint8), cv2.IMREAD_COLOR)
+    assert overlay[..., 2].mean() > 200
+    assert plain.max() < 10
+    assert raw.max() == 0
+    assert parse_variant("1") == OVERLAY and parse_variant(None) == RAW
+
+
+def test_mjpeg_stream_sends_each_new_frame():
+    """Test multipart framing and waiting for new frames"""
+    cache = SnapshotCache(max_fps=100)
+    cache.publish(frame(1), ts=1.0)
+    stop = threading.Event()
+    stream = cache.mjpeg(stop_event=stop)
+    part = next(stream)
+    assert part.startswith(f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n".encode())
+    assert part.endswith(b"\xff\xd9\r\n")
+    threading.Timer(0.05, cache.publish, args=(frame(2), 2.0)).start()
+    assert b"X-Timestamp: 2.000" in next(stream)
+    assert cache.stats()["mjpeg_streams"] == 1
+    stream.close()
+    assert cache.stats()["mjpeg_streams"] == 0
@@ -0,0 +1,146 @@
+"""
+Unit tests for the staged video pipeline
+"""
+
+import queue
+import threading
+import time
+
+import pytest
+
+from video_pipeline import (
+    BoundedQueue, LatestValue, PipelineStage, VideoPipeline,
+    FramePacket, DROP_OLDEST, DROP_NEWEST, BLOCK
+)
+
+
+def test_drop_oldest_keeps_latest_items():
+    """Test that DROP_OLDEST evicts the head of a full queue"""
+    q = BoundedQueue("test", 2, DROP_OLDEST)
+    for i in range(5):
+        assert q.put(i)
+
+    assert q.get(timeout=0) == 3
+    assert q.get(timeout=0) == 4
+    stats = q.stats()
+    assert stats["dropped"] == 3
+    assert stats["put"] == 5
+    assert stats["max_depth"] == 2
+
+
+def test_drop_newest_rejects_new_items():
+    """Test that DROP_NEWEST keeps queued items and rejects new ones"""
+    q = BoundedQueue("test", 1, DROP_NEWEST)
+    assert q.put("a")
+    assert not q.put("b")
+    assert q.get(timeout=0) == "a"
+    assert q.stats()["dropped"] == 1
+
+
+def test_block_policy_times_out():
+    """Test that BLOCK waits for space and counts a drop on timeout"""
+    q = BoundedQueue("test", 1, BLOCK)
+    assert q.put("a")
+    start = time.monotonic()
+    assert not q.put("b", timeout=0.05)
+    assert time.monotonic() - start >= 0.05
+    assert q.stats()["dropped"] == 1
+
+
+def test_get_latest_skips_stale_items():
+    """Test that get_latest returns the newest item and counts skipped ones"""
+    q = BoundedQueue("test", 5, DROP_OLDEST)
+    for i in range(4):
+        q.put(i)
+    assert q.get_latest(timeout=0) == 3
+    assert q.qsize() == 0
+    assert q.stats()["dropped"] == 3
+
+
+def test_closed_queue_raises_empty():
+    """Test that closing a queue wakes blocked consumers"""
+    q = BoundedQueue("test", 1)
+    q.close()
+    with pytest.raises(queue.Empty):
+        q.get(timeout=1)
+    assert not q.put("x")
+
+
+def test_invalid_drop_policy():
+    """Test that an unknown drop policy is rejected"""
+    with pytest.raises(ValueError):
+        BoundedQueue("test", 1, "random")
+
+
+def test_latest_value_versions():
+    """Test LatestValue version counter"""
+    slot = LatestValue("init")
+    assert slot.get() == ("init", 0)
+    slot.set("next")
+    assert slot.get() == ("next", 1)
+
+
+def test_pipeline_passes_packets_through_stages():
+    """Test a source → transform → sink pipeline"""
+    pipeline = VideoPipeline("test")
+    q1 = pipeline.add_queue("double", 10, BLOCK)
+    q2 = pipeline.add_queue("sink", 10, BLOCK)
+    received = []
+    done = threading.Event()
+    counter = iter(range(1, 6))
+
+    def source():
+        try:
+            seq = next(counter)
+        except StopIteration:
+            time.sleep(0.01)
+            return None
+        return FramePacket(seq, time.time(), seq)
+
+    def double(packet):
+        packet.frame *= 2
+        return packet
+
+    def sink(packet):
+        received.append(packet.frame)
+        if len(received) == 5:
+            done.set()
+
+    pipeline.add_stage(PipelineStage("source", source, outputs=[q1]))
+    pipeline.add_stage(PipelineStage("double", double, q1, outputs=[q2]))
+    pipeline.add_stage(PipelineStage("sink", sink, q2))
+    pipeline.start()
+    assert done.wait(2)
+    pipeline.stop()
+    pipeline.join(timeout=1)
+
+    assert received == [2, 4, 6, 8, 10]
+    stats = pipeline.stats()
+    assert stats["double"]["processed"] == 5
+    assert stats["double"]["queue"]["dropped"] == 0
+    assert "double" in pipeline.format_stats()
+
+
+def test_stage_errors_are_counted():
+    """Test that an exception in one item does not kill the stage"""
+    pipeline = VideoPipeline("test")
+    q = pipeline.add_queue("work", 10, BLOCK)
+    results = []
+
+    def work(item):
+        if item == 1:
+            raise RuntimeError("boom")
+        results.append(item)
+
+    stage = pipeline.add_stage(PipelineStage("work", work, q, poll_timeout=0.01))
+    for i in range(3):
+        q.put(i)
+    pipeline.start()
+    deadline = time.time() + 2
+    while stage.processed < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+    pipeline.join(timeout=1)
+
+    assert results == [0, 2]
+    assert stage.errors == 1
@@ -0,0 +1,127 @@
+"""
+Unit tests for the binary WebSocket payload codec
+"""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from ws_codec import (BOX_DTYPE, HEADER, BoxDecoder, BoxFrame, boxes_from_results, encode_class_table,
+                      parse_format)
+from ws_server import FanoutHub
+
+CLASS_NAMES = {0: "皮带", 2: "大块", 6: "人员"}
+TABLE = encode_class_table(1, CLASS_NAMES)
+
+
+class MockBox:
+    def __init__(self, cls_id, confidence, x1, y1, x2, y2):
+        self.cls = [cls_id]
+        self.conf = [confidence]
+        self.xyxy = [[x1, y1, x2, y2]]
+
+
+class MockResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message, text=None):
+        self.sent.append((message, text))
+
+
+def boxes(*rows):
+    return np.array(list(rows), dtype=BOX_DTYPE)
+
+
+def test_full_frame_round_trip():
+    """Test packing YOLO results and decoding a full frame with the class table"""
+    results = [MockResult([MockBox(2, 0.92, 300, 150, 420, 210), MockBox(99, 0.5, 0, 0, 10, 10)])]
+    frame = BoxFrame(1, 7, 1700000000.25, boxes_from_results(results), TABLE)
+    message = frame.encoded("binary")
+    assert len(message) == HEADER.size + 2 + 2 * BOX_DTYPE.itemsize == 42
+
+    decoder = BoxDecoder()
+    assert decoder.decode(TABLE) is None
+    payload = decoder.decode(message)
+    assert payload["ts"] == 1700000000.25 and payload["camera_id"] == 1
+    first, second = payload["boxes"]
+    assert first == {"cls_id": 2, "cls": "大块", "conf": pytest.approx(0.92, abs=1e-3),
+                     "x": 300, "y": 150, "w": 120, "h": 60}
+    assert second["cls"] == "class_99"
+
+
+def test_delta_sends_only_changed_boxes():
+    """Test that unchanged boxes are referenced by the keep bitmap and the rebuilt list matches"""
+    belt, coal, person = (0, 0.9, 0, 100, 800, 200), (2, 0.8, 300, 150, 120, 60), (6, 0.7, 50, 50, 40, 90)
+    first = BoxFrame(1, 1, 1.0, boxes(belt, coal), TABLE)
+    second = BoxFrame(1, 2, 2.0, boxes(person, belt), TABLE, base=first)
+    third = BoxFrame(1, 3, 3.0, boxes(person, belt), TABLE, base=second)
+
+    decoder = BoxDecoder()
+    decoder.decode(TABLE)
+    decoder.decode(first.encoded("delta"))  # no base yet: a full frame
+    delta = second.encoded("delta", last_seq=1)
+    # header, base seq and count, one bitmap byte, added count, one new box
+    assert len(delta) == HEADER.size + 6 + 1 + 2 + BOX_DTYPE.itemsize
+    assert [b["cls"] for b in decoder.decode(delta)["boxes"]] == ["皮带", "人员"]
+    assert len(third.encoded("delta", last_seq=2)) == HEADER.size + 6 + 1 + 2
+    assert [b["cls"] for b in decoder.decode(third.encoded("delta", last_seq=2))["boxes"]] == ["皮带", "人员"]
+
+    # the full encoding uses the same order, so full and delta clients share the next base
+    full = BoxDecoder()
+    full.decode(TABLE)
+    assert full.decode(third.encoded("binary"))["boxes"] == decoder.decode(third.encoded("binary"))["boxes"]
+
+
+def test_delta_falls_back_to_full_frame_for_a_missed_base():
+    """Test that a client that skipped the base frame gets a full frame"""
+    first = BoxFrame(1, 1, 1.0, boxes((2, 0.8, 1, 2, 3, 4)), TABLE)
+    second = BoxFrame(1, 2, 2.0, boxes((2, 0.8, 1, 2, 3, 4)), TABLE, base=first)
+    assert second.encoded("delta", last_seq=None) == second.encoded("binary")
+    decoder = BoxDecoder()
+    with pytest.raises(ValueError):
+        decoder.decode(second.encoded("delta", last_seq=1))
+
+
+def test_parse_format():
+    """Test query string negotiation with JSON as the default"""
+    assert parse_format("") == "json"
+    assert parse_format("token=x&format=binary") == "binary"
+    assert parse_format("format=delta") == "delta"
+    assert parse_format("format=xml") == "json"
+
+
+@pytest.mark.asyncio
+async def test_hub_sends_each_client_its_format():
+    """Test mixed JSON, binary and delta subscribers on one camera"""
+    hub = FanoutHub()
+    clients = {fmt: RecordingWebSocket() for fmt in ("json", "binary", "delta")}
+    slots = [hub.subscribe(ws, 1, fmt) for fmt, ws in clients.items()]
+    assert hub.formats(1) == {"json", "binary", "delta"}
+    pumps = [asyncio.ensure_future(hub.pump(slot)) for slot in slots]
+
+    to_json = lambda: json.dumps({"boxes": 1})
+    first = BoxFrame(1, 1, 1.0, boxes((2, 0.8, 1, 2, 3, 4)), TABLE, to_json=to_json)
+    second = BoxFrame(1, 2, 2.0, boxes((2, 0.8, 1, 2, 3, 4)), TABLE, base=first, to_json=to_json)
+    for frame in (first, second):
+        hub.publish(1, frame)
+        await asyncio.sleep(0.01)
+
+    assert clients["json"].sent == [(b'{"boxes": 1}', True)] * 2
+    # the class table goes out once, before the first frame
+    assert [m for m, _ in clients["binary"].sent] == [TABLE, first.encoded("binary"), second.encoded("binary")]
+    assert [m for m, _ in clients["delta"].sent] == [TABLE, first.encoded("binary"), second.encoded("delta", 1)]
+    assert all(text is False for _, text in clients["delta"].sent)
+
+    for pump in pumps:
+        pump.cancel()
+    for slot in slots:
+        hub.unsubscribe(slot)
+    assert hub.formats(1) == frozenset()
@@ -6,9 +6,27 @@ import pytest
 import asyncio
 import json
 import time
-from unittest.mock import MagicMock
+import threading
+from websockets.asyncio.client import connect
+import ws_server
 from ws_models import BoundingBox, DetectionPayload
-from ws_server import send_detection_payload, SimpleConnectionManager
+from ws_server import send_detection_payload, FanoutHub
+
+
+class MockWebSocket:
+    """Records sent messages; with block=True every send hangs like a stalled client"""
+    def __init__(self, block=False):
+        self.block = block
+        self.sent = []
+        self.close_code = None
+
+    async def send(self, message, text=None):
+        if self.block:
+            await asyncio.Event().wait()
+        self.sent.append(message.decode() if text else message)
+
+    async def close(self, code=1000, reason=""):
+        self.close_code = code
 
 
 class TestWebSocketDetectionSystem:
@@ -164,33 +182,76 @@ class TestWebSocketDetectionSystem:
         assert box.conf == 0.75
         
     @pytest.mark.asyncio
-    async def test_connection_manager(self):
-        """Test SimpleConnectionManager basic functionality"""
-        manager = SimpleConnectionManager()
-        
-        # Mock websocket
-        mock_websocket = MagicMock()
-        camera_id = 1
-        
-        # Test registration
-        await manager.register(mock_websocket, camera_id)
-        assert camera_id in manager.active_connections
-        assert mock_websocket in manager.active_connections[camera_id]
-        assert camera_id in manager.message_queues
-        
-        # Test message broadcasting
-        test_message = "test message"
-        await manager.broadcast_to_camera(camera_id, test_message)
-        
-        # Check that message was queued
-        queue = manager.message_queues[camera_id]
-        assert not queue.empty()
-        
-        # Test unregistration
-        manager.unregister(mock_websocket, camera_id)
-        assert camera_id not in manager.active_connections
-        assert camera_id not in manager.message_queues
-        
+    async def test_fanout_hub_delivers_to_every_subscriber(self):
+        """Test that each of several clients on one camera gets every message"""
+        hub = FanoutHub()
+        clients = [MockWebSocket() for _ in range(3)]
+        slots = [hub.subscribe(ws, 1) for ws in clients]
+        pumps = [asyncio.ensure_future(hub.pump(slot)) for slot in slots]
+
+        for i in range(3):
+            assert hub.publish(1, f"message {i}") == 3
+            await asyncio.sleep(0.01)
+        assert hub.publish(2, "nobody listens") == 0
+        for ws in clients:
+            assert ws.sent == ["message 0", "message 1", "message 2"]
+
+        for pump in pumps:
+            pump.cancel()
+        for slot in slots:
+            hub.unsubscribe(slot)
+        assert hub.subscribers == {}
+
+    @pytest.mark.asyncio
+    async def test_slow_client_skips_stale_messages_and_is_dropped(self):
+        """Test latest-wins slots and that a stalled client does not delay others"""
+        hub = FanoutHub(send_timeout=0.2)
+        fast = MockWebSocket()
+        slow = MockWebSocket(block=True)
+        fast_slot = hub.subscribe(fast, 1)
+        slow_slot = hub.subscribe(slow, 1)
+        pumps = [asyncio.ensure_future(hub.pump(fast_slot)), asyncio.ensure_future(hub.pump(slow_slot))]
+
+        for i in range(5):
+            hub.publish(1, f"message {i}")
+            await asyncio.sleep(0.01)
+        assert fast.sent == [f"message {i}" for i in range(5)]
+        # the slow client is stuck on message 0; messages 1..3 were replaced by newer ones
+        assert slow_slot.dropped == 3
+        assert slow_slot.pending[0] == b"message 4"
+
+        await asyncio.sleep(0.3)
+        assert hub.slow_disconnects == 1
+        assert slow.close_code == 1013
+        assert hub._closing == set()  # the close task was kept until it finished
+        stats = hub.stats()["cameras"][1]
+        assert stats["subscribers"] == 2
+        assert {c["sent"] for c in stats["clients"]} == {5, 0}
+        for pump in pumps:
+            pump.cancel()
+
+    @pytest.mark.asyncio
+    async def test_server_fans_out_to_real_clients(self):
+        """Test the websockets server end to end, including the stats endpoint"""
+        ready = threading.Event()
+        server = asyncio.ensure_future(ws_server.serve_forever("127.0.0.1", 0, ready))
+        await asyncio.get_running_loop().run_in_executor(None, ready.wait, 5)
+        url = f"ws://127.0.0.1:{ws_server.manager.port}/ws/boxes/7"
+        try:
+            clients = [await connect(url) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            payload = DetectionPayload(ts=1.0, camera_id=7, boxes=[])
+            await send_detection_payload(7, payload)
+            for client in clients:
+                assert json.loads(await asyncio.wait_for(client.recv(), 2)) == {"ts": 1.0, "camera_id": 7, "boxes": []}
+            stats = ws_server.manager.stats()["cameras"][7]
+            assert stats["subscribers"] == 3
+            for client in clients:
+                await client.close()
+        finally:
+            ws_server.stop_websocket_server()
+            await asyncio.wait_for(server, 5)
+
     def test_json_schema_validation(self):
         """Test that the JSON schema matches expected format"""
         
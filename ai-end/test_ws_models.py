@@ -5,6 +5,7 @@ Unit tests for WebSocket detection models and functionality
 import pytest
 import json
 import time
+import numpy as np
 from ws_models import BoundingBox, DetectionPayload
 
 
@@ -172,5 +173,38 @@ def test_unknown_class_handling():
     assert payload.boxes[0].cls == "class_99"  # Fallback naming
 
 
+
+class ArrayBoxes:
+    """Mock ultralytics Boxes: whole float32 arrays, iterating yields single-box objects"""
+    def __init__(self, rows):
+        data = np.array(rows, dtype=np.float32).reshape(-1, 6)
+        self.xyxy = data[:, :4]
+        self.conf = data[:, 4]
+        self.cls = data[:, 5]
+
+    def __iter__(self):
+        raise AssertionError("array-backed boxes should not be iterated")
+
+
+def test_json_from_detections_matches_model_json():
+    """Test that the fast JSON path is byte-identical to model_dump_json for both box layouts"""
+    class_names = {2: "大块", 6: "人员"}
+    rows = [(100.7, 200.2, 150.9, 280.5, 0.85, 6), (300, 150, 420, 210, 0.92, 2), (1, 2, 3, 4, 0.333, 99)]
+    array_results = [MockResult(ArrayBoxes(rows)), MockResult(None), MockResult(ArrayBoxes([]))]
+    list_results = [MockResult([MockBox(int(c), float(np.float32(p)), *xyxy) for *xyxy, p, c in rows])]
+
+    for results in (array_results, list_results):
+        expected = DetectionPayload.create_from_detections(3, results, class_names, ts=1625097600.5)
+        data = DetectionPayload.json_from_detections(3, results, class_names, ts=1625097600.5)
+        assert data == expected.model_dump_json().encode("utf-8")
+        parsed = json.loads(data)
+        assert [box["cls"] for box in parsed["boxes"]] == ["人员", "大块", "class_99"]
+        # coordinates are truncated like int(), width and height from the truncated corners
+        assert parsed["boxes"][0] == {"cls": "人员", "conf": float(np.float32(0.85)), "x": 100, "y": 200, "w": 50, "h": 80}
+
+    empty = json.loads(DetectionPayload.json_from_detections(1, [], class_names))
+    assert empty["boxes"] == [] and empty["ts"] > 0
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
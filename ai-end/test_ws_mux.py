@@ -0,0 +1,106 @@
+"""
+Unit tests for the multiplexed WebSocket endpoint (/ws/mux)
+"""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from websockets.asyncio.client import connect
+
+import ws_server
+from ws_codec import BOX_DTYPE, BoxDecoder, BoxFrame, HEADER, encode_class_table, split_mux
+from ws_server import FanoutHub, MuxClient
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message, text=None):
+        self.sent.append((message, text))
+
+
+def make_frame(camera_id, seq):
+    boxes = np.array([(2, 0.8, camera_id, 2, 3, 4)], dtype=BOX_DTYPE)
+    return BoxFrame(camera_id, seq, float(seq), boxes, encode_class_table(camera_id, {2: "大块"}),
+                    to_json=lambda: json.dumps({"camera_id": camera_id, "seq": seq}))
+
+
+@pytest.mark.asyncio
+async def test_burst_across_cameras_is_one_write():
+    """Test that messages pending for several cameras are coalesced into one frame"""
+    hub = FanoutHub(coalesce_window=0.01)
+    json_mux, binary_mux = MuxClient(RecordingWebSocket()), MuxClient(RecordingWebSocket(), "binary")
+    for mux in (json_mux, binary_mux):
+        for camera_id in (1, 2, 3):
+            hub.mux_subscribe(mux, camera_id)
+        hub.mux_subscribe(mux, 1)  # subscribing twice is a no-op
+    hub.mux_unsubscribe(json_mux, 3)
+    assert json_mux.cameras() == [1, 2] and len(hub.subscribers[1]) == 2
+    pumps = [asyncio.ensure_future(hub.pump_mux(mux)) for mux in (json_mux, binary_mux)]
+
+    hub.publish(1, make_frame(1, 1))
+    await asyncio.sleep(0.002)
+    hub.publish(2, make_frame(2, 1))
+    hub.publish(3, make_frame(3, 1))
+    await asyncio.sleep(0.05)
+
+    [(data, text)] = json_mux.websocket.sent
+    assert text is True
+    assert sorted(m["camera_id"] for m in json.loads(data)) == [1, 2]
+    assert json_mux.stats()["writes"] == 1 and json_mux.stats()["messages"] == 2
+
+    [(data, text)] = binary_mux.websocket.sent
+    assert text is False
+    decoders, cameras = {}, []
+    for message in split_mux(data):
+        camera_id = HEADER.unpack_from(message)[3]
+        payload = decoders.setdefault(camera_id, BoxDecoder()).decode(message)
+        if payload is not None:
+            cameras.append(camera_id)
+            assert payload["boxes"][0]["cls"] == "大块" and payload["boxes"][0]["x"] == camera_id
+    assert sorted(cameras) == [1, 2, 3]
+
+    for pump in pumps:
+        pump.cancel()
+
+
+@pytest.mark.asyncio
+async def test_mux_subscriptions_over_a_real_connection():
+    """Test subscribe/unsubscribe control messages and delivery on one socket"""
+    ws_server.start_server_thread("127.0.0.1", 0)
+    manager = ws_server.manager
+    try:
+        async with connect(f"ws://127.0.0.1:{manager.port}/ws/mux?cameras=1") as websocket:
+            await websocket.send(json.dumps({"subscribe": [2, 3]}))
+            assert json.loads(await websocket.recv()) == {"type": "subscriptions", "cameras": [1, 2, 3]}
+            await websocket.send(json.dumps({"unsubscribe": [1]}))
+            assert json.loads(await websocket.recv())["cameras"] == [2, 3]
+            await websocket.send("not json")
+            assert json.loads(await websocket.recv())["type"] == "error"
+
+            for camera_id in (1, 2, 3):
+                manager.publish_threadsafe(camera_id, json.dumps({"camera_id": camera_id}))
+            batch = json.loads(await asyncio.wait_for(websocket.recv(), 2))
+            assert sorted(m["camera_id"] for m in batch) == [2, 3]
+            assert len(manager.stats()["mux_clients"]) == 1
+        await asyncio.sleep(0.1)
+        assert manager.mux_clients == set() and not manager.has_subscribers(2)
+    finally:
+        ws_server.stop_websocket_server()
+
+
+def test_mux_subscriptions_are_capped_and_filtered():
+    """Test the per-connection camera cap, the ID range and the hub's camera filter"""
+    hub = FanoutHub(max_mux_cameras=3)
+    mux = MuxClient(RecordingWebSocket())
+    assert hub.mux_update(mux, [1, -1, 2, 70000, 3, 4, 5]) == [-1, 70000, 4, 5]
+    assert mux.cameras() == [1, 2, 3]
+    assert hub.mux_update(mux, [4], unsubscribe=[1]) == [] and mux.cameras() == [2, 3, 4]
+
+    hub.camera_filter = {2, 3, 4, 9}.__contains__
+    other = MuxClient(RecordingWebSocket())
+    assert hub.mux_update(other, [8, 9]) == [8]
+    assert other.cameras() == [9] and hub.has_subscribers(9) and not hub.has_subscribers(8)
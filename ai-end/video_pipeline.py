@@ -0,0 +1,307 @@
+"""
+分级多线程视频流水线
+capture → preprocess → inference → postprocess/alarm → render → encode
+
+每个阶段运行在独立的工作线程上，阶段之间通过带显式丢帧策略的有界队列连接，
+编码输出由 encoder_sink.EncoderSink 的写入线程按固定帧率节拍进行，不受推理耗时影响。
+"""
+
+import collections
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 队列满时的丢帧策略
+DROP_OLDEST = "drop_oldest"  # 丢弃队首最旧的元素，保证消费者拿到最新帧
+DROP_NEWEST = "drop_newest"  # 丢弃新放入的元素，保留已排队的数据
+BLOCK = "block"              # 阻塞生产者直到有空位（用于不允许丢失的数据）
+
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class FramePacket:
+    """在阶段之间传递的帧数据包"""
+    __slots__ = ("seq", "ts", "frame", "meta")
+
+    def __init__(self, seq, ts, frame, meta=None):
+        self.seq = seq          # 采集序号（单调递增）
+        self.ts = ts            # 采集时的墙钟时间
+        self.frame = frame      # 图像数据（numpy数组）
+        self.meta = meta if meta is not None else {}
+
+
+class BoundedQueue:
+    """带丢帧策略和统计信息的有界队列"""
+
+    def __init__(self, name, maxsize, drop_policy=DROP_OLDEST):
+        if maxsize <= 0:
+            raise ValueError(f"队列 {name} 的maxsize必须大于0")
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"未知的丢帧策略: {drop_policy}，可选值: {DROP_POLICIES}")
+        self.name = name
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # 统计信息
+        self.put_count = 0
+        self.get_count = 0
+        self.drop_count = 0
+        self.max_depth = 0
+
+    def put(self, item, timeout=None):
+        """
+        放入一个元素
+
+        Returns:
+            bool: 元素是否进入队列（DROP_NEWEST策略下满队列返回False）
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                if self.drop_policy == DROP_OLDEST:
+                    self._items.popleft()
+                    self.drop_count += 1
+                elif self.drop_policy == DROP_NEWEST:
+                    self.drop_count += 1
+                    return False
+                else:
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self.drop_count += 1
+                            return False
+                        self._cond.wait(remaining)
+                    if self._closed:
+                        return False
+            self._items.append(item)
+            self.put_count += 1
+            if len(self._items) > self.max_depth:
+                self.max_depth = len(self._items)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """取出一个元素，超时或队列关闭且为空时抛出queue.Empty"""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._closed:
+                    raise queue.Empty
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+            item = self._items.popleft()
+            self.get_count += 1
+            self._cond.notify_all()
+            return item
+
+    def get_latest(self, timeout=None):
+        """
+        取出最新的元素并丢弃其余排队的旧元素（被跳过的计入丢弃数）
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._closed:
+                    raise queue.Empty
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+            skipped = len(self._items) - 1
+            item = self._items.pop()
+            self._items.clear()
+            self.drop_count += skipped
+            self.get_count += 1
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """关闭队列，唤醒所有等待者"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "max_depth": self.max_depth,
+                "put": self.put_count,
+                "get": self.get_count,
+                "dropped": self.drop_count,
+                "policy": self.drop_policy,
+            }
+
+
+class LatestValue:
+    """线程安全的单槽最新值容器（带版本号）"""
+
+    def __init__(self, value=None):
+        self._lock = threading.Lock()
+        self._value = value
+        self._version = 0
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self._version += 1
+            return self._version
+
+    def get(self):
+        """返回 (value, version)"""
+        with self._lock:
+            return self._value, self._version
+
+
+class PipelineStage:
+    """
+    流水线阶段：一个工作线程从输入队列取元素，调用处理函数，再把结果放入输出队列
+
+    处理函数返回None表示该元素不向下游传递。没有输入队列的阶段是源阶段，
+    处理函数以无参方式被反复调用。
+    """
+
+    def __init__(self, name, func, input_queue=None, outputs=None, poll_timeout=0.5):
+        self.name = name
+        self.func = func
+        self.input_queue = input_queue
+        self.outputs = list(outputs or [])
+        self.poll_timeout = poll_timeout
+        self.pipeline = None
+        self.thread = None
+
+        # 统计信息
+        self.processed = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.last_latency = 0.0
+
+    def _next_item(self):
+        """获取下一个待处理元素，返回 (是否有元素, 元素)"""
+        if self.input_queue is None:
+            return True, None
+        try:
+            return True, self.input_queue.get(timeout=self.poll_timeout)
+        except queue.Empty:
+            return False, None
+
+    def _process(self, item):
+        start = time.perf_counter()
+        try:
+            result = self.func() if self.input_queue is None else self.func(item)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[流水线] 阶段 {self.name} 处理异常: {e}", exc_info=True)
+            return None
+        finally:
+            self.last_latency = time.perf_counter() - start
+            self.busy_time += self.last_latency
+            self.processed += 1
+        return result
+
+    def _emit(self, result):
+        for output in self.outputs:
+            output.put(result, timeout=self.poll_timeout)
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            has_item, item = self._next_item()
+            if not has_item:
+                continue
+            result = self._process(item)
+            if result is not None:
+                self._emit(result)
+
+    def stats(self):
+        avg_ms = (self.busy_time / self.processed * 1000) if self.processed else 0.0
+        stats = {
+            "processed": self.processed,
+            "errors": self.errors,
+            "avg_ms": round(avg_ms, 2),
+            "last_ms": round(self.last_latency * 1000, 2),
+        }
+        if self.input_queue is not None:
+            stats["queue"] = self.input_queue.stats()
+        return stats
+
+
+class VideoPipeline:
+    """由多个阶段组成的视频流水线"""
+
+    def __init__(self, name="pipeline", stop_event=None):
+        self.name = name
+        self.stop_event = stop_event or threading.Event()
+        self.stages = []
+        self.queues = []
+        self._threads = []
+
+    def add_queue(self, name, maxsize, drop_policy=DROP_OLDEST):
+        q = BoundedQueue(name, maxsize, drop_policy)
+        self.queues.append(q)
+        return q
+
+    def add_stage(self, stage):
+        stage.pipeline = self
+        self.stages.append(stage)
+        return stage
+
+    def _run_stage(self, stage):
+        try:
+            stage.run(self.stop_event)
+        except Exception as e:
+            logger.error(f"[流水线] 阶段 {stage.name} 意外退出: {e}", exc_info=True)
+            self.stop()
+
+    def start(self):
+        for stage in self.stages:
+            thread = threading.Thread(target=self._run_stage, args=(stage,),
+                                      name=f"{self.name}-{stage.name}", daemon=True)
+            stage.thread = thread
+            self._threads.append(thread)
+            thread.start()
+        logger.info(f"[流水线] {self.name} 已启动，阶段: {[s.name for s in self.stages]}")
+
+    def stop(self):
+        """通知所有阶段退出"""
+        self.stop_event.set()
+        for q in self.queues:
+            q.close()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def is_running(self):
+        return not self.stop_event.is_set()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def format_stats(self):
+        """生成便于日志打印的各阶段统计摘要"""
+        parts = []
+        for stage in self.stages:
+            s = stage.stats()
+            text = f"{stage.name}: 处理{s['processed']} 平均{s['avg_ms']}ms"
+            if "queue" in s:
+                q = s["queue"]
+                text += f" 队列{q['depth']}/{q['maxsize']} 丢弃{q['dropped']}"
+            if s["errors"]:
+                text += f" 错误{s['errors']}"
+            parts.append(text)
+        return " | ".join(parts)
@@ -0,0 +1,251 @@
+"""
+Compact binary encoding for WebSocket detection payloads
+
+Clients opt in with a query parameter: /ws/boxes/{camera_id}?format=binary (or format=delta).
+JSON stays the default for existing clients.
+
+All integers are little-endian. Every binary message starts with an 18-byte header:
+
+    magic "BM" | version u8 | kind u8 | camera_id u16 | seq u32 | ts f64
+
+kind 0  class table, sent before the first boxes and again when it changes:
+        UTF-8 JSON object {"<class id>": "<name>", ...}
+kind 1  full frame: count u16, then count packed 11-byte boxes
+        cls u8 | conf f16 | x i16 | y i16 | w i16 | h i16
+kind 2  delta against the frame with seq == base_seq (delta clients only):
+        base_seq u32 | base_count u16 | keep bitmap (ceil(base_count / 8) bytes, bit i = keep base box i)
+        | added u16 | added boxes
+        The new box list is the kept base boxes in order followed by the added boxes.
+        A client that missed the base frame receives a full frame instead.
+
+On the multiplexed endpoint (/ws/mux) the messages of several cameras sent in one write are
+packed into one WebSocket frame: a JSON array of payloads for JSON clients, and for binary
+clients a sequence of (length u32 | message) with the camera in each message's header.
+"""
+
+import json
+import struct
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from ws_models import detection_arrays
+
+MAGIC = b"BM"
+VERSION = 1
+KIND_CLASS_TABLE = 0
+KIND_FULL = 1
+KIND_DELTA = 2
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+FORMAT_DELTA = "delta"
+FORMATS = (FORMAT_JSON, FORMAT_BINARY, FORMAT_DELTA)
+
+HEADER = struct.Struct("<2sBBHId")
+COUNT = struct.Struct("<H")
+DELTA_BASE = struct.Struct("<IH")
+MUX_LENGTH = struct.Struct("<I")
+BOX_DTYPE = np.dtype([("cls", "u1"), ("conf", "<f2"), ("x", "<i2"), ("y", "<i2"), ("w", "<i2"), ("h", "<i2")])
+
+
+def _query_value(query: str, key: str) -> Optional[str]:
+    for part in query.split("&"):
+        name, _, value = part.partition("=")
+        if name == key:
+            return value
+    return None
+
+
+def parse_format(query: str) -> str:
+    """Pick the payload format from a query string such as 'format=binary'"""
+    value = _query_value(query, "format")
+    return value if value in FORMATS else FORMAT_JSON
+
+
+def parse_cameras(query: str) -> List[int]:
+    """Camera IDs from a query string such as 'cameras=1,2,3' (invalid entries are ignored)"""
+    cameras = []
+    for value in (_query_value(query, "cameras") or "").split(","):
+        try:
+            cameras.append(int(value))
+        except ValueError:
+            pass
+    return cameras
+
+
+def pack_mux(messages: List[bytes], fmt: str) -> bytes:
+    """Coalesce several encoded messages into one multiplexed frame"""
+    if fmt == FORMAT_JSON:
+        return b"[" + b",".join(messages) + b"]"
+    return b"".join(MUX_LENGTH.pack(len(message)) + message for message in messages)
+
+
+def split_mux(frame: bytes) -> List[bytes]:
+    """Split a binary multiplexed frame into its messages"""
+    messages, offset = [], 0
+    while offset < len(frame):
+        length, = MUX_LENGTH.unpack_from(frame, offset)
+        offset += MUX_LENGTH.size
+        messages.append(frame[offset:offset + length])
+        offset += length
+    return messages
+
+
+def boxes_from_results(results) -> np.ndarray:
+    """Pack YOLO results into a BOX_DTYPE array (coordinates as x, y, w, h)"""
+    return boxes_from_arrays(detection_arrays(results))
+
+
+def boxes_from_arrays(arrays) -> np.ndarray:
+    """boxes_from_results() for arrays already read with ws_models.detection_arrays()"""
+    cls_ids, confs, xywh = arrays
+    boxes = np.empty(len(cls_ids), dtype=BOX_DTYPE)
+    boxes["cls"] = cls_ids
+    boxes["conf"] = confs
+    for i, name in enumerate(("x", "y", "w", "h")):
+        boxes[name] = xywh[:, i]
+    return boxes
+
+
+def _header(kind, camera_id, seq, ts):
+    return HEADER.pack(MAGIC, VERSION, kind, camera_id & 0xFFFF, seq & 0xFFFFFFFF, ts)
+
+
+def encode_class_table(camera_id: int, class_names: dict, ts: float = 0.0) -> bytes:
+    table = json.dumps({str(k): v for k, v in class_names.items()}, ensure_ascii=False, separators=(",", ":"))
+    return _header(KIND_CLASS_TABLE, camera_id, 0, ts) + table.encode("utf-8")
+
+
+def encode_full(camera_id: int, seq: int, ts: float, boxes: np.ndarray) -> bytes:
+    return _header(KIND_FULL, camera_id, seq, ts) + COUNT.pack(len(boxes)) + boxes.tobytes()
+
+
+def match_base(base: np.ndarray, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Match boxes against the previous frame, returns (keep mask over base, reordered boxes)
+
+    The reordered list is what a delta decoder rebuilds: the unchanged base boxes in base
+    order followed by the new ones. Box order carries no meaning, so every encoding of a
+    frame uses this order and full and delta clients always agree on the next base.
+    """
+    size = BOX_DTYPE.itemsize
+    base_bytes = base.tobytes()
+    remaining: Dict[bytes, List[int]] = {}
+    for i in range(len(base)):
+        remaining.setdefault(base_bytes[i * size:(i + 1) * size], []).append(i)
+    keep = np.zeros(len(base), dtype=bool)
+    kept, added = [], []
+    current = boxes.tobytes()
+    for i in range(len(boxes)):
+        candidates = remaining.get(current[i * size:(i + 1) * size])
+        if candidates:
+            index = candidates.pop(0)
+            keep[index] = True
+            kept.append((index, i))
+        else:
+            added.append(i)
+    return keep, boxes[[i for _, i in sorted(kept)] + added]
+
+
+def encode_delta(camera_id: int, seq: int, ts: float, base_seq: int, keep: np.ndarray, added: np.ndarray) -> bytes:
+    return (_header(KIND_DELTA, camera_id, seq, ts) + DELTA_BASE.pack(base_seq & 0xFFFFFFFF, len(keep))
+            + np.packbits(keep, bitorder="little").tobytes() + COUNT.pack(len(added)) + added.tobytes())
+
+
+class BoxFrame:
+    """
+    One detection tick of a camera, encoded lazily and at most once per format
+
+    The hub hands the same frame to every subscriber; encoded() picks the client's
+    format and falls back from delta to a full frame when the client missed the base.
+    Matching against base costs a pass over both box lists, so publishers pass base
+    only while the camera has delta subscribers.
+    """
+
+    def __init__(self, camera_id: int, seq: int, ts: float, boxes: np.ndarray, class_table: bytes,
+                 base: Optional["BoxFrame"] = None, to_json: Optional[Callable[[], Union[str, bytes]]] = None):
+        self.camera_id = camera_id
+        self.seq = seq
+        self.ts = ts
+        self.class_table = class_table
+        self.base_seq = base.seq if base is not None else None
+        if base is not None:
+            self.keep, self.boxes = match_base(base.boxes, boxes)
+        else:
+            self.keep, self.boxes = None, boxes
+        self._to_json = to_json
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, fmt: str, last_seq: Optional[int] = None) -> bytes:
+        if fmt == FORMAT_DELTA and (self.base_seq is None or last_seq != self.base_seq):
+            fmt = FORMAT_BINARY
+        data = self._encoded.get(fmt)
+        if data is None:
+            if fmt == FORMAT_JSON:
+                data = self._to_json()
+                if isinstance(data, str):
+                    data = data.encode("utf-8")
+            elif fmt == FORMAT_BINARY:
+                data = encode_full(self.camera_id, self.seq, self.ts, self.boxes)
+            else:
+                added = self.boxes[int(self.keep.sum()):]
+                data = encode_delta(self.camera_id, self.seq, self.ts, self.base_seq, self.keep, added)
+            self._encoded[fmt] = data
+        return data
+
+    def prepare(self, formats):
+        """Encode ahead of time (in the producer's thread) for the formats that have subscribers"""
+        for fmt in formats:
+            self.encoded(fmt, self.base_seq)
+
+
+class BoxDecoder:
+    """
+    Client-side decoder (reference implementation, also used by the tests and benchmark)
+
+    decode() returns a dict like DetectionPayload.model_dump() for box messages and None
+    for class tables; boxes keep their class id in "cls_id" and the name in "cls".
+    """
+
+    def __init__(self):
+        self.class_names = {}
+        self.last_seq = None
+        self.last_boxes = np.zeros(0, dtype=BOX_DTYPE)
+
+    def decode(self, message: bytes):
+        magic, version, kind, camera_id, seq, ts = HEADER.unpack_from(message)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a beltmonitor box message")
+        offset = HEADER.size
+        if kind == KIND_CLASS_TABLE:
+            self.class_names = {int(k): v for k, v in json.loads(message[offset:].decode("utf-8")).items()}
+            return None
+        if kind == KIND_FULL:
+            count, = COUNT.unpack_from(message, offset)
+            boxes = np.frombuffer(message, BOX_DTYPE, count, offset + COUNT.size)
+        elif kind == KIND_DELTA:
+            base_seq, base_count = DELTA_BASE.unpack_from(message, offset)
+            if base_seq != self.last_seq or base_count != len(self.last_boxes):
+                raise ValueError(f"delta against frame {base_seq}, last frame is {self.last_seq}")
+            offset += DELTA_BASE.size
+            bitmap_size = (base_count + 7) // 8
+            keep = np.unpackbits(np.frombuffer(message, np.uint8, bitmap_size, offset),
+                                 count=base_count, bitorder="little").astype(bool)
+            offset += bitmap_size
+            count, = COUNT.unpack_from(message, offset)
+            added = np.frombuffer(message, BOX_DTYPE, count, offset + COUNT.size)
+            boxes = np.concatenate([self.last_boxes[keep], added])
+        else:
+            raise ValueError(f"unknown message kind {kind}")
+        self.last_seq = seq
+        self.last_boxes = boxes
+        return {
+            "ts": ts,
+            "camera_id": camera_id,
+            "boxes": [
+                {"cls_id": int(b["cls"]), "cls": self.class_names.get(int(b["cls"]), f"class_{int(b['cls'])}"),
+                 "conf": float(b["conf"]), "x": int(b["x"]), "y": int(b["y"]), "w": int(b["w"]), "h": int(b["h"])}
+                for b in boxes
+            ],
+        }
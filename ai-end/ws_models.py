@@ -3,9 +3,12 @@ Pydantic models for WebSocket detection payloads
 """
 
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional, Tuple
 import time
 
+import numpy as np
+import pydantic_core
+
 
 class BoundingBox(BaseModel):
     """Single bounding box detection result"""
@@ -24,7 +27,7 @@ class DetectionPayload(BaseModel):
     boxes: List[BoundingBox]
     
     @classmethod
-    def create_from_detections(cls, camera_id: int, results, class_names: dict):
+    def create_from_detections(cls, camera_id: int, results, class_names: dict, ts: Optional[float] = None):
         """
         Create payload from YOLO detection results
         
@@ -32,36 +35,77 @@ class DetectionPayload(BaseModel):
             camera_id: Camera ID
             results: YOLO detection results
             class_names: Mapping of class IDs to names
+            ts: Timestamp (defaults to now)
         """
-        boxes = []
-        timestamp = time.time()
-        
-        for result in results:
-            if hasattr(result, 'boxes') and result.boxes is not None:
-                for box in result.boxes:
-                    cls_id = int(box.cls[0])
-                    confidence = float(box.conf[0])
-                    
-                    # Handle both torch tensors (real YOLO) and lists (mock data)
-                    xyxy = box.xyxy[0]
-                    if hasattr(xyxy, 'tolist'):
-                        # It's a torch tensor
-                        x1, y1, x2, y2 = map(int, xyxy.tolist())
-                    else:
-                        # It's already a list
-                        x1, y1, x2, y2 = map(int, xyxy)
-                    
-                    boxes.append(BoundingBox(
-                        cls=class_names.get(cls_id, f"class_{cls_id}"),
-                        conf=confidence,
-                        x=x1,
-                        y=y1,
-                        w=x2 - x1,
-                        h=y2 - y1
-                    ))
+        cls_ids, confs, xywh = detection_arrays(results)
+        boxes = [
+            BoundingBox(cls=class_names.get(cls_id, f"class_{cls_id}"), conf=conf, x=x, y=y, w=w, h=h)
+            for cls_id, conf, (x, y, w, h) in zip(cls_ids.tolist(), confs.tolist(), xywh.tolist())
+        ]
         
         return cls(
-            ts=timestamp,
+            ts=time.time() if ts is None else ts,
             camera_id=camera_id,
             boxes=boxes
         )
+
+    @staticmethod
+    def json_from_detections(camera_id: int, results, class_names: dict, ts: Optional[float] = None) -> bytes:
+        """
+        Serialize YOLO detection results straight to payload JSON (UTF-8 bytes)
+        
+        Same output as create_from_detections(...).model_dump_json(), but the values come
+        from trusted arrays, so the per-box model validation is skipped.
+        """
+        return DetectionPayload.json_from_arrays(camera_id, detection_arrays(results), class_names, ts)
+
+    @staticmethod
+    def json_from_arrays(camera_id: int, arrays, class_names: dict, ts: Optional[float] = None) -> bytes:
+        """json_from_detections() for arrays already read with detection_arrays()"""
+        cls_ids, confs, xywh = arrays
+        return pydantic_core.to_json({
+            "ts": time.time() if ts is None else float(ts),
+            "camera_id": int(camera_id),
+            "boxes": [
+                {"cls": class_names.get(cls_id, f"class_{cls_id}"), "conf": conf, "x": x, "y": y, "w": w, "h": h}
+                for cls_id, conf, (x, y, w, h) in zip(cls_ids.tolist(), confs.tolist(), xywh.tolist())
+            ],
+        })
+
+
+def _as_array(value) -> np.ndarray:
+    # torch tensors (possibly on the GPU) or plain sequences
+    if hasattr(value, 'cpu'):
+        value = value.cpu().numpy()
+    return np.asarray(value)
+
+
+def detection_arrays(results) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Read the boxes of YOLO results as whole arrays
+    
+    Returns (class ids int64 [N], confidences float64 [N], x/y/w/h int64 [N, 4]); coordinates
+    are truncated to int like int(x). ultralytics Boxes are read tensor by tensor instead of
+    box by box; anything else (e.g. lists of mock boxes) falls back to per-box access.
+    """
+    cls_parts, conf_parts, xyxy_parts = [], [], []
+    for result in results:
+        boxes = getattr(result, 'boxes', None)
+        if boxes is None:
+            continue
+        xyxy = getattr(boxes, 'xyxy', None)
+        if getattr(xyxy, 'ndim', 0) == 2:
+            cls_parts.append(_as_array(boxes.cls).reshape(-1))
+            conf_parts.append(_as_array(boxes.conf).reshape(-1))
+            xyxy_parts.append(_as_array(xyxy).reshape(-1, 4))
+            continue
+        rows = [(box.cls[0], box.conf[0], box.xyxy[0]) for box in boxes]
+        if rows:
+            cls_parts.append(np.array([int(c) for c, _, _ in rows]))
+            conf_parts.append(np.array([float(c) for _, c, _ in rows]))
+            xyxy_parts.append(np.array([b.tolist() if hasattr(b, 'tolist') else list(b) for _, _, b in rows]))
+    if not cls_parts:
+        return np.zeros(0, np.int64), np.zeros(0, np.float64), np.zeros((0, 4), np.int64)
+    corners = np.concatenate(xyxy_parts).astype(np.float64).astype(np.int64)
+    corners[:, 2:] -= corners[:, :2]
+    return np.concatenate(cls_parts).astype(np.int64), np.concatenate(conf_parts).astype(np.float64), corners
@@ -1,12 +1,19 @@
 """
 WebSocket producer for sending detection results
 Integrates with the main video processing pipeline
+
+By default the producer runs its own WebSocket server. With a hub socket it instead
+publishes every result to a shared detection_hub.py process, so several camera
+processes on one host serve their boxes from a single port.
 """
 
-import asyncio
-import threading
-from ws_models import DetectionPayload
-from ws_server import send_detection_payload, start_server_thread
+import functools
+import time
+from typing import Optional
+from detection_hub import HubPublisher
+from ws_codec import FORMAT_DELTA, BoxFrame, boxes_from_arrays, encode_class_table
+from ws_models import DetectionPayload, detection_arrays
+from ws_server import manager, start_server_thread, stop_websocket_server
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,86 +25,98 @@ class DetectionProducer:
     def __init__(self, host: str = "0.0.0.0", port: int = 8001):
         self.host = host
         self.port = port
-        self.loop = None
-        self.thread = None
         self.server_thread = None
+        self.hub = None
         self._running = False
+        # Per camera: sequence number, last frame (delta base) and encoded class table
+        self._seq = {}
+        self._last_frames = {}
+        self._class_tables = {}
+
+    @property
+    def loop(self):
+        """Event loop of the WebSocket server (None until it is listening)"""
+        return manager.loop
+        
+    def start(self, hub_socket: Optional[str] = None):
+        """
+        Start the WebSocket server, returns once it is listening
         
-    def start(self):
-        """Start the WebSocket server and async event loop"""
+        Args:
+            hub_socket: Unix socket of a detection_hub.py process; when given, no server is
+                started here and results are published to the hub instead
+        """
         if self._running:
             return
             
         self._running = True
+
+        if hub_socket:
+            self.hub = HubPublisher(hub_socket)
+            logger.info(f"Detection producer publishing to hub at {hub_socket}")
+            return
         
         # Start WebSocket server in separate thread
         self.server_thread = start_server_thread(self.host, self.port)
-        
-        # Start async loop for handling detection payloads
-        self.thread = threading.Thread(target=self._run_loop, daemon=True)
-        self.thread.start()
-        
-        # Wait for loop to be ready
-        while self.loop is None:
-            threading.Event().wait(0.01)
-            
         logger.info(f"Detection producer started on ws://{self.host}:{self.port}")
         
     def stop(self):
         """Stop the producer"""
         self._running = False
-        if self.loop and not self.loop.is_closed():
-            try:
-                future = asyncio.run_coroutine_threadsafe(self._stop_loop(), self.loop)
-                future.result(timeout=1.0)
-            except Exception as e:
-                logger.error(f"Error stopping loop: {e}")
-        if self.thread:
-            self.thread.join(timeout=1.0)
-            
-    def _run_loop(self):
-        """Run the asyncio event loop"""
-        self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
-        
-        try:
-            self.loop.run_forever()
-        except Exception as e:
-            logger.error(f"Error in producer loop: {e}")
-        finally:
-            self.loop.close()
+        if self.hub is not None:
+            self.hub.close()
+            self.hub = None
+            return
+        stop_websocket_server()
+        if self.server_thread:
+            self.server_thread.join(timeout=1.0)
             
-    async def _stop_loop(self):
-        """Stop the event loop"""
-        if self.loop:
-            self.loop.stop()
-        
     def send_detections(self, camera_id: int, results, class_names: dict):
         """
         Send detection results via WebSocket (non-blocking)
         
+        The payload is serialized once per requested format here, in the caller's thread,
+        and handed to the server loop, which fans it out to every subscriber of the camera.
+        
         Args:
             camera_id: Camera ID
             results: YOLO detection results
             class_names: Mapping of class IDs to names
         """
-        if not self._running or not self.loop:
+        if not self._running or (self.hub is None and not manager.has_subscribers(camera_id)):
             return
             
         try:
-            payload = DetectionPayload.create_from_detections(camera_id, results, class_names)
-            
-            # Schedule the coroutine in the event loop (non-blocking)
-            future = asyncio.run_coroutine_threadsafe(
-                send_detection_payload(camera_id, payload), 
-                self.loop
+            seq = self._seq.get(camera_id, 0) + 1
+            self._seq[camera_id] = seq
+            ts = time.time()
+            # Read the result tensors once for both the JSON and the binary encodings
+            arrays = detection_arrays(results)
+            # The hub keeps its own delta bases; here boxes are matched only for delta subscribers
+            formats = manager.formats(camera_id) if self.hub is None else frozenset()
+            frame = BoxFrame(
+                camera_id, seq, ts, boxes_from_arrays(arrays), self._class_table(camera_id, class_names),
+                base=self._last_frames.get(camera_id) if FORMAT_DELTA in formats else None,
+                to_json=functools.partial(DetectionPayload.json_from_arrays, camera_id, arrays, class_names, ts)
             )
-            
-            # Don't wait for completion to keep pipeline non-blocking
-            
+            if self.hub is not None:
+                # The hub has its own subscribers; it needs JSON and a full frame
+                self.hub.publish(frame)
+                return
+            self._last_frames[camera_id] = frame
+            frame.prepare(formats)
+            manager.publish_threadsafe(camera_id, frame)
         except Exception as e:
             logger.error(f"Error creating/sending detection payload: {e}")
 
+    def _class_table(self, camera_id: int, class_names: dict) -> bytes:
+        """Encoded class table, rebuilt only when the class names change"""
+        cached = self._class_tables.get(camera_id)
+        if cached is None or cached[0] != class_names:
+            cached = (dict(class_names), encode_class_table(camera_id, class_names))
+            self._class_tables[camera_id] = cached
+        return cached[1]
+
 
 # Global producer instance
 detection_producer = DetectionProducer()
@@ -1,143 +1,485 @@
 """
 Simple WebSocket server for real-time detection results
 Uses websockets library instead of FastAPI for lighter dependencies
+
+Each payload is serialized once and fanned out to every subscriber of the camera.
+Every client has its own latest-wins slot and sender task, so a slow client only
+skips stale messages (or is disconnected) and never delays the others.
+
+Clients pick the payload format with ?format=json (default), binary or delta, see ws_codec.
+
+/ws/mux carries several cameras over one connection. The client subscribes with
+?cameras=1,2 and/or text messages {"subscribe": [3]} / {"unsubscribe": [1]}, and the
+server answers each with {"type": "subscriptions", "cameras": [...]} plus "ignored": [...]
+when some IDs were refused (out of range, unknown to the hub, or over MUX_MAX_CAMERAS).
+Messages that are pending for several cameras are coalesced into one frame (see ws_codec.pack_mux).
 """
 
 import asyncio
 import json
 import logging
 import threading
-from typing import Dict, Set
-import websockets
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+from ws_codec import FORMAT_JSON, BoxFrame, pack_mux, parse_cameras, parse_format
 from ws_models import DetectionPayload
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+STATS_PATH = "/ws/stats"
+MUX_PATH = "/ws/mux"
+# A client whose send has not completed within this many seconds is disconnected
+SEND_TIMEOUT = 5.0
+# A multiplexed client waits this long after a wake-up so a burst across cameras goes out as one write
+MUX_COALESCE_WINDOW = 0.01
+# Cameras one multiplexed connection may subscribe to
+MUX_MAX_CAMERAS = 64
+# Camera IDs travel as u16 in binary headers
+MAX_CAMERA_ID = 0xFFFF
+
+
+class ClientSlot:
+    """Latest-wins mailbox of one subscriber: a newer message replaces one not yet sent"""
+
+    def __init__(self, websocket, camera_id: int, fmt: str = FORMAT_JSON, event: Optional[asyncio.Event] = None):
+        self.websocket = websocket
+        self.camera_id = camera_id
+        self.format = fmt
+        self.peer = str(getattr(websocket, "remote_address", "") or "")
+        self.pending: Optional[Tuple[Union[bytes, BoxFrame], float]] = None
+        # A multiplexed connection shares one wake-up event between its per-camera slots
+        self.event = event if event is not None else asyncio.Event()
+        # Binary clients: class table already sent and seq of the last frame (base for deltas)
+        self.class_table: Optional[bytes] = None
+        self.last_seq: Optional[int] = None
+
+        # Statistics
+        self.sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.lag_total = 0.0
+        self.max_lag = 0.0
+
+    def offer(self, message: Union[bytes, BoxFrame], published_at: float):
+        if self.pending is not None:
+            self.dropped += 1
+        self.pending = (message, published_at)
+        self.event.set()
+
+    async def take(self) -> Tuple[Union[bytes, BoxFrame], float]:
+        await self.event.wait()
+        self.event.clear()
+        pending, self.pending = self.pending, None
+        return pending
+
+    def take_nowait(self) -> Optional[Tuple[Union[bytes, BoxFrame], float]]:
+        pending, self.pending = self.pending, None
+        return pending
+
+    def record_sent(self, published_at: float, size: int = 0):
+        lag = time.monotonic() - published_at
+        self.sent += 1
+        self.bytes_sent += size
+        self.lag_total += lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> dict:
+        return {
+            "peer": self.peer,
+            "format": self.format,
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "avg_lag_ms": round(self.lag_total / self.sent * 1000, 2) if self.sent else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+class MuxClient:
+    """One /ws/mux connection: a ClientSlot per subscribed camera, all waking the same sender"""
+
+    def __init__(self, websocket, fmt: str = FORMAT_JSON):
+        self.websocket = websocket
+        self.format = fmt
+        self.peer = str(getattr(websocket, "remote_address", "") or "")
+        self.event = asyncio.Event()
+        self.slots: Dict[int, ClientSlot] = {}
+
+        # Statistics
+        self.writes = 0
+        self.messages = 0
+
+    def cameras(self) -> List[int]:
+        return sorted(self.slots)
+
+    def stats(self) -> dict:
+        return {"peer": self.peer, "format": self.format, "cameras": self.cameras(),
+                "writes": self.writes, "messages": self.messages}
+
+
+class FanoutHub:
+    """
+    Per-camera fan-out of serialized payloads
+
+    publish() must run on the server's event loop; other threads use publish_threadsafe().
+    """
+
+    def __init__(self, send_timeout: float = SEND_TIMEOUT, coalesce_window: float = MUX_COALESCE_WINDOW,
+                 max_mux_cameras: int = MUX_MAX_CAMERAS):
+        self.send_timeout = send_timeout
+        self.coalesce_window = coalesce_window
+        self.max_mux_cameras = max_mux_cameras
+        # Set by the detection hub: mux clients may only subscribe to cameras it has a feed for
+        self.camera_filter: Optional[Callable[[int], bool]] = None
+        self.mux_clients: Set[MuxClient] = set()
+        self.subscribers: Dict[int, Set[ClientSlot]] = {}
+        # Formats requested per camera, replaced as a whole so producer threads can read it
+        self.camera_formats: Dict[int, FrozenSet[str]] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.port: Optional[int] = None
+        # Close handshakes with slow clients, referenced until done so they are not garbage collected
+        self._closing: Set[asyncio.Task] = set()
+
+        # Statistics
+        self.published = 0
+        self.slow_disconnects = 0
+
+    def subscribe(self, websocket, camera_id: int, fmt: str = FORMAT_JSON) -> ClientSlot:
+        slot = self._add_slot(ClientSlot(websocket, camera_id, fmt))
+        logger.info(f"Client connected to camera {camera_id}. Active connections: {len(self.subscribers[camera_id])}")
+        return slot
+
+    def unsubscribe(self, slot: ClientSlot):
+        if self._remove_slot(slot):
+            logger.info(f"Client disconnected from camera {slot.camera_id}. "
+                        f"Active connections: {len(self.subscribers.get(slot.camera_id, ()))}")
+
+    def _add_slot(self, slot: ClientSlot) -> ClientSlot:
+        self.subscribers.setdefault(slot.camera_id, set()).add(slot)
+        self._update_formats(slot.camera_id)
+        return slot
+
+    def _remove_slot(self, slot: ClientSlot) -> bool:
+        slots = self.subscribers.get(slot.camera_id)
+        if slots is None or slot not in slots:
+            return False
+        slots.discard(slot)
+        # Clean up empty camera connections
+        if not slots:
+            del self.subscribers[slot.camera_id]
+        self._update_formats(slot.camera_id)
+        return True
+
+    def mux_subscribe(self, mux: MuxClient, camera_id: int) -> bool:
+        """Add a camera to a mux connection; False if the ID is refused"""
+        if camera_id in mux.slots:
+            return True
+        if (not 0 <= camera_id <= MAX_CAMERA_ID or len(mux.slots) >= self.max_mux_cameras
+                or (self.camera_filter is not None and not self.camera_filter(camera_id))):
+            return False
+        mux.slots[camera_id] = self._add_slot(ClientSlot(mux.websocket, camera_id, mux.format, mux.event))
+        return True
+
+    def mux_unsubscribe(self, mux: MuxClient, camera_id: int):
+        slot = mux.slots.pop(camera_id, None)
+        if slot is not None:
+            self._remove_slot(slot)
+
+    def mux_update(self, mux: MuxClient, subscribe: Iterable[int] = (), unsubscribe: Iterable[int] = ()) -> List[int]:
+        """
+        Apply one subscription request of a mux connection, returns the refused camera IDs
+
+        Unsubscriptions go first so a client at the cap can swap cameras in one request.
+        """
+        for camera_id in unsubscribe:
+            self.mux_unsubscribe(mux, camera_id)
+        ignored = [camera_id for camera_id in subscribe if not self.mux_subscribe(mux, camera_id)]
+        logger.info(f"Mux client {mux.peer} subscribed to {len(mux.slots)} cameras"
+                    + (f", ignored {len(ignored)} IDs" if ignored else ""))
+        return ignored
+
+    def _update_formats(self, camera_id: int):
+        formats = frozenset(slot.format for slot in self.subscribers.get(camera_id, ()))
+        if formats:
+            self.camera_formats[camera_id] = formats
+        else:
+            self.camera_formats.pop(camera_id, None)
+
+    def formats(self, camera_id: int) -> FrozenSet[str]:
+        """Payload formats the camera's subscribers asked for (safe to call from any thread)"""
+        return self.camera_formats.get(camera_id, frozenset())
 
-class SimpleConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, Set] = {}
-        self.message_queues: Dict[int, asyncio.Queue] = {}
-        
-    async def register(self, websocket, camera_id: int):
-        """Register a new WebSocket connection"""
-        if camera_id not in self.active_connections:
-            self.active_connections[camera_id] = set()
-            self.message_queues[camera_id] = asyncio.Queue(maxsize=10)
-            
-        self.active_connections[camera_id].add(websocket)
-        logger.info(f"Client connected to camera {camera_id}. Active connections: {len(self.active_connections[camera_id])}")
-        
-    def unregister(self, websocket, camera_id: int):
-        """Unregister a WebSocket connection"""
-        if camera_id in self.active_connections:
-            self.active_connections[camera_id].discard(websocket)
-            logger.info(f"Client disconnected from camera {camera_id}. Active connections: {len(self.active_connections[camera_id])}")
-            
-            # Clean up empty camera connections
-            if not self.active_connections[camera_id]:
-                del self.active_connections[camera_id]
-                if camera_id in self.message_queues:
-                    del self.message_queues[camera_id]
-                    
-    async def broadcast_to_camera(self, camera_id: int, message: str):
-        """Broadcast message to all clients connected to a camera (non-blocking)"""
-        if camera_id not in self.active_connections:
-            return
-            
-        # Non-blocking send - drop message if queue is full
+    def has_subscribers(self, camera_id: int) -> bool:
+        return bool(self.subscribers.get(camera_id))
+
+    def publish(self, camera_id: int, message: Union[str, BoxFrame]) -> int:
+        """
+        Hand one message to every subscriber of the camera, returns the subscriber count
+
+        A BoxFrame is sent in each client's format; a plain JSON string goes to every
+        client as the same text frame.
+        """
+        slots = self.subscribers.get(camera_id)
+        if not slots:
+            return 0
+        self.published += 1
+        now = time.monotonic()
+        # Encode once; every client sends the same bytes
+        data = message.encode("utf-8") if isinstance(message, str) else message
+        for slot in slots:
+            slot.offer(data, now)
+        return len(slots)
+
+    def publish_threadsafe(self, camera_id: int, message: Union[str, BoxFrame]) -> bool:
+        """Schedule publish() on the server loop from another thread (non-blocking)"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return False
+        loop.call_soon_threadsafe(self.publish, camera_id, message)
+        return True
+
+    def _encode(self, slot: ClientSlot, message: Union[bytes, BoxFrame]) -> List[Tuple[bytes, bool]]:
+        """(data, is_text) frames to send for one message in the slot's format, class table first if needed"""
+        if not isinstance(message, BoxFrame):
+            return [(message, True)]
+        frames = []
+        if slot.format != FORMAT_JSON and slot.class_table is not message.class_table:
+            frames.append((message.class_table, False))
+            slot.class_table = message.class_table
+        frames.append((message.encoded(slot.format, slot.last_seq), slot.format == FORMAT_JSON))
+        slot.last_seq = message.seq
+        return frames
+
+    async def _send(self, websocket, data: bytes, text: bool, peer: str) -> bool:
+        """Send one frame, disconnecting a client that stalls; returns False once the connection is gone"""
         try:
-            queue = self.message_queues[camera_id]
-            queue.put_nowait(message)
-        except asyncio.QueueFull:
-            logger.warning(f"Message queue full for camera {camera_id}, dropping message")
+            await asyncio.wait_for(websocket.send(data, text=text), self.send_timeout)
+        except asyncio.TimeoutError:
+            self.slow_disconnects += 1
+            logger.warning(f"Client {peer} too slow, disconnecting")
+            task = asyncio.ensure_future(websocket.close(code=1013, reason="client too slow"))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            return False
+        except ConnectionClosed:
+            return False
+        return True
 
+    async def pump(self, slot: ClientSlot):
+        """Send the slot's messages to its client until the connection closes or stalls"""
+        while True:
+            message, published_at = await slot.take()
+            frames = self._encode(slot, message)
+            for data, text in frames:
+                if not await self._send(slot.websocket, data, text, slot.peer):
+                    return
+            slot.record_sent(published_at, len(frames[-1][0]))
+
+    async def pump_mux(self, mux: MuxClient):
+        """Send the pending messages of all the connection's cameras, coalesced into one frame per wake-up"""
+        while True:
+            await mux.event.wait()
+            if self.coalesce_window > 0:
+                await asyncio.sleep(self.coalesce_window)
+            mux.event.clear()
+            messages, texts, sent = [], [], []
+            for slot in list(mux.slots.values()):
+                pending = slot.take_nowait()
+                if pending is None:
+                    continue
+                message, published_at = pending
+                frames = self._encode(slot, message)
+                for data, text in frames:
+                    # JSON payloads go into the array; plain JSON text to a binary client is sent on its own
+                    (messages if text == (mux.format == FORMAT_JSON) else texts).append(data)
+                sent.append((slot, published_at, len(frames[-1][0])))
+            if not sent:
+                continue
+            if messages and not await self._send(mux.websocket, pack_mux(messages, mux.format),
+                                                 mux.format == FORMAT_JSON, mux.peer):
+                return
+            for data in texts:
+                if not await self._send(mux.websocket, data, True, mux.peer):
+                    return
+            mux.writes += 1
+            mux.messages += len(sent)
+            for slot, published_at, size in sent:
+                slot.record_sent(published_at, size)
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "slow_disconnects": self.slow_disconnects,
+            "mux_clients": [mux.stats() for mux in self.mux_clients],
+            "cameras": {
+                camera_id: {
+                    "subscribers": len(slots),
+                    "dropped": sum(slot.dropped for slot in slots),
+                    "clients": [slot.stats() for slot in slots],
+                }
+                for camera_id, slots in self.subscribers.items()
+            },
+        }
 
-manager = SimpleConnectionManager()
+
+manager = FanoutHub()
+
+
+def parse_camera_id(path: str) -> Optional[int]:
+    """Parse camera_id from path: /ws/boxes/{camera_id}"""
+    path_parts = path.split("?", 1)[0].strip('/').split('/')
+    if len(path_parts) < 3 or path_parts[0] != 'ws' or path_parts[1] != 'boxes':
+        return None
+    try:
+        return int(path_parts[2])
+    except ValueError:
+        return None
 
 
 async def handle_client(websocket):
     """Handle WebSocket client connections"""
+    path = websocket.request.path
+    if path.split("?", 1)[0].rstrip("/") == MUX_PATH:
+        await handle_mux_client(websocket)
+        return
+    camera_id = parse_camera_id(path)
+    if camera_id is None:
+        await websocket.close(code=1003, reason="Invalid path")
+        return
+
+    slot = manager.subscribe(websocket, camera_id, parse_format(path.partition("?")[2]))
+    sender = asyncio.ensure_future(manager.pump(slot))
     try:
-        # Get path from websocket
-        path = websocket.path
-        
-        # Parse camera_id from path: /ws/boxes/{camera_id}
-        path_parts = path.strip('/').split('/')
-        if len(path_parts) < 3 or path_parts[0] != 'ws' or path_parts[1] != 'boxes':
-            await websocket.close(code=1003, reason="Invalid path")
-            return
-            
-        try:
-            camera_id = int(path_parts[2])
-        except ValueError:
-            await websocket.close(code=1003, reason="Invalid camera_id")
-            return
-            
-        await manager.register(websocket, camera_id)
-        
-        # Process message queue for this camera
-        queue = manager.message_queues.get(camera_id)
-        if queue:
-            while True:
-                try:
-                    # Wait for message with timeout
-                    message = await asyncio.wait_for(queue.get(), timeout=1.0)
-                    
-                    # Send to this client
-                    await websocket.send(message)
-                    
-                except asyncio.TimeoutError:
-                    # Keep connection alive
-                    continue
-                except Exception as e:
-                    logger.error(f"Error sending message to client: {e}")
-                    break
-                    
+        # Read (and ignore) incoming frames so close frames and pings are processed while idle
+        receiver = asyncio.ensure_future(_drain(websocket))
+        done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        if 'camera_id' in locals():
-            manager.unregister(websocket, camera_id)
+        sender.cancel()
+        manager.unsubscribe(slot)
+
+
+async def handle_mux_client(websocket):
+    """Handle a /ws/mux connection: one socket, a changing set of cameras"""
+    query = websocket.request.path.partition("?")[2]
+    mux = MuxClient(websocket, parse_format(query))
+    manager.mux_clients.add(mux)
+    manager.mux_update(mux, parse_cameras(query))
+    sender = asyncio.ensure_future(manager.pump_mux(mux))
+    try:
+        receiver = asyncio.ensure_future(_mux_control(websocket, mux))
+        done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+    except Exception as e:
+        logger.error(f"WebSocket error: {e}")
+    finally:
+        sender.cancel()
+        for camera_id in mux.cameras():
+            manager.mux_unsubscribe(mux, camera_id)
+        manager.mux_clients.discard(mux)
+        logger.info(f"Mux client {mux.peer} disconnected")
+
+
+async def _mux_control(websocket, mux: MuxClient):
+    """Apply {"subscribe": [...], "unsubscribe": [...]} messages and answer with the current set"""
+    try:
+        async for message in websocket:
+            try:
+                request = json.loads(message)
+                subscribe = [int(c) for c in request.get("subscribe", [])]
+                unsubscribe = [int(c) for c in request.get("unsubscribe", [])]
+            except (ValueError, TypeError, AttributeError):
+                await websocket.send(json.dumps({"type": "error", "reason": "invalid subscription request"}))
+                continue
+            ignored = manager.mux_update(mux, subscribe, unsubscribe)
+            reply = {"type": "subscriptions", "cameras": mux.cameras()}
+            if ignored:
+                reply["ignored"] = ignored
+            await websocket.send(json.dumps(reply))
+    except ConnectionClosed:
+        pass
+
+
+async def _drain(websocket):
+    try:
+        async for _ in websocket:
+            pass
+    except ConnectionClosed:
+        pass
+
+
+def process_request(connection, request):
+    """Answer plain HTTP GET /ws/stats with the fan-out statistics"""
+    if request.path == STATS_PATH:
+        return connection.respond(200, json.dumps(manager.stats(), ensure_ascii=False) + "\n")
+    return None
 
 
 async def send_detection_payload(camera_id: int, payload: DetectionPayload):
     """
     Send detection payload to WebSocket clients (non-blocking)
-    Called from the video processing pipeline
+    Must run on the server loop; from other threads use manager.publish_threadsafe()
     """
     try:
-        message = payload.model_dump_json()
-        await manager.broadcast_to_camera(camera_id, message)
+        manager.publish(camera_id, payload.model_dump_json())
     except Exception as e:
         logger.error(f"Error sending detection payload for camera {camera_id}: {e}")
 
 
-def start_websocket_server(host: str = "0.0.0.0", port: int = 8001):
+_stop_event: Optional[asyncio.Event] = None
+
+
+async def serve_forever(host: str = "0.0.0.0", port: int = 8001, ready: Optional[threading.Event] = None,
+                        process_request=process_request):
+    """Run the WebSocket server on the current event loop until stop_websocket_server()"""
+    global _stop_event
+    _stop_event = asyncio.Event()
+    manager.loop = asyncio.get_running_loop()
+    try:
+        async with serve(handle_client, host, port, process_request=process_request) as server:
+            manager.port = server.sockets[0].getsockname()[1] if server.sockets else port
+            if ready is not None:
+                ready.set()
+            await _stop_event.wait()
+    finally:
+        manager.loop = None
+
+
+def start_websocket_server(host: str = "0.0.0.0", port: int = 8001, ready: Optional[threading.Event] = None):
     """Start the WebSocket server"""
     logger.info(f"Starting WebSocket server on ws://{host}:{port}")
-    
-    # Create new event loop for this thread
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
     try:
-        # Create server with explicit loop
-        start_server = websockets.serve(handle_client, host, port)
-        loop.run_until_complete(start_server)
-        loop.run_forever()
+        asyncio.run(serve_forever(host, port, ready))
     except Exception as e:
         logger.error(f"Error in WebSocket server: {e}")
     finally:
-        loop.close()
+        if ready is not None:
+            ready.set()
+
+
+def stop_websocket_server():
+    """Stop the server started by start_websocket_server() from any thread"""
+    loop = manager.loop
+    if loop is not None and not loop.is_closed() and _stop_event is not None:
+        loop.call_soon_threadsafe(_stop_event.set)
 
 
-def start_server_thread(host: str = "0.0.0.0", port: int = 8001):
-    """Start WebSocket server in a separate thread"""
-    thread = threading.Thread(target=start_websocket_server, args=(host, port), daemon=True)
+def start_server_thread(host: str = "0.0.0.0", port: int = 8001, timeout: float = 5.0):
+    """Start WebSocket server in a separate thread, returns once it is listening"""
+    ready = threading.Event()
+    thread = threading.Thread(target=start_websocket_server, args=(host, port, ready), daemon=True)
     thread.start()
+    ready.wait(timeout)
     return thread
 
 